@@ -1,116 +1,556 @@
+from server.startup import startup
 try:
     import RPi.GPIO as GPIO
 except ImportError:
     import hardware.mock_gpio as GPIO
-from flask import Flask, render_template, Response
+from flask import Flask, Response, request, jsonify
 from flask_socketio import SocketIO
+import argparse
+import functools
+import hmac
+import json
 import logging
+import math
+import sys
+import threading
+import time
+from config import (
+    DEBUG_TOKEN,
+    HARDWARE_MODE,
+    RECORDER_AUTOSTART,
+    SERVER_MODE,
+    TELEMETRY_HISTORY_MAX_BUCKETS,
+    WEB_PORT
+)
+from hardware.pwm_manager import PWMChannelManager
 from hardware.motor_controller import MotorController
 from hardware.servo_controller import ServoController
-from hardware.camera_stream import CameraStream
-from hardware.battery_monitor import BatteryMonitor
+from hardware.control_loop import ControlLoop
+from hardware.frame_buffer import MULTIPART_TRAILER, multipart_header
+from server import control_protocol
+from server.logging_setup import configure_logging, hardware_events
+from server import metrics
+from server import recorder
+from server.assets import AssetCache
+from server.profiler import profiler
+from server.stream_quality import AUTO, PROFILES, AdaptiveQuality, VariantCache, parse_profile
+from server.telemetry import TelemetryPublisher
+from server.telemetry_store import VALUE_COLUMNS, TelemetryStore
+startup.mark('imports')
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+log_listener = configure_logging()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'robotcontrol2024'
 socketio = SocketIO(app)
 
-# Initialize hardware controllers
-motor_controller = MotorController()
-servo_controller = ServoController()
-camera_stream = CameraStream().start()
+# Initialize hardware controllers; only the control path is brought up at import
+if HARDWARE_MODE == 'daemon':
+    # server.hardware_daemon owns the hardware; this process only talks to it
+    from server.hardware_client import HardwareClient
+    hardware_client = HardwareClient(on_battery=lambda status: battery_status_callback(status))
+    control_loop = hardware_client.control
+    session_recorder = hardware_client.recorder
+    telemetry_store = hardware_client.telemetry_store
+else:
+    hardware_client = None
+    pwm_manager = PWMChannelManager()
+    motor_controller = MotorController(pwm_manager)
+    servo_controller = ServoController(pwm_manager)
+    telemetry_store = TelemetryStore()
+    control_loop = ControlLoop(motor_controller, servo_controller, store=telemetry_store).start()
+    session_recorder = recorder.SessionRecorder()
+assets = AssetCache(app)
+control_sequences = control_protocol.SequenceFilter()
+variant_cache = VariantCache()
+startup.mark('control_ready')
+
+# Camera and battery monitor are started by start_background_services()
+camera_stream = None
+battery_monitor = None
+camera_ready = threading.Event()
+_camera_callbacks = []
+_peripherals_lock = threading.Lock()
+_peripherals_started = False
+# Distinguishes snapshot ETags across restarts, when frame sequences start over
+stream_epoch = format(int(time.time()), 'x')
+
+# Metrics
+COMMANDS_RECEIVED = metrics.REGISTRY.counter(
+    'robot_commands_received_total', 'Drive/steer commands received from clients')
+COMMANDS_DROPPED = metrics.REGISTRY.counter(
+    'robot_commands_stale_total', 'Binary commands dropped as out of order')
+DECODE_DURATION = metrics.REGISTRY.histogram(
+    'robot_command_decode_seconds', 'Time spent decoding a control command')
+STREAM_SEND_DURATION = metrics.REGISTRY.histogram(
+    'robot_stream_send_seconds', 'Time spent delivering one frame to a viewer')
+STREAM_FRAMES_SENT = metrics.REGISTRY.counter(
+    'robot_stream_frames_sent_total', 'Frames delivered to /video_feed viewers')
+STREAM_FRAMES_SKIPPED = metrics.REGISTRY.counter(
+    'robot_stream_frames_skipped_total', 'Frames skipped by viewers that fell behind')
+SOCKET_CLIENTS = metrics.REGISTRY.gauge(
+    'robot_socket_clients', 'Connected Socket.IO clients')
+metrics.REGISTRY.gauge(
+    'robot_stream_viewers', 'Connected /video_feed viewers',
+    function=lambda: camera_stream.broadcaster.client_count() if camera_stream else 0)
+
+battery_alert = None
+
+BATTERY_ALERTS = {
+    'critical': {
+        'level': 'critical',
+        'message': 'CRITICAL BATTERY LEVEL! Please charge immediately!'
+    },
+    'warning': {
+        'level': 'warning',
+        'message': 'Low battery warning. Please charge soon.'
+    }
+}
+
+def emit_to(event, data, sid):
+    """Emit an event to one client (rebound by server.asgi_app in ASGI mode)"""
+    socketio.emit(event, data, to=sid)
 
 def battery_status_callback(status):
-    """Callback for battery status updates"""
-    socketio.emit('battery_status', status)
-    if status['is_critical']:
-        socketio.emit('battery_alert', {
-            'level': 'critical',
-            'message': 'CRITICAL BATTERY LEVEL! Please charge immediately!'
-        })
-    elif status['is_low']:
-        socketio.emit('battery_alert', {
-            'level': 'warning',
-            'message': 'Low battery warning. Please charge soon.'
-        })
-
-# Initialize battery monitor
-battery_monitor = BatteryMonitor(callback=battery_status_callback)
+    """Callback for battery status updates; clients see them through telemetry"""
+    global battery_alert
+    session_recorder.record_telemetry('battery', status)
+    level = 'critical' if status['is_critical'] else 'warning' if status['is_low'] else None
+    battery_alert = BATTERY_ALERTS.get(level)
+
+def battery_status():
+    """Current battery status, or None while the monitor is starting"""
+    return battery_monitor.get_status() if battery_monitor else None
+
+def telemetry_state():
+    """Snapshot of everything the telemetry channel reports"""
+    # In daemon mode these are the daemon's last pushes, None while it is unreachable
+    state = control_loop.get_state() or {'wheel_speeds': None, 'servo_angles': None}
+    camera_stats = camera_stream.get_stats() if camera_stream else None
+    state.update({
+        'battery': battery_status(),
+        'battery_alert': battery_alert,
+        # Whole frames per second, so measurement jitter does not count as a change
+        'camera_fps': round(camera_stats['fps']) if camera_stats else None,
+        'clients': SOCKET_CLIENTS.value,
+        'viewers': camera_stream.broadcaster.client_count() if camera_stream else 0,
+        'hardware_connected': hardware_client.connected.is_set() if hardware_client else True
+    })
+    return state
+
+# Late-bound so server.asgi_app can rebind emit_to
+telemetry = TelemetryPublisher(telemetry_state, lambda event, data, sid: emit_to(event, data, sid))
+
+def when_camera_ready(callback):
+    """Call ``callback(camera_stream)`` once the camera is up (now, if it already is)"""
+    with _peripherals_lock:
+        if not camera_ready.is_set():
+            _camera_callbacks.append(callback)
+            return
+    callback(camera_stream)
+
+def start_background_services():
+    """
+    Bring up the camera and battery monitor on background threads, so the
+    server can bind and accept control connections while they initialize
+    """
+    global _peripherals_started
+    with _peripherals_lock:
+        if _peripherals_started:
+            return
+        _peripherals_started = True
+    telemetry.start()
+    if hardware_client is not None:
+        threading.Thread(target=_connect_hardware, name='startup-hardware', daemon=True).start()
+        return
+    camera_thread = threading.Thread(target=_start_camera, name='startup-camera', daemon=True)
+    battery_thread = threading.Thread(target=_start_battery, name='startup-battery', daemon=True)
+    camera_thread.start()
+    battery_thread.start()
+
+    def report():
+        camera_thread.join()
+        battery_thread.join()
+        startup.log_report()
+    threading.Thread(target=report, name='startup-report', daemon=True).start()
+
+def _start_camera():
+    global camera_stream
+    try:
+        with startup.phase('camera_ready'):
+            # Deferred: pulls in picamera (or PIL for the mock) and numpy
+            from hardware.camera_stream import CameraStream
+            camera_stream = CameraStream().start()
+    except Exception as e:
+        logging.error('Camera unavailable: %s', e)
+        return
+    variant_cache.encode_pool = camera_stream.encode_pool
+    session_recorder.attach(camera_stream.broadcaster)
+    if RECORDER_AUTOSTART:
+        session_recorder.start()
+    _camera_started()
+
+def _camera_started():
+    with _peripherals_lock:
+        camera_ready.set()
+        callbacks = list(_camera_callbacks)
+        _camera_callbacks.clear()
+    for callback in callbacks:
+        callback(camera_stream)
+
+def _start_battery():
+    global battery_monitor
+    with startup.phase('battery_ready'):
+        # Deferred: the ADC driver imports are slow on the Pi
+        from hardware.battery_monitor import BatteryMonitor
+        battery_monitor = BatteryMonitor(callback=battery_status_callback, store=telemetry_store)
+
+def _connect_hardware():
+    global camera_stream, battery_monitor
+    with startup.phase('hardware_connected'):
+        hardware_client.connect()
+    battery_monitor = hardware_client.battery
+    camera_stream = hardware_client.camera
+    _camera_started()
+    startup.log_report()
+
+def send_asset(asset, versioned=False):
+    """Serve a cached asset, honouring Accept-Encoding and If-None-Match"""
+    status, headers, body = asset.respond(request.headers.get('Accept-Encoding', ''),
+                                          request.headers.get('If-None-Match', ''), versioned)
+    return Response(body, status, headers)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    """The index page, rendered once by assets.build()"""
+    asset, _ = assets.find('/')
+    return send_asset(asset)
+
+def static_file(filename):
+    """Replaces Flask's static view; files added after startup fall back to it"""
+    asset, versioned = assets.find(f'{app.static_url_path}/{filename}', request.args.get('v'))
+    if asset is None:
+        return app.send_static_file(filename)
+    return send_asset(asset, versioned)
 
-def generate_frames():
+app.view_functions['static'] = static_file
+
+def generate_frames(profile=AUTO):
     """Generate camera frames for streaming"""
-    while True:
-        frame = camera_stream.read()
-        if frame is not None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    subscriber = camera_stream.broadcaster.subscribe()
+    quality = AdaptiveQuality(profile)
+    skipped = 0
+    try:
+        # Blocks until a new frame is published; slow viewers skip to the newest
+        for frame in subscriber:
+            variant = variant_cache.get(subscriber.last_sequence, frame, quality.profile)
+            sent = metrics.now()
+            # WSGI needs bytes; the payload copy is made once per frame and shared
+            yield from variant.byte_chunks()
+            elapsed = metrics.now() - sent
+            STREAM_SEND_DURATION.observe(elapsed)
+            STREAM_FRAMES_SENT.inc()
+            quality.record(elapsed, subscriber.frames_skipped - skipped)
+            skipped = subscriber.frames_skipped
+    finally:
+        STREAM_FRAMES_SKIPPED.inc(subscriber.frames_skipped)
+        subscriber.close()
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route"""
-    return Response(generate_frames(),
+    """Video streaming route; ?profile= pins a quality level, default adapts"""
+    try:
+        profile = parse_profile(request.args.get('profile'))
+    except ValueError as e:
+        return str(e), 400
+    if camera_stream is None:
+        return 'Camera starting', 503
+    return Response(generate_frames(profile),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/snapshot.jpg')
+def snapshot():
+    """Latest frame as a single JPEG, with ETag revalidation"""
+    try:
+        profile = parse_profile(request.args.get('profile'))
+    except ValueError as e:
+        return str(e), 400
+    if profile == AUTO:
+        profile = 'full'
+    if camera_stream is None:
+        return 'Camera starting', 503
+
+    sequence, frame = camera_stream.broadcaster.take(0)
+    if frame is None:
+        return 'No frame available', 503
+    try:
+        etag = f'{stream_epoch}-{sequence}-{profile}'
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            variant = variant_cache.get(sequence, frame, PROFILES[profile])
+            response = Response(variant.tobytes(), mimetype='image/jpeg')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    finally:
+        frame.release()
+
+@app.route('/debug/hardware_events')
+def debug_hardware_events():
+    """Dump recent hardware events from the in-memory ring buffer"""
+    limit = request.args.get('limit', type=int)
+    return jsonify(hardware_events.dump(limit))
+
+@app.route('/battery_history')
+def battery_history():
+    """Recent filtered battery voltage samples"""
+    limit = request.args.get('limit', type=int)
+    if battery_monitor is None:
+        return jsonify([])
+    return jsonify([
+        {'time': timestamp, 'voltage': voltage}
+        for timestamp, voltage in battery_monitor.get_history(limit)
+    ])
+
+@app.route('/recording')
+def recording_status():
+    """Recorder state, including records dropped because the disk fell behind"""
+    return jsonify(session_recorder.get_status())
+
+@app.route('/recording/start', methods=['POST'])
+def recording_start():
+    session_recorder.start()
+    return jsonify(session_recorder.get_status())
+
+@app.route('/recording/stop', methods=['POST'])
+def recording_stop():
+    session_recorder.stop()
+    return jsonify(session_recorder.get_status())
+
+@app.route('/recording/telemetry')
+def recording_telemetry():
+    """Recorded telemetry between ?start= and ?end= (epoch seconds)"""
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    limit = request.args.get('limit', 1000, type=int)
+    events = []
+    for _, timestamp, payload in recorder.read_records(start, end, recorder.RECORD_TELEMETRY,
+                                                    session_recorder.directory):
+        events.append({'time': timestamp, **json.loads(payload)})
+        if len(events) >= limit:
+            break
+    return jsonify(events)
+
+@app.route('/telemetry/history')
+def telemetry_history():
+    """
+    Battery and actuator history as min/max/mean buckets
+    ?start= and ?end= are epoch seconds (default: the last hour), ?buckets= the
+    number of points, ?columns= a comma-separated subset of the stored columns
+    """
+    end = request.args.get('end', time.time(), type=float)
+    start = request.args.get('start', end - 3600, type=float)
+    buckets = request.args.get('buckets', 500, type=int)
+    columns = request.args.get('columns')
+    columns = tuple(columns.split(',')) if columns else VALUE_COLUMNS
+    unknown = set(columns) - set(VALUE_COLUMNS)
+    if unknown:
+        return jsonify({'error': f"Unknown columns: {', '.join(sorted(unknown))}",
+                        'columns': list(VALUE_COLUMNS)}), 400
+    if not (math.isfinite(start) and math.isfinite(end)):
+        return jsonify({'error': 'start and end must be finite epoch seconds'}), 400
+    if end <= start or not 1 <= buckets <= TELEMETRY_HISTORY_MAX_BUCKETS:
+        return jsonify({'error': f'Need end > start and 1-{TELEMETRY_HISTORY_MAX_BUCKETS} buckets'}), 400
+    return jsonify(telemetry_store.query(start, end, buckets, columns))
+
+def generate_replay(start, speed):
+    """Replay recorded frames, paced by their recorded timestamps"""
+    origin = None
+    for _, timestamp, payload in recorder.read_records(start, record_type=recorder.RECORD_FRAME,
+                                                    directory=session_recorder.directory):
+        if origin is None:
+            origin = (time.monotonic(), timestamp)
+        else:
+            delay = origin[0] + (timestamp - origin[1]) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield multipart_header(len(payload))
+        yield payload
+        yield MULTIPART_TRAILER
+
+@app.route('/replay')
+def replay():
+    """Recorded video from ?start= (epoch seconds, default oldest) at ?speed="""
+    start = request.args.get('start', type=float)
+    speed = request.args.get('speed', 1.0, type=float)
+    if speed <= 0:
+        return 'speed must be positive', 400
+    return Response(generate_replay(start, speed),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/debug/startup')
+def debug_startup():
+    """Startup milestone timings for tracking boot latency"""
+    return jsonify(startup.report())
+
+def require_debug_token(view):
+    """Only serve ``view`` to requests carrying DEBUG_TOKEN as a bearer token"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not DEBUG_TOKEN:
+            return 'Disabled: set ROBOT_DEBUG_TOKEN to enable', 403
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode()):
+            return 'Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/debug/profile/start', methods=['POST'])
+@require_debug_token
+def profile_start():
+    """Sample every thread's stack for ?seconds= (default 10) every ?interval= seconds"""
+    seconds = request.args.get('seconds', 10.0, type=float)
+    interval = request.args.get('interval', type=float)
+    if not (math.isfinite(seconds) and seconds > 0) or (
+            interval is not None and not (math.isfinite(interval) and interval > 0)):
+        return 'seconds and interval must be positive finite numbers', 400
+    try:
+        profiler.start(seconds, interval)
+    except ValueError as e:
+        return str(e), 400
+    except RuntimeError as e:
+        return str(e), 409
+    return jsonify(profiler.summary())
+
+@app.route('/debug/profile/stop', methods=['POST'])
+@require_debug_token
+def profile_stop():
+    profiler.stop()
+    return jsonify(profiler.summary())
+
+@app.route('/debug/profile')
+@require_debug_token
+def profile_summary():
+    """Per-thread CPU and per-handler wall/CPU time of the current or last capture"""
+    return jsonify(profiler.summary(request.args.get('top', 20, type=int)))
+
+@app.route('/debug/profile/collapsed')
+@require_debug_token
+def profile_collapsed():
+    """Collapsed stacks for flame graph tools; ?idle=1 includes blocked threads"""
+    include_idle = request.args.get('idle', type=int) == 1
+    return Response(profiler.collapsed(include_idle), mimetype='text/plain')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose latency and throughput metrics in Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 @socketio.on('connect')
 def handle_connect():
     logging.info('Client connected')
-    # Send initial battery status
-    socketio.emit('battery_status', battery_monitor.get_status())
+    startup.mark('first_client')
+    SOCKET_CLIENTS.inc()
+    telemetry.add(request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    release_client(request.sid)
+
+def release_client(sid):
+    """Forget a disconnected client and bring the robot to a stop"""
     logging.info('Client disconnected')
-    motor_controller.stop()
-    servo_controller.center_all()
+    SOCKET_CLIENTS.dec()
+    telemetry.remove(sid)
+    control_sequences.forget(sid)
+    control_loop.emergency_stop()
+
+def apply_drive(speed, turn, received_at=None):
+    """Convert speed/turn into differential wheel speeds and queue them"""
+    # Implement differential drive
+    left_speed = speed + turn
+    right_speed = speed - turn
+
+    # Normalize speeds
+    max_speed = max(abs(left_speed), abs(right_speed), 100)
+    if max_speed > 100:
+        left_speed = (left_speed * 100) / max_speed
+        right_speed = (right_speed * 100) / max_speed
+
+    control_loop.submit_drive(left_speed, right_speed, received_at)
+    startup.mark('first_command')
+    session_recorder.record_telemetry('drive', {
+        'speed': speed, 'turn': turn, 'left': left_speed, 'right': right_speed
+    })
+
+def apply_steer(angle, received_at=None):
+    """Queue a steering angle"""
+    control_loop.submit_steer(angle, received_at)
+    startup.mark('first_command')
+    session_recorder.record_telemetry('steer', {'angle': angle})
 
 @socketio.on('drive')
+@profiler.timed
 def handle_drive(data):
     """Handle drive joystick input"""
+    received_at = metrics.now()
+    COMMANDS_RECEIVED.inc()
     try:
         speed = data['speed']
         turn = data['turn']
-
-        # Implement differential drive
-        left_speed = speed + turn
-        right_speed = speed - turn
-
-        # Normalize speeds
-        max_speed = max(abs(left_speed), abs(right_speed), 100)
-        if max_speed > 100:
-            left_speed = (left_speed * 100) / max_speed
-            right_speed = (right_speed * 100) / max_speed
-
-        motor_controller.set_speed(left_speed)
-        logging.debug(f'Drive command: speed={speed}, turn={turn}')
+        apply_drive(speed, turn, received_at)
+        logging.debug('Drive command: speed=%s, turn=%s', speed, turn)
     except Exception as e:
-        logging.error(f'Error in drive command: {e}')
+        logging.error('Error in drive command: %s', e)
 
 @socketio.on('steer')
+@profiler.timed
 def handle_steer(data):
     """Handle steering joystick input"""
+    received_at = metrics.now()
+    COMMANDS_RECEIVED.inc()
     try:
         angle = data['angle']
-        for servo in ['FRONT_LEFT', 'FRONT_RIGHT', 'REAR_LEFT', 'REAR_RIGHT']:
-            servo_controller.set_angle(servo, 90 + angle)
-        logging.debug(f'Steer command: angle={angle}')
+        apply_steer(angle, received_at)
+        logging.debug('Steer command: angle=%s', angle)
     except Exception as e:
-        logging.error(f'Error in steer command: {e}')
+        logging.error('Error in steer command: %s', e)
+
+@socketio.on('control')
+def handle_control(data):
+    """Handle binary-encoded drive/steer input"""
+    process_control(request.sid, data)
+
+@profiler.timed
+def process_control(sid, data):
+    """Decode a binary control message from a client and queue it"""
+    received_at = metrics.now()
+    COMMANDS_RECEIVED.inc()
+    try:
+        message = control_protocol.decode(data)
+        DECODE_DURATION.observe_since(received_at)
+        if not control_sequences.accept(sid, message):
+            COMMANDS_DROPPED.inc()
+            return
+        if message.msg_type == control_protocol.MSG_DRIVE:
+            apply_drive(message.y * 100, message.x * 100, received_at)
+        elif message.msg_type == control_protocol.MSG_STEER:
+            apply_steer(message.x * 90, received_at)
+        else:
+            logging.warning('Unknown control message type: %s', message.msg_type)
+    except Exception as e:
+        logging.error('Error in control command: %s', e)
 
 @socketio.on('emergency_stop')
 def handle_emergency_stop():
     """Handle emergency stop button"""
     try:
-        motor_controller.stop()
-        servo_controller.center_all()
+        control_loop.emergency_stop()
         logging.info('Emergency stop activated')
     except Exception as e:
-        logging.error(f'Error in emergency stop: {e}')
+        logging.error('Error in emergency stop: %s', e)
 
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -119,14 +559,55 @@ def handle_error(error):
 
 def cleanup():
     """Cleanup GPIO and camera resources"""
-    camera_stream.stop()
+    telemetry.stop()
+    if hardware_client is not None:
+        # The daemon keeps the hardware; it stops the robot when we disconnect
+        hardware_client.close()
+        log_listener.stop()
+        return
+    control_loop.stop()
+    session_recorder.stop()
+    if camera_stream:
+        camera_stream.stop()
     motor_controller.cleanup()
     servo_controller.cleanup()
-    battery_monitor.stop()
+    if battery_monitor:
+        battery_monitor.stop()
+    telemetry_store.close()
+    # Released last: both controllers write to the shared channels while stopping
+    pwm_manager.cleanup()
     GPIO.cleanup()
+    log_listener.stop()
+
+# Every route is registered; pre-render the pages and compress the static files
+with startup.phase('assets_ready'):
+    assets.build()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Robot control web server')
+    parser.add_argument('--server', choices=['threading', 'asgi'], default=SERVER_MODE,
+                        help='threading: Flask-SocketIO dev server; asgi: AsyncServer on uvicorn')
+    parser.add_argument('--port', type=int, default=WEB_PORT)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='ASGI worker processes (needs HARDWARE_MODE = daemon)')
+    args = parser.parse_args()
+    if args.workers > 1:
+        if args.server != 'asgi' or HARDWARE_MODE != 'daemon':
+            parser.error('--workers needs --server asgi and HARDWARE_MODE = daemon')
+        from server import asgi_app
+        # Each worker process imports app and connects to the daemon itself
+        asgi_app.run_workers(args.workers, port=args.port)
+        sys.exit()
+    # Bind and serve control straight away; camera and ADC come up meanwhile
+    start_background_services()
     try:
-        socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+        if args.server == 'asgi':
+            from server import asgi_app
+            asgi_app.run(sys.modules[__name__], port=args.port)
+        else:
+            # The reloader would import (and open the hardware) a second time, and
+            # without a TTY (under systemd) Werkzeug refuses to start unless allowed
+            socketio.run(app, host='0.0.0.0', port=args.port, debug=True, use_reloader=False,
+                         allow_unsafe_werkzeug=True)
     finally:
-        cleanup()
\ No newline at end of file
+        cleanup()
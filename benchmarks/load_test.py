@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Headless load generator for the robot control server
+
+Boots app.py against the mock GPIO/camera backends, drives it with simulated
+Socket.IO controllers and /video_feed viewers, and writes a JSON report that
+can be compared across commits.
+
+Example:
+    python benchmarks/load_test.py --clients 10 --rate 60 --viewers 4 --duration 30
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from server import control_protocol
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+logger = logging.getLogger(__name__)
+
+SERVER_BOOTSTRAP = {
+    'threading': (
+        "import app; app.start_background_services(); "
+        "app.socketio.run(app.app, host='127.0.0.1', port={port}, "
+        "allow_unsafe_werkzeug=True, use_reloader=False)"
+    ),
+    'asgi': (
+        "import app; from server import asgi_app; "
+        "asgi_app.run(app, host='127.0.0.1', port={port})"
+    ),
+}
+FRAME_BOUNDARY = b'--frame\r\n'
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class ProcessSampler(threading.Thread):
+    def __init__(self, pid, interval=1.0):
+        """
+        Periodically sample CPU and RSS of a process from /proc
+        :param pid: Process to sample
+        :param interval: Seconds between samples
+        """
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+
+    def _read(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+        rss_kb = 0
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_kb = int(line.split()[1])
+                    break
+        return cpu_ticks, rss_kb
+
+    def run(self):
+        try:
+            last_ticks, _ = self._read()
+            last_time = time.monotonic()
+            while not self.stopped.wait(self.interval):
+                ticks, rss_kb = self._read()
+                now = time.monotonic()
+                cpu_percent = (ticks - last_ticks) / self.clock_ticks / (now - last_time) * 100
+                self.samples.append({
+                    'elapsed': round(now - self.start_time, 3),
+                    'cpu_percent': round(cpu_percent, 1),
+                    'rss_kb': rss_kb
+                })
+                last_ticks, last_time = ticks, now
+        except FileNotFoundError:
+            logger.warning("Process %d exited while sampling", self.pid)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        super().start()
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        cpu = [s['cpu_percent'] for s in self.samples]
+        rss = [s['rss_kb'] for s in self.samples]
+        return {
+            'cpu_percent_mean': round(sum(cpu) / len(cpu), 1),
+            'cpu_percent_max': max(cpu),
+            'rss_kb_start': rss[0],
+            'rss_kb_end': rss[-1],
+            'rss_kb_growth': rss[-1] - rss[0],
+            'samples': self.samples
+        }
+
+
+class ControlClient(threading.Thread):
+    def __init__(self, url, rate, duration, binary=True):
+        """
+        Simulated operator sending drive/steer commands at a fixed rate
+        :param url: Server base URL
+        :param rate: Commands per second
+        :param duration: Seconds to send for
+        :param binary: Use the binary control protocol instead of JSON
+        """
+        super().__init__(daemon=True)
+        self.url = url
+        self.rate = rate
+        self.duration = duration
+        self.binary = binary
+        self.sent = 0
+        self.errors = 0
+
+    def run(self):
+        client = socketio.Client(reconnection=False)
+        try:
+            client.connect(self.url, transports=['websocket'])
+        except Exception as e:
+            logger.error("Control client failed to connect: %s", e)
+            self.errors += 1
+            return
+
+        period = 1.0 / self.rate
+        start = time.monotonic()
+        deadline = start
+        sequence = 0
+        while time.monotonic() - start < self.duration:
+            phase = (time.monotonic() - start) % 2.0 - 1.0  # sweep -1..1
+            sequence += 1
+            try:
+                if sequence % 2:
+                    if self.binary:
+                        client.emit('control', control_protocol.encode(
+                            control_protocol.MSG_DRIVE, sequence, time.monotonic() * 1000, phase / 2, phase))
+                    else:
+                        client.emit('drive', {'speed': phase * 100, 'turn': phase * 50})
+                else:
+                    if self.binary:
+                        client.emit('control', control_protocol.encode(
+                            control_protocol.MSG_STEER, sequence, time.monotonic() * 1000, phase, 0))
+                    else:
+                        client.emit('steer', {'angle': phase * 90})
+                self.sent += 1
+            except Exception:
+                self.errors += 1
+            deadline += period
+            time.sleep(max(0, deadline - time.monotonic()))
+        client.disconnect()
+
+
+class StreamViewer(threading.Thread):
+    def __init__(self, host, port, duration, path='/video_feed'):
+        """
+        Simulated /video_feed viewer counting delivered frames
+        :param duration: Seconds to watch for
+        """
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.duration = duration
+        self.path = path
+        self.frames = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.error = None
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        try:
+            conn.request('GET', self.path)
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {response.read(200).decode(errors='replace')}")
+            carry = b''
+            start = time.monotonic()
+            while time.monotonic() - start < self.duration:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                self.bytes += len(chunk)
+                data = carry + chunk
+                self.frames += data.count(FRAME_BOUNDARY)
+                carry = data[-(len(FRAME_BOUNDARY) - 1):]
+            self.elapsed = time.monotonic() - start
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            conn.close()
+
+    def summary(self):
+        elapsed = self.elapsed or 1
+        return {
+            'frames': self.frames,
+            # A failed viewer is an error, not a 0 fps sample
+            'fps': None if self.error else round(self.frames / elapsed, 2),
+            'kbytes_per_second': round(self.bytes / elapsed / 1024, 1),
+            'error': self.error
+        }
+
+
+def histogram_percentiles(text, name, percentiles=PERCENTILES):
+    """
+    Estimate percentiles from a Prometheus histogram by linear interpolation
+    :return: Dict of percentile -> seconds, plus count and mean
+    """
+    buckets = []
+    for bound, count in re.findall(rf'^{name}_bucket{{le="([^"]+)"}} (\S+)$', text, re.M):
+        buckets.append((float(bound), float(count)))
+    total_match = re.search(rf'^{name}_sum (\S+)$', text, re.M)
+    if not buckets or not buckets[-1][1]:
+        return {'count': 0}
+
+    total = buckets[-1][1]
+    result = {'count': int(total), 'mean': float(total_match.group(1)) / total}
+    for p in percentiles:
+        target = p * total
+        previous_bound, previous_count = 0.0, 0.0
+        for bound, count in buckets:
+            if count >= target:
+                if bound == float('inf'):
+                    value = previous_bound
+                else:
+                    span = count - previous_count
+                    fraction = (target - previous_count) / span if span else 0
+                    value = previous_bound + (bound - previous_bound) * fraction
+                result[f'p{int(p * 100)}'] = value
+                break
+            previous_bound, previous_count = bound, count
+    return result
+
+
+def scrape_metrics(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        conn.request('GET', '/metrics')
+        return conn.getresponse().read().decode()
+    finally:
+        conn.close()
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def wait_for_camera(host, port, timeout=30):
+    """Poll /debug/startup until the camera_ready milestone is reached"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        try:
+            conn.request('GET', '/debug/startup')
+            response = conn.getresponse()
+            if response.status == 200 and 'camera_ready' in json.loads(response.read())['marks']:
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.2)
+    return False
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_benchmark(args):
+    host = '127.0.0.1'
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    server = subprocess.Popen(
+        [sys.executable, '-c', SERVER_BOOTSTRAP[args.server].format(port=args.port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_port(host, args.port):
+            raise RuntimeError("Server did not start listening")
+        logger.info("Server pid %d listening on %d", server.pid, args.port)
+        if args.viewers and not wait_for_camera(host, args.port):
+            raise RuntimeError("Camera did not start")
+
+        sampler = ProcessSampler(server.pid, args.sample_interval)
+        sampler.start()
+
+        url = f'http://{host}:{args.port}'
+        controllers = [ControlClient(url, args.rate, args.duration, not args.json)
+                       for _ in range(args.clients)]
+        viewers = [StreamViewer(host, args.port, args.duration) for _ in range(args.viewers)]
+        for worker in controllers + viewers:
+            worker.start()
+        for worker in controllers + viewers:
+            worker.join(args.duration + 15)
+
+        # Let the control loop drain its mailbox before scraping
+        time.sleep(0.5)
+        metrics_text = scrape_metrics(host, args.port)
+        sampler.stopped.set()
+        sampler.join()
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'commands_sent': sum(c.sent for c in controllers),
+        'command_errors': sum(c.errors for c in controllers),
+        'command_latency': histogram_percentiles(metrics_text, 'robot_command_latency_seconds'),
+        'command_apply': histogram_percentiles(metrics_text, 'robot_control_apply_seconds'),
+        'viewer_errors': sum(1 for v in viewers if v.error),
+        'viewers': [v.summary() for v in viewers],
+        'server_process': sampler.summary()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=4, help='simulated Socket.IO controllers')
+    parser.add_argument('--rate', type=float, default=60, help='commands per second per controller')
+    parser.add_argument('--viewers', type=int, default=2, help='concurrent /video_feed viewers')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load')
+    parser.add_argument('--port', type=int, default=5099, help='port for the server under test')
+    parser.add_argument('--server', choices=sorted(SERVER_BOOTSTRAP), default='threading',
+                        help='server mode to benchmark')
+    parser.add_argument('--json', action='store_true', help='send JSON drive/steer instead of binary')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='CPU/RSS sampling interval')
+    parser.add_argument('--output', help='result file (default benchmarks/results/<time>-<rev>.json)')
+    args = parser.parse_args()
+
+    if socketio is None and args.clients:
+        parser.error("python-socketio[client] is required for control clients")
+
+    results = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results',
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{results['revision']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    latency = results['command_latency']
+    process = results['server_process']
+    logger.info("Commands sent: %d (%d errors)", results['commands_sent'], results['command_errors'])
+    if latency.get('count'):
+        logger.info("Command latency p50=%.2fms p90=%.2fms p99=%.2fms",
+                    latency['p50'] * 1000, latency['p90'] * 1000, latency['p99'] * 1000)
+    for i, viewer in enumerate(results['viewers']):
+        if viewer['error']:
+            logger.error("Viewer %d failed: %s", i, viewer['error'])
+        else:
+            logger.info("Viewer %d: %.1f fps, %.0f KiB/s", i, viewer['fps'], viewer['kbytes_per_second'])
+    if process:
+        logger.info("Server CPU mean %.1f%% max %.1f%%, RSS %d -> %d KiB",
+                    process['cpu_percent_mean'], process['cpu_percent_max'],
+                    process['rss_kb_start'], process['rss_kb_end'])
+    logger.info("Results written to %s", output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import os
+
 # GPIO Pin Configuration
 MOTOR_PINS = {
     'FRONT_LEFT': {
@@ -31,7 +33,12 @@ SERVO_PINS = {
 
 # Battery Monitoring Configuration
 BATTERY_ADC_PIN = 26  # GPIO26 for battery voltage monitoring
-BATTERY_CHECK_INTERVAL = 10  # seconds
+BATTERY_SAMPLE_INTERVAL = 0.5  # seconds between filtered samples
+BATTERY_BURST_SIZE = 5  # raw ADC readings per sample (median taken)
+BATTERY_BURST_SPACING = 0.002  # seconds between raw readings in a burst
+BATTERY_EMA_ALPHA = 0.2  # smoothing weight of each new sample
+BATTERY_HISTORY_SIZE = 7200  # filtered samples kept in memory (1 hour)
+BATTERY_REPORT_DELTA = 0.1  # volts of change before clients are notified
 BATTERY_ALERT_THRESHOLD = 10.8  # volts for 3S LiPo (3.6V per cell)
 BATTERY_CRITICAL_THRESHOLD = 10.2  # volts
 BATTERY_MAX_VOLTAGE = 12.6  # volts (fully charged 3S LiPo)
@@ -40,7 +47,100 @@ BATTERY_MAX_VOLTAGE = 12.6  # volts (fully charged 3S LiPo)
 CAMERA_RESOLUTION = (640, 480)
 CAMERA_FRAMERATE = 24
 CAMERA_ROTATION = 180  # Adjust based on camera mounting
+CAMERA_CAPTURE_FORMAT = 'jpeg'  # 'jpeg' (encoded by the camera) or 'rgb' (encoded in software)
+CAMERA_JPEG_QUALITY = 85  # quality used when encoding raw captures
+CAMERA_QUEUE_SIZE = 2  # captured frames waiting for the encode stage
+ENCODE_WORKERS = 0  # JPEG encoder processes for raw captures and variants (0 encodes in-process)
+ENCODE_VARIANT_SLOTS = 4  # shared-memory slots for variant encodes running at once
+FRAME_BUFFER_CAPACITY = 128 * 1024  # initial bytes per pooled JPEG buffer
+FRAME_POOL_SIZE = 4  # idle frame buffers kept for reuse
+CHANGE_DETECTION = False  # skip frames that match the last published one (needs numpy)
+CHANGE_DOWNSAMPLE = 8  # thumbnail stride used for comparison
+CHANGE_PIXEL_THRESHOLD = 12  # grey levels a thumbnail pixel must move to count as changed
+CHANGE_AREA_THRESHOLD = 0.01  # fraction of changed thumbnail pixels that counts as motion
+CHANGE_KEEPALIVE_SECONDS = 1.0  # publish an unchanged frame at least this often
+
+# Stream quality ladder, best first: (name, scale, JPEG quality or None to keep the camera's)
+STREAM_PROFILES = [
+    ('full', 1.0, None),
+    ('full-low', 1.0, 50),
+    ('half', 0.5, 75),
+    ('half-low', 0.5, 45),
+    ('quarter', 0.25, 60),
+]
+STREAM_DOWNGRADE_UTILIZATION = 0.8  # send time / frame interval that counts as struggling
+STREAM_UPGRADE_UTILIZATION = 0.3  # send time / frame interval that counts as healthy
+STREAM_DOWNGRADE_FRAMES = 3  # consecutive struggling frames before stepping down
+STREAM_UPGRADE_FRAMES = 48  # consecutive healthy frames before stepping up
+
+# Hardware Daemon Configuration
+HARDWARE_MODE = 'local'  # 'local' (hardware in the web process) or 'daemon' (server.hardware_daemon)
+HARDWARE_SOCKET = '/tmp/robot-hardware.sock'  # Unix socket the hardware daemon listens on
+HARDWARE_REQUEST_TIMEOUT = 2.0  # seconds a worker waits for a daemon request
+
+# Recording Configuration
+RECORDER_DIRECTORY = 'recordings'  # segment files for recorded sessions
+RECORDER_SEGMENT_SECONDS = 60  # seconds per segment before rotating
+RECORDER_MAX_SEGMENTS = 30  # segments kept on disk; the oldest are deleted
+RECORDER_QUEUE_SIZE = 8  # records waiting for the disk before new ones are dropped
+RECORDER_INDEX_FLUSH = 24  # index entries batched per write (about one second of video)
+RECORDER_AUTOSTART = False  # start recording when the server starts
+
+# Telemetry Store Configuration
+TELEMETRY_STORE_DIRECTORY = 'telemetry'  # column files of battery/actuator history
+TELEMETRY_STORE_INTERVAL = 0.2  # minimum seconds between stored rows
+TELEMETRY_STORE_BATCH = 50  # rows buffered in memory before they are handed to the writer thread
+TELEMETRY_STORE_QUEUE_SIZE = 8  # full batches waiting for the writer before new ones are dropped
+TELEMETRY_STORE_CHUNK_ROWS = 1 << 16  # rows per file (about 2.9 MB)
+TELEMETRY_STORE_MAX_CHUNKS = 64  # files kept (at least 9 days at the full row rate)
+TELEMETRY_STORE_ROLLUP_SECONDS = 60  # bucket width of the per-file summaries used for long ranges
+TELEMETRY_HISTORY_MAX_BUCKETS = 5000  # most buckets one /telemetry/history request may ask for
 
 # Web Interface Configuration
 WEB_PORT = 5000
-SOCKET_PORT = 8000
\ No newline at end of file
+SOCKET_PORT = 8000
+SERVER_MODE = 'threading'  # 'threading' (Flask-SocketIO) or 'asgi' (AsyncServer on uvicorn)
+ASGI_EXECUTOR_WORKERS = 4  # threads for blocking GPIO/camera work in ASGI mode
+TELEMETRY_RATE = 5  # Hz, telemetry ticks sent to Socket.IO clients (changed fields only)
+
+# Static Asset Configuration
+ASSET_MAX_AGE = 31536000  # seconds browsers may cache a versioned (?v=<hash>) static file
+ASSET_GZIP_LEVEL = 9  # compression is done once at startup, so use the smallest output
+ASSET_MIN_COMPRESS_SIZE = 256  # bytes; smaller files are only served uncompressed
+
+# PWM Configuration
+MOTOR_PWM_FREQUENCY = 1000  # Hz
+SERVO_PWM_FREQUENCY = 50  # Hz
+PWM_DUTY_EPSILON = 0.1  # minimum duty cycle change (%) applied to hardware
+SERVO_DUTY_EPSILON = 0  # servo channels apply every change (one degree is ~0.056% duty)
+
+# Steering Configuration
+STEERING_MODE = 'counter'  # 'front' (rear wheels straight) or 'counter' (rear wheels counter-steer)
+STEERING_WHEELBASE_MM = 200  # front to rear axle distance
+STEERING_TRACK_MM = 160  # left to right wheel distance
+STEERING_TABLE_RESOLUTION = 2  # lookup table entries per degree of steering command
+
+# Control Loop Configuration
+CONTROL_LOOP_RATE = 50  # Hz, actuator updates per second
+
+# Simulation Configuration (mock GPIO when RPi.GPIO is unavailable)
+SIM_EVENT_LOG_SIZE = 1 << 18  # GPIO events kept by the simulator (about 3.5 MB)
+
+# Profiler Configuration
+DEBUG_TOKEN = os.environ.get('ROBOT_DEBUG_TOKEN')  # bearer token for /debug/profile (disabled if unset)
+PROFILER_INTERVAL = 0.01  # seconds between stack samples
+PROFILER_MAX_SECONDS = 120  # longest capture a request may ask for
+PROFILER_HANDLERS = (  # functions summarised individually (qualnames)
+    'handle_drive',
+    'handle_steer',
+    'process_control',
+    'ControlLoop.tick',
+    'CameraStream._update',
+    'CameraStream._encode_loop',
+    'BatteryMonitor._monitor_loop',
+    'TelemetryPublisher.tick',
+)
+
+# Logging Configuration
+LOG_LEVEL = 'INFO'  # console level; hardware events are always kept in memory
+HARDWARE_EVENT_BUFFER_SIZE = 2048  # most recent hardware log records retained
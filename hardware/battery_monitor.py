@@ -18,28 +18,40 @@ except ImportError:
             return 12.0
 
 import threading
-import time
 import logging
 from config import (
     BATTERY_ADC_PIN,
-    BATTERY_CHECK_INTERVAL,
+    BATTERY_SAMPLE_INTERVAL,
+    BATTERY_REPORT_DELTA,
     BATTERY_ALERT_THRESHOLD,
     BATTERY_CRITICAL_THRESHOLD,
     BATTERY_MAX_VOLTAGE
 )
+from hardware.battery_sampler import BatterySampler
+from server.metrics import REGISTRY, now
+
+CHECK_DURATION = REGISTRY.histogram(
+    'robot_battery_check_seconds', 'Time spent reading and evaluating the battery voltage')
+LOOP_INTERVAL = REGISTRY.histogram(
+    'robot_battery_loop_interval_seconds', 'Actual time between battery checks',
+    buckets=(0.1, 0.25, 0.5, 0.6, 0.75, 1, 2.5, 5, 10))
 
 class BatteryMonitor:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, store=None):
         """
         Initialize battery monitor
         :param callback: Function to call when battery status changes
+        :param store: Optional TelemetryStore that records every sample
         """
         self.callback = callback
+        self.store = store
         self.current_voltage = 0
         self.percentage = 100
         self.is_low = False
         self.is_critical = False
+        self.reported_voltage = None
         self.stopped = False
+        self._stop_event = threading.Event()
         
         try:
             # Initialize ADC for battery monitoring
@@ -49,6 +61,7 @@ class BatteryMonitor:
         except Exception as e:
             logging.warning(f"Using mock battery monitor: {e}")
             self.adc = AnalogIn(None, BATTERY_ADC_PIN)
+        self.sampler = BatterySampler(self.adc)
         
         # Start monitoring thread
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
@@ -57,15 +70,23 @@ class BatteryMonitor:
 
     def _monitor_loop(self):
         """Continuous monitoring loop"""
+        last_check = None
         while not self.stopped:
+            start = now()
+            if last_check is not None:
+                LOOP_INTERVAL.observe(start - last_check)
+            last_check = start
             self._check_battery()
-            time.sleep(BATTERY_CHECK_INTERVAL)
+            CHECK_DURATION.observe_since(start)
+            self._stop_event.wait(BATTERY_SAMPLE_INTERVAL)
 
     def _check_battery(self):
         """Check battery voltage and update status"""
         try:
-            # Read voltage from ADC
-            self.current_voltage = self.adc.voltage
+            # Read a filtered voltage from a burst of ADC samples
+            self.current_voltage = self.sampler.sample()
+            if self.store is not None:
+                self.store.record_battery(self.current_voltage)
             
             # Calculate battery percentage
             voltage_range = BATTERY_MAX_VOLTAGE - BATTERY_CRITICAL_THRESHOLD
@@ -81,8 +102,12 @@ class BatteryMonitor:
             self.is_low = self.current_voltage <= BATTERY_ALERT_THRESHOLD
             self.is_critical = self.current_voltage <= BATTERY_CRITICAL_THRESHOLD
             
-            # Notify if status changed
-            if self.callback and (was_low != self.is_low or was_critical != self.is_critical):
+            # Notify if a threshold was crossed or the voltage moved enough
+            changed = was_low != self.is_low or was_critical != self.is_critical
+            moved = (self.reported_voltage is None or
+                     abs(self.current_voltage - self.reported_voltage) >= BATTERY_REPORT_DELTA)
+            if self.callback and (changed or moved):
+                self.reported_voltage = self.current_voltage
                 self.callback(self.get_status())
                 
         except Exception as e:
@@ -97,9 +122,18 @@ class BatteryMonitor:
             'is_critical': self.is_critical
         }
 
+    def get_history(self, limit=None):
+        """
+        Get recent filtered voltage samples
+        :param limit: Only return the newest ``limit`` samples
+        :return: List of (timestamp, voltage) tuples, oldest first
+        """
+        return self.sampler.history(limit)
+
     def stop(self):
         """Stop the monitoring thread"""
         self.stopped = True
+        self._stop_event.set()
         if self.monitor_thread.is_alive():
             self.monitor_thread.join()
         logging.debug("Battery monitor stopped")
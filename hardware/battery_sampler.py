@@ -0,0 +1,70 @@
+import time
+from array import array
+from config import (
+    BATTERY_BURST_SIZE,
+    BATTERY_BURST_SPACING,
+    BATTERY_EMA_ALPHA,
+    BATTERY_HISTORY_SIZE
+)
+
+
+class BatterySampler:
+    def __init__(self, adc, capacity=BATTERY_HISTORY_SIZE, burst_size=BATTERY_BURST_SIZE,
+                 burst_spacing=BATTERY_BURST_SPACING, ema_alpha=BATTERY_EMA_ALPHA):
+        """
+        Burst ADC sampler with median + EMA filtering and a fixed-size history
+        :param adc: Object exposing a ``voltage`` attribute (AnalogIn)
+        :param capacity: Number of filtered samples kept in the ring buffer
+        :param burst_size: Raw readings taken per burst; their median is used
+        :param burst_spacing: Seconds between raw readings within a burst
+        :param ema_alpha: Weight of each new burst median in the moving average
+        """
+        self.adc = adc
+        self.capacity = capacity
+        self.burst_size = burst_size
+        self.burst_spacing = burst_spacing
+        self.ema_alpha = ema_alpha
+        self.voltages = array('f', bytes(4 * capacity))
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.index = 0
+        self.count = 0
+        self.filtered = None
+        self._burst = [0.0] * burst_size
+
+    def sample(self):
+        """
+        Take one burst of readings and record the filtered voltage
+        :return: Filtered voltage
+        """
+        burst = self._burst
+        for i in range(self.burst_size):
+            burst[i] = self.adc.voltage
+            if self.burst_spacing and i + 1 < self.burst_size:
+                time.sleep(self.burst_spacing)
+
+        # Median rejects motor-current spikes, EMA smooths what is left
+        median = sorted(burst)[self.burst_size // 2]
+        if self.filtered is None:
+            self.filtered = median
+        else:
+            self.filtered += self.ema_alpha * (median - self.filtered)
+
+        self.voltages[self.index] = self.filtered
+        self.timestamps[self.index] = time.time()
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return self.filtered
+
+    def history(self, limit=None):
+        """
+        Return recorded samples, oldest first
+        :param limit: Only return the newest ``limit`` samples
+        :return: List of (timestamp, voltage) tuples
+        """
+        count = self.count if not limit else min(limit, self.count)
+        start = (self.index - count) % self.capacity
+        return [
+            (self.timestamps[(start + i) % self.capacity],
+             round(self.voltages[(start + i) % self.capacity], 3))
+            for i in range(count)
+        ]
@@ -2,11 +2,47 @@ try:
     from picamera import PiCamera
 except ImportError:
     from hardware.mock_picamera import PiCamera
-import io
 import logging
+import queue
 import threading
-import time
-from config import CAMERA_RESOLUTION, CAMERA_FRAMERATE, CAMERA_ROTATION
+from config import (
+    CAMERA_RESOLUTION,
+    CAMERA_FRAMERATE,
+    CAMERA_ROTATION,
+    CAMERA_CAPTURE_FORMAT,
+    CAMERA_JPEG_QUALITY,
+    CAMERA_QUEUE_SIZE,
+    CHANGE_DETECTION,
+    ENCODE_WORKERS
+)
+from hardware.capture_scheduler import CaptureScheduler
+from hardware.change_detector import ChangeDetector
+from hardware.frame_broadcaster import FrameBroadcaster
+from hardware.frame_buffer import FramePool, CaptureOutput
+from server.metrics import REGISTRY, now
+
+logger = logging.getLogger(__name__)
+
+FRAME_INTERVAL = REGISTRY.histogram(
+    'robot_camera_frame_interval_seconds', 'Time between frames delivered by the camera')
+QUEUE_WAIT = REGISTRY.histogram(
+    'robot_camera_queue_wait_seconds', 'Time a captured frame waits for the encode stage')
+DETECT_DURATION = REGISTRY.histogram(
+    'robot_camera_change_detect_seconds', 'Time spent comparing a frame with the last published one')
+ENCODE_DURATION = REGISTRY.histogram(
+    'robot_camera_encode_seconds', 'Time spent encoding/sealing a captured frame')
+PUBLISH_DURATION = REGISTRY.histogram(
+    'robot_camera_publish_seconds', 'Time spent publishing a frame to viewers')
+FRAMES_CAPTURED = REGISTRY.counter(
+    'robot_camera_frames_total', 'Frames produced by the camera')
+FRAME_BYTES = REGISTRY.counter(
+    'robot_camera_frame_bytes_total', 'Encoded bytes produced by the camera')
+FRAMES_LATE = REGISTRY.counter(
+    'robot_camera_late_frames_total', 'Frames that arrived after their deadline')
+FRAMES_DROPPED = REGISTRY.counter(
+    'robot_camera_dropped_frames_total', 'Frame slots missed by the camera or the encode stage')
+FRAMES_UNCHANGED = REGISTRY.counter(
+    'robot_camera_unchanged_frames_total', 'Frames skipped because the scene did not change')
 
 class CameraStream:
     def __init__(self):
@@ -14,32 +50,199 @@ class CameraStream:
         self.camera.resolution = CAMERA_RESOLUTION
         self.camera.framerate = CAMERA_FRAMERATE
         self.camera.rotation = CAMERA_ROTATION
-        self.output = io.BytesIO()
-        self.frame = None
+        self.raw = CAMERA_CAPTURE_FORMAT != 'jpeg'
+        width, height = CAMERA_RESOLUTION
+        self.pool = FramePool()
+        self.encode_pool = None
+        self.in_flight = None
+        if ENCODE_WORKERS:
+            # Deferred: only pulls in multiprocessing when the pool is enabled
+            from hardware.encode_pool import EncodePool
+            self.encode_pool = EncodePool(CAMERA_RESOLUTION, raw=self.raw)
+        if self.encode_pool is not None and self.raw:
+            # Raw captures land straight in shared memory for the encoder processes
+            self.capture_pool = self.encode_pool.frames
+            self.in_flight = queue.Queue(maxsize=ENCODE_WORKERS)
+        elif self.raw:
+            # Raw captures get their own pool sized for a full RGB frame
+            self.capture_pool = FramePool(capacity=width * height * 3)
+        else:
+            self.capture_pool = self.pool
+        self.output = CaptureOutput(self.capture_pool.acquire())
+        self.scheduler = CaptureScheduler(CAMERA_FRAMERATE)
+        self.queue = queue.Queue(maxsize=CAMERA_QUEUE_SIZE)
+        self.encode_dropped = 0
+        self.unchanged = 0
+        self.detector = None
+        if CHANGE_DETECTION:
+            try:
+                self.detector = ChangeDetector(CAMERA_RESOLUTION, raw=self.raw)
+            except RuntimeError as e:
+                logger.warning("Change detection disabled: %s", e)
+        self.timings = {'interval': 0.0, 'queue_wait': 0.0, 'detect': 0.0, 'encode': 0.0,
+                        'publish': 0.0}
+        REGISTRY.gauge('robot_camera_frame_buffers', 'Frame buffers allocated by the pool',
+                       function=lambda: self.pool.allocated)
+        REGISTRY.gauge('robot_camera_fps', 'Measured camera frame rate',
+                       function=self.scheduler.fps)
+        self.broadcaster = FrameBroadcaster()
         self.stopped = False
-        logging.debug("Camera stream initialized")
+        logger.debug("Camera stream initialized")
 
     def start(self):
-        """Start the camera stream thread"""
+        """Start the capture and encode stage threads"""
         threading.Thread(target=self._update, daemon=True).start()
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+        if self.in_flight is not None:
+            threading.Thread(target=self._collect_loop, daemon=True).start()
         return self
 
     def _update(self):
-        """Continuously capture frames from the camera"""
-        for _ in self.camera.capture_continuous(self.output, format='jpeg', use_video_port=True):
+        """Capture stage: pull frames from the camera and queue them for encoding"""
+        last = None
+        for _ in self.camera.capture_continuous(self.output, format=CAMERA_CAPTURE_FORMAT,
+                                                use_video_port=True):
             if self.stopped:
                 return
+            captured = now()
+            if last is not None:
+                self.timings['interval'] = captured - last
+                FRAME_INTERVAL.observe(captured - last)
+            last = captured
+
+            missed = self.scheduler.mark(captured)
+            if missed:
+                FRAMES_LATE.inc()
+                FRAMES_DROPPED.inc(missed)
+
+            # Capture into a fresh buffer straight away; never wait on the encoder
+            buffer = self.output.swap(self.capture_pool.acquire())
+            self._enqueue((captured, buffer))
+
+    def _enqueue(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                # Encoder is behind: drop the oldest queued frame, keep the newest
+                try:
+                    _, stale = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                stale.release()
+                self.encode_dropped += 1
+                FRAMES_DROPPED.inc()
+
+    def _encode_loop(self):
+        """Encode stage: turn captured buffers into sealed JPEG frames and publish them"""
+        while not self.stopped:
+            try:
+                captured, buffer = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            started = now()
+            self.timings['queue_wait'] = started - captured
+            QUEUE_WAIT.observe(started - captured)
+
+            buffer.seal(b'image/x-rgb' if self.raw else b'image/jpeg')
+            if self.detector is not None:
+                try:
+                    changed = self.detector.changed(buffer.view, captured)
+                except Exception as e:
+                    logger.error("Error comparing frame: %s", e)
+                    changed = True
+                detected = now()
+                self.timings['detect'] = detected - started
+                DETECT_DURATION.observe(detected - started)
+                started = detected
+                if not changed:
+                    # Nothing moved: skip the encode and let viewers keep the last frame
+                    buffer.release()
+                    self.unchanged += 1
+                    FRAMES_UNCHANGED.inc()
+                    continue
+
+            if self.in_flight is not None:
+                # Blocks once every worker is busy; the capture queue then drops the oldest
+                self.in_flight.put((started, buffer, self.encode_pool.submit(buffer)))
+                continue
+            try:
+                frame = self._encode(buffer)
+            except Exception as e:
+                logger.error("Error encoding frame: %s", e)
+                buffer.release()
+                continue
+            self._publish(frame, started)
+
+    def _collect_loop(self):
+        """Publish frames from the encoder processes in capture order"""
+        while not self.stopped:
+            try:
+                started, slot, result = self.in_flight.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                frame = self.encode_pool.collect(slot, result, self.pool)
+            except Exception as e:
+                logger.error("Error encoding frame: %s", e)
+                continue
+            self._publish(frame, started)
+
+    def _publish(self, frame, started):
+        """Hand an encoded frame to the broadcaster and record the stage timings"""
+        encoded = now()
+        self.timings['encode'] = encoded - started
+        ENCODE_DURATION.observe(encoded - started)
+
+        self.broadcaster.publish(frame)
+        frame.release()
+        FRAMES_CAPTURED.inc()
+        FRAME_BYTES.inc(len(frame))
+        self.timings['publish'] = now() - encoded
+        PUBLISH_DURATION.observe_since(encoded)
+
+    def _encode(self, buffer):
+        """Return a sealed JPEG frame for a sealed capture buffer (consumes the buffer)"""
+        if not self.raw:
+            return buffer
+
+        from PIL import Image
+        try:
+            image = Image.frombuffer('RGB', CAMERA_RESOLUTION, buffer.view, 'raw', 'RGB', 0, 1)
+            frame = self.pool.acquire()
+            image.save(frame, format='JPEG', quality=CAMERA_JPEG_QUALITY)
+            return frame.seal()
+        finally:
+            buffer.release()
 
-            self.frame = self.output.getvalue()
-            self.output.seek(0)
-            self.output.truncate()
-            time.sleep(1/CAMERA_FRAMERATE)
+    def get_stats(self):
+        """Measured frame rate, drop counts and the latest per-stage timings"""
+        return {
+            'fps': round(self.scheduler.fps(), 2),
+            'target_fps': CAMERA_FRAMERATE,
+            'frames': self.scheduler.frames,
+            'late': self.scheduler.late,
+            'dropped': self.scheduler.dropped,
+            'encode_dropped': self.encode_dropped,
+            'unchanged': self.unchanged,
+            'timings': {stage: round(value, 6) for stage, value in self.timings.items()}
+        }
 
     def read(self):
-        """Return the most recent frame"""
-        return self.frame
+        """Return a copy of the most recent frame as bytes"""
+        _, frame = self.broadcaster.take(0)
+        if frame is None:
+            return None
+        try:
+            return frame.tobytes()
+        finally:
+            frame.release()
 
     def stop(self):
         """Stop the camera stream"""
         self.stopped = True
-        self.camera.close()
\ No newline at end of file
+        self.broadcaster.close()
+        self.camera.close()
+        if self.encode_pool is not None:
+            self.encode_pool.close()
@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+
+
+class CaptureScheduler:
+    def __init__(self, framerate):
+        """
+        Track frame arrivals against absolute monotonic deadlines
+        :param framerate: Target frames per second
+        """
+        self.period = 1.0 / framerate
+        self.next_deadline = None
+        self.frames = 0
+        self.late = 0
+        self.dropped = 0
+        self._arrivals = deque(maxlen=max(2, int(framerate * 2)))
+        self._lock = threading.Lock()
+
+    def mark(self, timestamp):
+        """
+        Record a frame arrival
+        :param timestamp: Monotonic arrival time
+        :return: Number of frame slots missed before this one
+        """
+        with self._lock:
+            self.frames += 1
+            self._arrivals.append(timestamp)
+            if self.next_deadline is None:
+                self.next_deadline = timestamp + self.period
+                return 0
+
+            lateness = timestamp - self.next_deadline
+            if lateness > self.period / 2:
+                self.late += 1
+            missed = int(lateness // self.period) if lateness > 0 else 0
+            self.dropped += missed
+
+            # Stay on the original grid, skipping the slots that were missed
+            self.next_deadline += (missed + 1) * self.period
+            if not timestamp < self.next_deadline <= timestamp + 2 * self.period:
+                # Far off schedule (stall or clock jump); restart from here
+                self.next_deadline = timestamp + self.period
+            return missed
+
+    def fps(self):
+        """Frames per second measured over the recent arrival window"""
+        with self._lock:
+            if len(self._arrivals) < 2:
+                return 0.0
+            span = self._arrivals[-1] - self._arrivals[0]
+            return (len(self._arrivals) - 1) / span if span > 0 else 0.0
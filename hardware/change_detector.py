@@ -0,0 +1,96 @@
+"""Scene change detection for skipping near-identical camera frames
+
+Each captured frame is reduced to a small grayscale thumbnail and compared
+with the thumbnail of the last frame that was published. JPEG captures are
+decoded at 1/8 scale in the DCT domain, so the full image is never decoded.
+Raw RGB captures are subsampled by striding over the buffer. A frame counts
+as changed when enough thumbnail pixels moved by more than a grey-level
+threshold. Unchanged frames are not encoded or published, except for one
+keep-alive frame every few seconds so viewers can tell the stream is alive.
+"""
+import io
+import logging
+from config import (
+    CHANGE_DOWNSAMPLE,
+    CHANGE_PIXEL_THRESHOLD,
+    CHANGE_AREA_THRESHOLD,
+    CHANGE_KEEPALIVE_SECONDS
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeDetector:
+    def __init__(self, resolution, raw=False, downsample=CHANGE_DOWNSAMPLE,
+                 pixel_threshold=CHANGE_PIXEL_THRESHOLD, area_threshold=CHANGE_AREA_THRESHOLD,
+                 keepalive=CHANGE_KEEPALIVE_SECONDS):
+        """
+        Decide whether a captured frame differs enough from the last published one
+        :param resolution: (width, height) of captured frames
+        :param raw: True for packed RGB captures, False for JPEG
+        :param downsample: Thumbnail stride in pixels
+        :param pixel_threshold: Grey-level difference that marks a thumbnail pixel as changed
+        :param area_threshold: Fraction of changed thumbnail pixels that marks the frame as changed
+        :param keepalive: Seconds after which an unchanged frame is published anyway
+        """
+        if np is None:
+            raise RuntimeError("Change detection requires numpy (pip install numpy)")
+        self.width, self.height = resolution
+        self.raw = raw
+        self.downsample = downsample
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.keepalive = keepalive
+        self.reference = None
+        self.published_at = None
+        self.last_score = 0.0
+
+    def thumbnail(self, data):
+        """
+        Grayscale thumbnail of a captured frame
+        :param data: Raw RGB or JPEG bytes-like object
+        :return: 2-D int16 array
+        """
+        step = self.downsample
+        if self.raw:
+            rgb = np.frombuffer(data, dtype=np.uint8, count=self.width * self.height * 3)
+            rgb = rgb.reshape(self.height, self.width, 3)[::step, ::step].astype(np.uint16)
+            # ITU-R 601 luma weights in fixed point
+            gray = (rgb[..., 0] * 77 + rgb[..., 1] * 150 + rgb[..., 2] * 29) >> 8
+            return gray.astype(np.int16)
+
+        from PIL import Image
+        image = Image.open(io.BytesIO(data))
+        # Let the JPEG decoder scale down by up to 8x while decoding
+        image.draft('L', (self.width // step, self.height // step))
+        gray = np.asarray(image.convert('L'), dtype=np.int16)
+        scale = max(1, step * gray.shape[1] // self.width)
+        return gray[::scale, ::scale]
+
+    def changed(self, data, timestamp):
+        """
+        Check a captured frame, updating the reference when it should be published
+        :param data: Raw RGB or JPEG bytes-like object
+        :param timestamp: Monotonic capture time
+        :return: True if the frame should be encoded and published
+        """
+        thumbnail = self.thumbnail(data)
+        reference = self.reference
+        if reference is None or reference.shape != thumbnail.shape:
+            changed = True
+            self.last_score = 1.0
+        else:
+            moved = np.count_nonzero(np.abs(thumbnail - reference) > self.pixel_threshold)
+            self.last_score = moved / thumbnail.size
+            changed = self.last_score >= self.area_threshold
+
+        if not changed and timestamp - self.published_at < self.keepalive:
+            return False
+        self.reference = thumbnail
+        self.published_at = timestamp
+        return True
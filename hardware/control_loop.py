@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from config import CONTROL_LOOP_RATE
+from server.metrics import REGISTRY, now
+from server.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+COMMAND_LATENCY = REGISTRY.histogram(
+    'robot_command_latency_seconds', 'Time from command receipt to GPIO apply')
+APPLY_DURATION = REGISTRY.histogram(
+    'robot_control_apply_seconds', 'Time spent writing GPIO per control tick')
+LATE_TICKS = REGISTRY.counter(
+    'robot_control_late_ticks_total', 'Control loop ticks that missed their deadline')
+
+
+class ControlLoop:
+    def __init__(self, motor_controller, servo_controller, rate=CONTROL_LOOP_RATE, store=None):
+        """
+        Fixed-rate actuator loop fed by a latest-wins command mailbox
+        :param motor_controller: MotorController to drive
+        :param servo_controller: ServoController to steer
+        :param rate: Actuator update rate in Hz
+        :param store: Optional TelemetryStore that records applied duties and angles
+        """
+        self.motor_controller = motor_controller
+        self.servo_controller = servo_controller
+        self.store = store
+        self.period = 1.0 / rate
+        self._mailbox_lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._pending_drive = None
+        self._pending_steer = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.ticks = 0
+        self.commands_received = 0
+        self.commands_applied = 0
+        self.late_ticks = 0
+        logger.debug("Control loop initialized at %s Hz", rate)
+
+    def start(self):
+        """Start the control loop thread"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit_drive(self, left_speed, right_speed, received_at=None):
+        """
+        Overwrite the pending drive command
+        :param left_speed: -100 to 100 for the left wheels
+        :param right_speed: -100 to 100 for the right wheels
+        :param received_at: Monotonic time the command arrived (defaults to now)
+        """
+        with self._mailbox_lock:
+            self._pending_drive = (left_speed, right_speed, received_at or now())
+            self.commands_received += 1
+
+    def submit_steer(self, angle, received_at=None):
+        """
+        Overwrite the pending steering command
+        :param angle: -90 to 90 degrees from center
+        :param received_at: Monotonic time the command arrived (defaults to now)
+        """
+        with self._mailbox_lock:
+            self._pending_steer = (angle, received_at or now())
+            self.commands_received += 1
+
+    def emergency_stop(self):
+        """Discard pending commands and stop the hardware immediately"""
+        with self._apply_lock:
+            with self._mailbox_lock:
+                self._pending_drive = None
+                self._pending_steer = None
+            self.motor_controller.stop()
+            self.servo_controller.center_all()
+        self._record()
+
+    def _record(self):
+        if self.store is not None:
+            state = self.get_state()
+            self.store.record_control(state['wheel_speeds'], state['servo_angles'])
+
+    def get_state(self):
+        """Wheel speeds and servo angles as last applied, in WHEELS order"""
+        servo = self.servo_controller
+        return {
+            'wheel_speeds': [round(speed, 1) for speed in self.motor_controller.wheel_speeds],
+            'servo_angles': [servo.current_angle[pin] for pin in servo.wheel_pins]
+        }
+
+    @profiler.timed
+    def tick(self):
+        """Apply the newest pending commands, if any"""
+        with self._apply_lock:
+            with self._mailbox_lock:
+                drive, self._pending_drive = self._pending_drive, None
+                steer, self._pending_steer = self._pending_steer, None
+
+            if drive is None and steer is None:
+                self.ticks += 1
+                return
+
+            start = now()
+            if drive is not None:
+                self.motor_controller.set_side_speeds(drive[0], drive[1])
+                self.commands_applied += 1
+            if steer is not None:
+                self.servo_controller.steer(steer[0])
+                self.commands_applied += 1
+            self.ticks += 1
+
+        applied = now()
+        APPLY_DURATION.observe(applied - start)
+        if drive is not None:
+            COMMAND_LATENCY.observe(applied - drive[2])
+        if steer is not None:
+            COMMAND_LATENCY.observe(applied - steer[1])
+        self._record()
+
+    def _run(self):
+        """Run tick() on absolute monotonic deadlines"""
+        deadline = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Error in control loop: %s", e)
+
+            deadline += self.period
+            remaining = deadline - time.monotonic()
+            if remaining < 0:
+                # Fell behind; resync instead of bursting to catch up
+                self.late_ticks += 1
+                LATE_TICKS.inc()
+                deadline = time.monotonic()
+            else:
+                self._stop_event.wait(remaining)
+
+    def stop(self):
+        """Stop the control loop thread"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        logger.debug("Control loop stopped")
@@ -0,0 +1,277 @@
+"""Process-pool JPEG encoding over shared-memory frame rings
+
+Raw captures and viewer variants are encoded by a small pool of worker
+processes, so PIL's encoder no longer competes with the Socket.IO control
+handlers for the GIL. Pixels never cross the process boundary by pickling:
+each ring is one shared-memory block split into fixed slots, every slot
+holding an input region and an output region. The camera writes a raw frame
+straight into a slot, a worker encodes it into the slot's output region,
+and only (offset, length) descriptors travel through the pool's pipes.
+
+Workers are forked rather than spawned: spawning would re-import app.py
+(and with it the GPIO setup) in every worker. They inherit the shared
+memory mappings and touch nothing but PIL.
+"""
+import io
+import logging
+import signal
+import threading
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from config import (
+    CAMERA_JPEG_QUALITY,
+    CAMERA_QUEUE_SIZE,
+    ENCODE_WORKERS,
+    ENCODE_VARIANT_SLOTS,
+    FRAME_BUFFER_CAPACITY
+)
+from server.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RAW = 0
+JPEG = 1
+
+POOL_ENCODES = REGISTRY.counter(
+    'robot_encode_pool_jobs_total', 'Frames and variants encoded by the worker processes')
+POOL_FALLBACKS = REGISTRY.counter(
+    'robot_encode_pool_fallbacks_total', 'Encodes that did not fit a ring slot and ran in-process')
+
+_rings = {}
+
+
+def _init_worker(rings):
+    """Runs in each forked worker: keep the inherited ring mappings"""
+    _rings.update(rings)
+    # Ctrl-C is handled by the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _encode(ring, offset, length, out_offset, out_capacity, source, size, scale, quality):
+    """
+    Worker side: encode one slot's input region into its output region
+    :param source: RAW for packed RGB of ``size``, JPEG to re-encode a JPEG
+    :return: Encoded length, or -1 if it did not fit the output region
+    """
+    from PIL import Image
+
+    buf = _rings[ring].buf
+    data = buf[offset:offset + length]
+    if source == RAW:
+        image = Image.frombuffer('RGB', size, data, 'raw', 'RGB', 0, 1)
+    else:
+        image = Image.open(io.BytesIO(data))
+    if scale < 1.0:
+        target = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        if source == JPEG:
+            # Let the JPEG decoder downscale in the DCT domain first
+            image.draft('RGB', target)
+        if image.size != target:
+            image = image.resize(target)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    encoded = output.getbuffer()
+    if len(encoded) > out_capacity:
+        return -1
+    buf[out_offset:out_offset + len(encoded)] = encoded
+    return len(encoded)
+
+
+class RingSlot(io.RawIOBase):
+    def __init__(self, ring, index):
+        """
+        One input/output slot of a SharedFrameRing, writable like a FrameBuffer
+        :param ring: Owning SharedFrameRing
+        :param index: Slot number
+        """
+        super().__init__()
+        self.ring = ring
+        self.index = index
+        self.offset = index * (ring.in_capacity + ring.out_capacity)
+        self.out_offset = self.offset + ring.in_capacity
+        self._len = 0
+        self._pos = 0
+        self.view = None
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        size = len(data)
+        end = self._pos + size
+        if end > self.ring.in_capacity:
+            raise ValueError(f"Frame of {end} bytes does not fit a {self.ring.in_capacity} byte slot")
+        start = self.offset + self._pos
+        self.ring.buf[start:start + size] = data
+        self._pos = end
+        self._len = max(self._len, end)
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._len
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def truncate(self, size=None):
+        self._len = self._pos if size is None else min(size, self._len)
+        return self._len
+
+    def reset(self):
+        self._len = 0
+        self._pos = 0
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+
+    def seal(self, content_type=None):
+        """
+        Freeze the written input as a read-only view (content type is implied by the ring)
+        :return: self
+        """
+        self.view = self.ring.buf[self.offset:self.offset + self._len].toreadonly()
+        return self
+
+    def output(self, length):
+        """Read-only view of the first ``length`` bytes of the output region"""
+        return self.ring.buf[self.out_offset:self.out_offset + length].toreadonly()
+
+    def __len__(self):
+        return self._len
+
+    def release(self):
+        self.ring.release(self)
+
+
+class SharedFrameRing:
+    def __init__(self, slots, in_capacity, out_capacity):
+        """
+        Fixed set of slots in one shared-memory block
+        :param slots: Number of slots
+        :param in_capacity: Bytes per input region
+        :param out_capacity: Bytes per output region
+        """
+        self.in_capacity = in_capacity
+        self.out_capacity = out_capacity
+        self.shm = SharedMemory(create=True, size=slots * (in_capacity + out_capacity))
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self._free = [RingSlot(self, index) for index in range(slots)]
+        self._available = threading.Condition()
+
+    def acquire(self):
+        """Take a free slot, waiting if every slot is in use"""
+        with self._available:
+            while not self._free:
+                self._available.wait()
+            slot = self._free.pop()
+        slot.reset()
+        return slot
+
+    def release(self, slot):
+        with self._available:
+            self._free.append(slot)
+            self._available.notify()
+
+    def close(self):
+        for slot in self._free:
+            slot.reset()
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view is still referenced somewhere; the mapping goes with the process
+            logger.debug("Shared frame ring %s still in use at close", self.name)
+        self.shm.unlink()
+
+
+class EncodePool:
+    def __init__(self, resolution, raw=False, workers=ENCODE_WORKERS,
+                 variant_slots=ENCODE_VARIANT_SLOTS):
+        """
+        Worker processes plus the shared-memory rings they encode from
+        :param resolution: (width, height) of captured frames
+        :param raw: True to also encode raw RGB captures (allocates the frame ring)
+        :param workers: Number of encoder processes
+        :param variant_slots: Concurrent variant encodes before callers wait
+        """
+        width, height = resolution
+        self.resolution = resolution
+        self.workers = workers
+        self.frames = None
+        if raw:
+            # Captured, queued, waiting to submit, in flight and being collected, plus
+            # the one being swapped in while the queue is full
+            self.frames = SharedFrameRing(CAMERA_QUEUE_SIZE + workers + 4,
+                                          width * height * 3, width * height)
+        self.variants = SharedFrameRing(variant_slots, FRAME_BUFFER_CAPACITY, FRAME_BUFFER_CAPACITY)
+        rings = {ring.name: ring.shm for ring in (self.frames, self.variants) if ring is not None}
+        self._pool = get_context('fork').Pool(workers, initializer=_init_worker, initargs=(rings,))
+        logger.info("Encode pool started with %d workers", workers)
+
+    def submit(self, slot, quality=CAMERA_JPEG_QUALITY):
+        """
+        Start encoding a sealed raw capture slot from the frame ring
+        :return: AsyncResult for collect()
+        """
+        POOL_ENCODES.inc()
+        return self._pool.apply_async(_encode, (
+            self.frames.name, slot.offset, len(slot), slot.out_offset, self.frames.out_capacity,
+            RAW, self.resolution, 1.0, quality))
+
+    def collect(self, slot, result, frame_pool):
+        """
+        Wait for a submitted encode and copy the JPEG into a pooled frame (consumes the slot)
+        :param frame_pool: FramePool that provides the published frame
+        :return: Sealed FrameBuffer
+        """
+        try:
+            length = result.get()
+            if length < 0:
+                raise ValueError("Encoded frame does not fit the ring slot")
+            frame = frame_pool.acquire()
+            with slot.output(length) as encoded:
+                frame.write(encoded)
+            return frame.seal()
+        finally:
+            slot.release()
+
+    def encode_variant(self, source, scale, quality):
+        """
+        Re-encode a JPEG frame in a worker, blocking the calling viewer thread only
+        :param source: Sealed camera frame
+        :return: Encoded JPEG bytes, or None if the frame does not fit a slot
+        """
+        data = source.view
+        if len(data) > self.variants.in_capacity:
+            POOL_FALLBACKS.inc()
+            return None
+        slot = self.variants.acquire()
+        try:
+            slot.write(data)
+            POOL_ENCODES.inc()
+            length = self._pool.apply(_encode, (
+                self.variants.name, slot.offset, len(slot), slot.out_offset,
+                self.variants.out_capacity, JPEG, None, scale, quality))
+            if length < 0:
+                POOL_FALLBACKS.inc()
+                return None
+            with slot.output(length) as encoded:
+                return encoded.tobytes()
+        finally:
+            slot.release()
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+        for ring in (self.frames, self.variants):
+            if ring is not None:
+                ring.close()
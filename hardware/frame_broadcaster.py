@@ -0,0 +1,178 @@
+"""Shared-frame fan-out for camera stream viewers
+
+Frames may be plain bytes or reference-counted buffers exposing
+``retain()``/``release()`` (see hardware.frame_buffer). Counted frames are
+retained by the broadcaster while they are the latest frame and by each
+subscriber until it moves on to a newer one.
+"""
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _retain(frame):
+    if frame is not None and hasattr(frame, 'retain'):
+        frame.retain()
+
+
+def _release(frame):
+    if frame is not None and hasattr(frame, 'release'):
+        frame.release()
+
+
+class FrameSubscriber:
+    def __init__(self, broadcaster, client_id):
+        """
+        Per-client view onto a FrameBroadcaster
+        :param broadcaster: FrameBroadcaster this subscriber reads from
+        :param client_id: Identifier assigned by the broadcaster
+        """
+        self.broadcaster = broadcaster
+        self.client_id = client_id
+        self.last_sequence = 0
+        self.frames_delivered = 0
+        self.frames_skipped = 0
+        self.current = None
+
+    def next_frame(self, timeout=None):
+        """
+        Block until a frame newer than the last delivered one is available
+        :param timeout: Seconds to wait, or None to wait indefinitely
+        :return: Frame, or None on timeout or when the broadcaster closes
+        """
+        sequence, frame = self.broadcaster.wait_for_frame(self.last_sequence, timeout)
+        return self._accept(sequence, frame)
+
+    def poll(self):
+        """
+        Return the newest frame if it has not been delivered yet, without blocking
+        :return: Frame, or None if nothing new has been published
+        """
+        sequence, frame = self.broadcaster.take(self.last_sequence)
+        return self._accept(sequence, frame)
+
+    def _accept(self, sequence, frame):
+        if frame is None or sequence == self.last_sequence:
+            return None
+
+        # Slow viewers jump straight to the newest frame instead of queuing
+        if self.last_sequence:
+            self.frames_skipped += sequence - self.last_sequence - 1
+        self.last_sequence = sequence
+        self.frames_delivered += 1
+        # The previous frame has been fully sent once the caller asks again
+        _release(self.current)
+        self.current = frame
+        return frame
+
+    def __iter__(self):
+        while not self.broadcaster.closed:
+            frame = self.next_frame(timeout=1.0)
+            if frame is not None:
+                yield frame
+
+    def close(self):
+        """Detach from the broadcaster"""
+        _release(self.current)
+        self.current = None
+        self.broadcaster.unsubscribe(self)
+
+
+class FrameBroadcaster:
+    def __init__(self):
+        """Single-producer, multi-consumer holder for the latest camera frame"""
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self._client_ids = itertools.count(1)
+        self.clients = {}
+        self.listeners = []
+        self.closed = False
+
+    def publish(self, frame):
+        """
+        Publish a new frame and wake every waiting viewer
+        :param frame: Encoded frame (bytes or FrameBuffer)
+        """
+        _retain(frame)
+        with self._condition:
+            previous, self._frame = self._frame, frame
+            self._sequence += 1
+            sequence = self._sequence
+            self._condition.notify_all()
+        _release(previous)
+        # Single producer: the frame stays retained as the latest until the next publish
+        for listener in self.listeners:
+            listener(sequence, frame)
+
+    def latest(self):
+        """Return (sequence, frame) for the most recent frame, without retaining it"""
+        with self._condition:
+            return self._sequence, self._frame
+
+    def take(self, last_sequence):
+        """
+        Return (sequence, frame), retaining the frame if it is newer than last_sequence
+        """
+        with self._condition:
+            return self._snapshot(last_sequence)
+
+    def _snapshot(self, last_sequence):
+        # Caller holds the lock, so publish() cannot recycle the frame first
+        if self._frame is not None and self._sequence != last_sequence:
+            _retain(self._frame)
+        return self._sequence, self._frame
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        """
+        Wait until the published sequence moves past last_sequence
+        :param last_sequence: Sequence number the caller already has
+        :param timeout: Seconds to wait, or None to wait indefinitely
+        :return: (sequence, frame) tuple; a newer frame is returned retained
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence != last_sequence or self.closed,
+                timeout
+            )
+            return self._snapshot(last_sequence)
+
+    def add_listener(self, listener):
+        """
+        Register a callable invoked (from the capture thread) after every publish
+        :param listener: Callable taking (sequence, frame); must not block, and must
+                         retain() the frame to keep it past the call. Called with
+                         frame None when the broadcaster closes
+        """
+        self.listeners.append(listener)
+
+    def subscribe(self):
+        """Register a new viewer and return its FrameSubscriber"""
+        with self._condition:
+            subscriber = FrameSubscriber(self, next(self._client_ids))
+            self.clients[subscriber.client_id] = subscriber
+        logger.debug("Frame subscriber %d attached", subscriber.client_id)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a viewer"""
+        with self._condition:
+            self.clients.pop(subscriber.client_id, None)
+        logger.debug("Frame subscriber %d detached after %d frames (%d skipped)",
+                      subscriber.client_id, subscriber.frames_delivered,
+                      subscriber.frames_skipped)
+
+    def client_count(self):
+        """Number of attached viewers"""
+        with self._condition:
+            return len(self.clients)
+
+    def close(self):
+        """Wake all viewers and stop further delivery"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        for listener in self.listeners:
+            listener(self._sequence, None)
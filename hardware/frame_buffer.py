@@ -0,0 +1,190 @@
+"""Preallocated, reference-counted frame buffers for the camera pipeline
+
+The capture thread writes each JPEG straight into a pooled buffer. Once a
+frame is complete it is exposed to viewers as a read-only memoryview, with
+the multipart header and trailer built once per frame and shared by every
+viewer. A buffer goes back to the pool only after the broadcaster and every
+viewer sending it have released it, so a slow sender never sees its frame
+overwritten.
+"""
+import io
+import threading
+from config import FRAME_BUFFER_CAPACITY, FRAME_POOL_SIZE
+
+MULTIPART_BOUNDARY = b'--frame\r\n'
+MULTIPART_TRAILER = b'\r\n'
+
+
+def multipart_header(length, content_type=b'image/jpeg'):
+    """Build the multipart part header for a payload of ``length`` bytes"""
+    return (MULTIPART_BOUNDARY +
+            b'Content-Type: ' + content_type + b'\r\n' +
+            b'Content-Length: ' + str(length).encode() + b'\r\n\r\n')
+
+
+class FrameBuffer(io.RawIOBase):
+    def __init__(self, pool, capacity):
+        """
+        Growable, preallocated write target for one encoded frame
+        :param pool: FramePool that owns this buffer
+        :param capacity: Initial size in bytes
+        """
+        super().__init__()
+        self.pool = pool
+        self._buf = bytearray(capacity)
+        self._len = 0
+        self._pos = 0
+        self.refs = 0
+        self.view = None
+        self.header = None
+        self.chunks = ()
+        self._byte_chunks = None
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        size = len(data)
+        end = self._pos + size
+        if end > len(self._buf):
+            # Exported memoryviews forbid resizing in place, so grow by copying
+            grown = bytearray(max(end, len(self._buf) * 2))
+            grown[:self._len] = memoryview(self._buf)[:self._len]
+            self._buf = grown
+        self._buf[self._pos:end] = data
+        self._pos = end
+        self._len = max(self._len, end)
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._len
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def truncate(self, size=None):
+        self._len = self._pos if size is None else min(size, self._len)
+        return self._len
+
+    def reset(self):
+        """Prepare the buffer for a new capture"""
+        self._len = 0
+        self._pos = 0
+        self.view = None
+        self.header = None
+        self.chunks = ()
+        self._byte_chunks = None
+
+    def seal(self, content_type=b'image/jpeg'):
+        """
+        Freeze the written bytes as a frame and prebuild its multipart chunks
+        :return: self
+        """
+        self.view = memoryview(self._buf)[:self._len].toreadonly()
+        self.header = multipart_header(self._len, content_type)
+        self.chunks = (self.header, self.view, MULTIPART_TRAILER)
+        return self
+
+    def byte_chunks(self):
+        """
+        Multipart chunks with the payload as bytes, for servers (WSGI) that
+        reject memoryviews. The copy is made once per frame and shared.
+        """
+        chunks = self._byte_chunks
+        if chunks is None:
+            chunks = self._byte_chunks = (self.header, self.view.tobytes(), MULTIPART_TRAILER)
+        return chunks
+
+    def __len__(self):
+        return self._len
+
+    def tobytes(self):
+        """Copy the frame out (for callers that need an owned bytes object)"""
+        return self.view.tobytes()
+
+    def retain(self):
+        self.pool.retain(self)
+        return self
+
+    def release(self):
+        self.pool.release(self)
+
+
+class FramePool:
+    def __init__(self, capacity=FRAME_BUFFER_CAPACITY, size=FRAME_POOL_SIZE):
+        """
+        Pool of reusable FrameBuffers
+        :param capacity: Initial byte capacity of each buffer
+        :param size: Number of idle buffers kept for reuse
+        """
+        self.capacity = capacity
+        self.size = size
+        self._free = [FrameBuffer(self, capacity) for _ in range(size)]
+        self._lock = threading.Lock()
+        self.allocated = size
+
+    def acquire(self):
+        """Take an empty buffer (refcount 1), allocating if the pool is drained"""
+        with self._lock:
+            buffer = self._free.pop() if self._free else None
+            if buffer is None:
+                self.allocated += 1
+        if buffer is None:
+            buffer = FrameBuffer(self, self.capacity)
+        buffer.reset()
+        buffer.refs = 1
+        return buffer
+
+    def retain(self, buffer):
+        with self._lock:
+            buffer.refs += 1
+
+    def release(self, buffer):
+        with self._lock:
+            buffer.refs -= 1
+            if buffer.refs == 0 and len(self._free) < self.size:
+                self._free.append(buffer)
+
+
+class CaptureOutput(io.RawIOBase):
+    def __init__(self, target):
+        """
+        Stable file-like object for capture_continuous that writes into a swappable buffer
+        :param target: Initial FrameBuffer
+        """
+        super().__init__()
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        return self.target.write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.target.seek(offset, whence)
+
+    def tell(self):
+        return self.target.tell()
+
+    def truncate(self, size=None):
+        return self.target.truncate(size)
+
+    def swap(self, target):
+        """
+        Point subsequent writes at a new buffer
+        :return: The previous buffer
+        """
+        previous, self.target = self.target, target
+        return previous
@@ -0,0 +1,254 @@
+"""Virtual GPIO hardware for development, tests and benchmarks
+
+Pin levels, modes and PWM duty/frequency live in NumPy arrays indexed by
+BCM pin number. Every call that changes a pin is appended to a
+preallocated, timestamped event log (a ring buffer, so long runs keep the
+most recent events). The log can be queried per pin ("duty on pin 17 over
+time") and replayed onto another simulator, which reproduces the same pin
+state. Writes are not locked; the control loop already serializes
+actuator updates onto one thread.
+
+hardware.mock_gpio exposes a module-level simulator through the RPi.GPIO
+interface, so the motor and servo controllers drive it unchanged.
+"""
+import time
+import numpy as np
+from config import SIM_EVENT_LOG_SIZE
+
+PIN_COUNT = 64
+
+# Event kinds
+SETUP = 0
+OUTPUT = 1
+PWM_START = 2
+DUTY = 3
+PWM_STOP = 4
+FREQUENCY = 5
+CLEANUP = 6
+
+EVENT_DTYPE = np.dtype([('time', 'f8'), ('pin', 'u1'), ('kind', 'u1'), ('value', 'f4')])
+
+
+class ManualClock:
+    def __init__(self, start=0.0, step=0.0):
+        """
+        Deterministic clock for simulations
+        :param start: Initial time in seconds
+        :param step: Seconds added after every reading
+        """
+        self.time = start
+        self.step = step
+
+    def __call__(self):
+        now = self.time
+        self.time += self.step
+        return now
+
+    def advance(self, seconds):
+        self.time += seconds
+
+
+class GPIOSimulator:
+    def __init__(self, capacity=SIM_EVENT_LOG_SIZE, clock=time.monotonic):
+        """
+        Array-backed virtual GPIO bank with an event log
+        :param capacity: Events kept in the log before the oldest are overwritten
+        :param clock: Callable returning the current time in seconds
+        """
+        self.clock = clock
+        self.capacity = capacity
+        self.levels = np.zeros(PIN_COUNT, dtype=np.int8)
+        self.modes = np.full(PIN_COUNT, -1, dtype=np.int8)
+        self.duty = np.zeros(PIN_COUNT, dtype=np.float32)
+        self.frequency = np.zeros(PIN_COUNT, dtype=np.float32)
+        self.pwm_active = np.zeros(PIN_COUNT, dtype=bool)
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._pins = np.empty(capacity, dtype=np.uint8)
+        self._kinds = np.empty(capacity, dtype=np.uint8)
+        self._values = np.empty(capacity, dtype=np.float32)
+        self._next = 0
+        self.total_events = 0
+        # Scalar writes through memoryviews skip NumPy's per-item dispatch
+        self._duty = memoryview(self.duty)
+        self._levels = memoryview(self.levels)
+        self._log = (memoryview(self._times), memoryview(self._pins),
+                     memoryview(self._kinds), memoryview(self._values))
+
+    def record(self, kind, pin, value, timestamp=None):
+        """Append one event to the log"""
+        times, pins, kinds, values = self._log
+        i = self._next
+        times[i] = self.clock() if timestamp is None else timestamp
+        pins[i] = pin
+        kinds[i] = kind
+        values[i] = value
+        self._next = i + 1 if i + 1 < self.capacity else 0
+        self.total_events += 1
+
+    def record_many(self, kind, pins, values, timestamp=None):
+        """Append one event per pin, all with the same timestamp"""
+        count = len(pins)
+        if count > self.capacity:
+            pins, values = pins[-self.capacity:], values[-self.capacity:]
+            self.total_events += count - self.capacity
+            count = self.capacity
+        start = self._next
+        end = start + count
+        if end <= self.capacity:
+            positions = slice(start, end)
+        else:
+            positions = np.arange(start, end) % self.capacity
+        self._times[positions] = self.clock() if timestamp is None else timestamp
+        self._pins[positions] = pins
+        self._kinds[positions] = kind
+        self._values[positions] = values
+        self._next = end % self.capacity
+        self.total_events += count
+
+    # RPi.GPIO-style operations
+
+    def setup(self, pin, mode, timestamp=None):
+        self.modes[pin] = mode
+        self.levels[pin] = 0
+        self.record(SETUP, pin, mode, timestamp)
+
+    def output(self, pin, level, timestamp=None):
+        self._levels[pin] = level
+        self.record(OUTPUT, pin, level, timestamp)
+
+    def output_many(self, pins, levels, timestamp=None):
+        """Vectorized output(): set several pins at once"""
+        pins = np.asarray(pins, dtype=np.uint8)
+        levels = np.broadcast_to(levels, pins.shape)
+        self.levels[pins] = levels
+        self.record_many(OUTPUT, pins, levels, timestamp)
+
+    def pwm_start(self, pin, duty, timestamp=None):
+        self.duty[pin] = duty
+        self.pwm_active[pin] = True
+        self.record(PWM_START, pin, duty, timestamp)
+
+    def set_duty(self, pin, duty, timestamp=None):
+        self._duty[pin] = duty
+        self.record(DUTY, pin, duty, timestamp)
+
+    def set_duties(self, pins, duties, timestamp=None):
+        """Vectorized set_duty(): change the duty cycle of several pins at once"""
+        pins = np.asarray(pins, dtype=np.uint8)
+        duties = np.broadcast_to(duties, pins.shape)
+        self.duty[pins] = duties
+        self.record_many(DUTY, pins, duties, timestamp)
+
+    def set_frequency(self, pin, frequency, timestamp=None):
+        self.frequency[pin] = frequency
+        self.record(FREQUENCY, pin, frequency, timestamp)
+
+    def pwm_stop(self, pin, timestamp=None):
+        self.duty[pin] = 0
+        self.pwm_active[pin] = False
+        self.record(PWM_STOP, pin, 0, timestamp)
+
+    def cleanup(self, timestamp=None):
+        """Reset every pin; the event log is kept for inspection"""
+        self.levels[:] = 0
+        self.modes[:] = -1
+        self.duty[:] = 0
+        self.pwm_active[:] = False
+        self.record(CLEANUP, 0, 0, timestamp)
+
+    def reset(self):
+        """Reset pins and clear the event log"""
+        self.cleanup()
+        self.frequency[:] = 0
+        self._next = 0
+        self.total_events = 0
+
+    # Queries
+
+    def events(self, pin=None, kinds=None, start=None, end=None):
+        """
+        Logged events in time order
+        :param pin: Only events for this BCM pin
+        :param kinds: Only these event kinds (e.g. (DUTY, PWM_STOP))
+        :param start: Only events at or after this time
+        :param end: Only events at or before this time
+        :return: Structured array with fields time, pin, kind, value
+        """
+        count = min(self.total_events, self.capacity)
+        if self.total_events > self.capacity:
+            order = np.roll(np.arange(self.capacity), -self._next)
+        else:
+            order = slice(0, count)
+        log = np.empty(count, dtype=EVENT_DTYPE)
+        log['time'] = self._times[order]
+        log['pin'] = self._pins[order]
+        log['kind'] = self._kinds[order]
+        log['value'] = self._values[order]
+
+        mask = np.ones(count, dtype=bool)
+        if pin is not None:
+            mask &= log['pin'] == pin
+        if kinds is not None:
+            mask &= np.isin(log['kind'], kinds)
+        if start is not None:
+            mask &= log['time'] >= start
+        if end is not None:
+            mask &= log['time'] <= end
+        return log[mask]
+
+    def duty_history(self, pin, start=None, end=None):
+        """
+        Duty cycle on a pin over time
+        :return: (times, duties) arrays; each duty holds until the next time
+        """
+        log = self.events(pin, (PWM_START, DUTY, PWM_STOP), start, end)
+        return log['time'], log['value']
+
+    def level_history(self, pin, start=None, end=None):
+        """
+        Output level on a pin over time
+        :return: (times, levels) arrays
+        """
+        log = self.events(pin, (OUTPUT,), start, end)
+        return log['time'], log['value'].astype(np.int8)
+
+    def duty_at(self, pin, timestamp):
+        """Duty cycle a pin had at ``timestamp`` according to the log"""
+        times, duties = self.duty_history(pin)
+        position = np.searchsorted(times, timestamp, side='right') - 1
+        return float(duties[position]) if position >= 0 else 0.0
+
+    def snapshot(self):
+        """Current pin state as a dict of array copies"""
+        return {
+            'levels': self.levels.copy(),
+            'modes': self.modes.copy(),
+            'duty': self.duty.copy(),
+            'frequency': self.frequency.copy(),
+            'pwm_active': self.pwm_active.copy()
+        }
+
+
+_APPLY = {
+    SETUP: lambda sim, pin, value, t: sim.setup(pin, int(value), t),
+    OUTPUT: lambda sim, pin, value, t: sim.output(pin, int(value), t),
+    PWM_START: lambda sim, pin, value, t: sim.pwm_start(pin, value, t),
+    DUTY: lambda sim, pin, value, t: sim.set_duty(pin, value, t),
+    PWM_STOP: lambda sim, pin, value, t: sim.pwm_stop(pin, t),
+    FREQUENCY: lambda sim, pin, value, t: sim.set_frequency(pin, value, t),
+    CLEANUP: lambda sim, pin, value, t: sim.cleanup(t),
+}
+
+
+def replay(events, simulator=None):
+    """
+    Re-apply logged events, with their original timestamps, to a simulator
+    :param events: Structured array from GPIOSimulator.events()
+    :param simulator: Target simulator, or None for a fresh one
+    :return: The simulator, whose pin state and log now match the recording
+    """
+    if simulator is None:
+        simulator = GPIOSimulator(capacity=max(1, len(events)))
+    for timestamp, pin, kind, value in events.tolist():
+        _APPLY[kind](simulator, pin, value, timestamp)
+    return simulator
@@ -1,5 +1,12 @@
-"""Mock GPIO module for development environment"""
+"""Mock GPIO module for development environment
+
+Exposes the RPi.GPIO interface on top of a module-level GPIOSimulator, so
+what the controllers did can be inspected through ``simulator``.
+"""
 import logging
+from hardware.gpio_simulator import GPIOSimulator
+
+logger = logging.getLogger(__name__)
 
 # GPIO numbering modes
 BCM = 11
@@ -13,40 +20,48 @@ LOW = 0
 OUT = 1
 IN = 0
 
-_pin_states = {}
-_pin_modes = {}
+simulator = GPIOSimulator()
 
 def setmode(mode):
-    logging.debug(f"GPIO setmode: {mode}")
+    logger.debug("GPIO setmode: %s", mode)
 
-def setup(pin, mode):
-    _pin_modes[pin] = mode
-    _pin_states[pin] = LOW
-    logging.debug(f"GPIO setup pin {pin} as {'output' if mode == OUT else 'input'}")
+def setwarnings(flag):
+    pass
+
+def setup(pin, mode, initial=LOW):
+    simulator.setup(pin, mode)
+    if initial != LOW:
+        simulator.output(pin, initial)
 
 def output(pin, state):
-    _pin_states[pin] = state
-    logging.debug(f"GPIO output pin {pin}: {state}")
+    simulator.output(pin, state)
+
+def input(pin):
+    return int(simulator.levels[pin])
 
 def cleanup():
-    _pin_states.clear()
-    _pin_modes.clear()
-    logging.debug("GPIO cleanup")
+    simulator.cleanup()
+    logger.debug("GPIO cleanup")
 
 class PWM:
     def __init__(self, pin, frequency):
         self.pin = pin
         self.frequency = frequency
-        self.duty_cycle = 0
-        logging.debug(f"PWM initialized on pin {pin} at {frequency}Hz")
+        simulator.set_frequency(pin, frequency)
+
+    @property
+    def duty_cycle(self):
+        return float(simulator.duty[self.pin])
 
     def start(self, duty_cycle):
-        self.duty_cycle = duty_cycle
-        logging.debug(f"PWM started on pin {self.pin} with duty cycle {duty_cycle}")
+        simulator.pwm_start(self.pin, duty_cycle)
 
     def ChangeDutyCycle(self, duty_cycle):
-        self.duty_cycle = duty_cycle
-        logging.debug(f"PWM duty cycle changed to {duty_cycle} on pin {self.pin}")
+        simulator.set_duty(self.pin, duty_cycle)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+        simulator.set_frequency(self.pin, frequency)
 
     def stop(self):
-        logging.debug(f"PWM stopped on pin {self.pin}")
\ No newline at end of file
+        simulator.pwm_stop(self.pin)
@@ -18,13 +18,27 @@ class PiCamera:
         return img
 
     def capture_continuous(self, output, format='jpeg', use_video_port=False):
-        """Simulate continuous capture by yielding mock frames"""
+        """Simulate continuous capture by yielding mock frames at the configured framerate"""
+        if self._mock_frame.size != tuple(self.resolution):
+            self._mock_frame = self._create_mock_frame()
+        raw = self._mock_frame.tobytes() if format == 'rgb' else None
+        period = 1.0 / self.framerate
+        deadline = time.monotonic()
         while True:
             # Save mock frame to the output stream
             output.seek(0)
-            self._mock_frame.save(output, format='JPEG')
+            if raw is not None:
+                output.write(raw)
+            else:
+                self._mock_frame.save(output, format='JPEG')
             yield output
-            time.sleep(1.0 / self.framerate)
+            # Pace on absolute deadlines so encode time does not stretch the period
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
 
     def close(self):
         logging.debug("Mock PiCamera closed")
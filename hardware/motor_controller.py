@@ -2,15 +2,33 @@ try:
     import RPi.GPIO as GPIO
 except ImportError:
     import hardware.mock_gpio as GPIO
-from config import MOTOR_PINS
+from config import MOTOR_PINS, MOTOR_PWM_FREQUENCY
+from hardware.pwm_manager import PWMChannelManager
 import logging
 
+logger = logging.getLogger(__name__)
+
+# Wheel order used by the per-wheel state array and batch API
+WHEELS = ('FRONT_LEFT', 'FRONT_RIGHT', 'REAR_LEFT', 'REAR_RIGHT')
+
 class MotorController:
-    def __init__(self):
+    def __init__(self, pwm_manager=None):
+        """
+        Initialize motor controller
+        :param pwm_manager: Shared PWMChannelManager (a private one is created if omitted)
+        """
         GPIO.setmode(GPIO.BCM)
+        self.owns_pwm = pwm_manager is None
+        self.pwm = pwm_manager or PWMChannelManager()
+        self.directions = {motor: None for motor in MOTOR_PINS}
+        self.wheel_pins = [
+            (MOTOR_PINS[wheel]['EN'], MOTOR_PINS[wheel]['IN1'], MOTOR_PINS[wheel]['IN2'])
+            for wheel in WHEELS
+        ]
+        self.wheel_speeds = [0.0] * len(WHEELS)
         self.setup_pins()
         self.current_speed = 0
-        logging.debug("Motor controller initialized")
+        logger.debug("Motor controller initialized")
 
     def setup_pins(self):
         for motor in MOTOR_PINS.values():
@@ -18,41 +36,75 @@ class MotorController:
             GPIO.setup(motor['IN1'], GPIO.OUT)
             GPIO.setup(motor['IN2'], GPIO.OUT)
             # Setup PWM for speed control
-            GPIO.output(motor['EN'], GPIO.HIGH)
+            self.pwm.open(motor['EN'], MOTOR_PWM_FREQUENCY, 0)
 
     def set_motor_direction(self, motor, forward=True):
+        # Direction pins are only rewritten when the sign flips
+        if self.directions[motor] == forward:
+            return
         pins = MOTOR_PINS[motor]
         if forward:
-            GPIO.output(pins['IN1'], GPIO.HIGH)
-            GPIO.output(pins['IN2'], GPIO.LOW)
+            self.pwm.set_output(pins['IN1'], GPIO.HIGH)
+            self.pwm.set_output(pins['IN2'], GPIO.LOW)
         else:
-            GPIO.output(pins['IN1'], GPIO.LOW)
-            GPIO.output(pins['IN2'], GPIO.HIGH)
+            self.pwm.set_output(pins['IN1'], GPIO.LOW)
+            self.pwm.set_output(pins['IN2'], GPIO.HIGH)
+        self.directions[motor] = forward
 
     def set_speed(self, speed):
         """
         Set speed for all motors
         :param speed: -100 to 100 (negative for reverse)
         """
-        self.current_speed = speed
-        direction = speed >= 0
-        abs_speed = abs(speed)
+        self.set_wheel_speeds(speed, speed, speed, speed)
+
+    def set_side_speeds(self, left, right):
+        """
+        Set differential drive speeds, mapping left/right onto the front/rear pairs
+        :param left: -100 to 100 for FRONT_LEFT and REAR_LEFT
+        :param right: -100 to 100 for FRONT_RIGHT and REAR_RIGHT
+        """
+        self.set_wheel_speeds(left, right, left, right)
 
-        for motor in MOTOR_PINS.keys():
-            self.set_motor_direction(motor, direction)
-            # Adjust PWM duty cycle based on speed
-            pwm = GPIO.PWM(MOTOR_PINS[motor]['EN'], 1000)
-            pwm.start(abs_speed)
+    def set_wheel_speeds(self, front_left, front_right, rear_left, rear_right):
+        """
+        Set all four wheel speeds in a single pass
+        :param front_left: -100 to 100 (negative for reverse)
+        :param front_right: -100 to 100
+        :param rear_left: -100 to 100
+        :param rear_right: -100 to 100
+        """
+        targets = (front_left, front_right, rear_left, rear_right)
+        changed = [i for i in range(len(WHEELS)) if targets[i] != self.wheel_speeds[i]]
+        if not changed:
+            return
+
+        # Group all direction pin writes before touching any duty cycle
+        for i in changed:
+            self.set_motor_direction(WHEELS[i], targets[i] >= 0)
+        for i in changed:
+            self.pwm.set_duty(self.wheel_pins[i][0], min(100, abs(targets[i])))
+            self.wheel_speeds[i] = targets[i]
+
+        self.current_speed = sum(targets) / len(targets)
 
     def stop(self):
         """Emergency stop all motors"""
-        for motor in MOTOR_PINS.values():
-            GPIO.output(motor['IN1'], GPIO.LOW)
-            GPIO.output(motor['IN2'], GPIO.LOW)
+        for motor, pins in MOTOR_PINS.items():
+            self.pwm.set_output(pins['IN1'], GPIO.LOW)
+            self.pwm.set_output(pins['IN2'], GPIO.LOW)
+            self.pwm.set_duty(pins['EN'], 0)
+            self.directions[motor] = None
+        self.wheel_speeds = [0.0] * len(WHEELS)
         self.current_speed = 0
-        logging.debug("Emergency stop activated")
+        logger.debug("Emergency stop activated")
 
     def cleanup(self):
-        """Cleanup GPIO pins"""
+        """
+        Cleanup GPIO pins
+        A shared PWMChannelManager is left running; its owner releases it and GPIO
+        """
         self.stop()
-        GPIO.cleanup()
\ No newline at end of file
+        if self.owns_pwm:
+            self.pwm.cleanup()
+            GPIO.cleanup()
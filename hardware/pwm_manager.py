@@ -0,0 +1,105 @@
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    import hardware.mock_gpio as GPIO
+import logging
+import threading
+from config import PWM_DUTY_EPSILON
+
+logger = logging.getLogger(__name__)
+
+
+class PWMChannelManager:
+    def __init__(self, epsilon=PWM_DUTY_EPSILON):
+        """
+        Registry of long-lived PWM channels and cached output levels
+        :param epsilon: Default smallest duty cycle change (%) written to hardware
+        """
+        self.epsilon = epsilon
+        self.channels = {}
+        self.duty = {}
+        self.epsilons = {}
+        self.levels = {}
+        self._lock = threading.Lock()
+        logger.debug("PWM channel manager initialized")
+
+    def open(self, pin, frequency, duty_cycle=0, epsilon=None):
+        """
+        Create and start the PWM channel for a pin if it does not exist yet
+        :param pin: BCM pin number
+        :param frequency: PWM frequency in Hz
+        :param duty_cycle: Initial duty cycle (0-100)
+        :param epsilon: Smallest duty cycle change (%) for this channel (manager default if None)
+        :return: The PWM object owned by this manager
+        """
+        with self._lock:
+            pwm = self.channels.get(pin)
+            if pwm is None:
+                pwm = GPIO.PWM(pin, frequency)
+                pwm.start(duty_cycle)
+                self.channels[pin] = pwm
+                self.duty[pin] = duty_cycle
+                self.epsilons[pin] = self.epsilon if epsilon is None else epsilon
+            return pwm
+
+    def set_duty(self, pin, duty_cycle):
+        """
+        Apply a duty cycle only if it differs from the current one
+        :param pin: BCM pin number of an opened channel
+        :param duty_cycle: Duty cycle (0-100)
+        :return: True if the hardware was updated
+        """
+        return bool(self.set_duties((pin,), (duty_cycle,)))
+
+    def set_duties(self, pins, duty_cycles):
+        """
+        Apply several duty cycles under one lock, skipping unchanged channels
+        :param pins: BCM pin numbers of opened channels
+        :param duty_cycles: Duty cycles (0-100), one per pin
+        :return: Pins whose hardware was updated
+        """
+        updated = []
+        with self._lock:
+            for pin, duty_cycle in zip(pins, duty_cycles):
+                current = self.duty.get(pin)
+                if current is None or current == duty_cycle:
+                    continue
+                # Small changes are ignored, but a request for 0% always lands
+                if duty_cycle and abs(current - duty_cycle) < self.epsilons[pin]:
+                    continue
+                self.channels[pin].ChangeDutyCycle(duty_cycle)
+                self.duty[pin] = duty_cycle
+                updated.append(pin)
+        if updated:
+            logger.debug("PWM pins %s duty -> %s", pins, duty_cycles)
+        return updated
+
+    def set_output(self, pin, level):
+        """
+        Write a digital output only if the level changed
+        :param pin: BCM pin number
+        :param level: GPIO.HIGH or GPIO.LOW
+        :return: True if the hardware was updated
+        """
+        with self._lock:
+            if self.levels.get(pin) == level:
+                return False
+            GPIO.output(pin, level)
+            self.levels[pin] = level
+        logger.debug("GPIO pin %s level %s", pin, level)
+        return True
+
+    def get_duty(self, pin):
+        """Return the last duty cycle applied to a pin"""
+        return self.duty.get(pin)
+
+    def cleanup(self):
+        """Stop every PWM channel and forget cached state"""
+        with self._lock:
+            for pwm in self.channels.values():
+                pwm.stop()
+            self.channels.clear()
+            self.duty.clear()
+            self.epsilons.clear()
+            self.levels.clear()
+        logger.debug("PWM channels stopped")
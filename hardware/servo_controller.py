@@ -2,22 +2,35 @@ try:
     import RPi.GPIO as GPIO
 except ImportError:
     import hardware.mock_gpio as GPIO
-from config import SERVO_PINS
+from config import SERVO_PINS, SERVO_PWM_FREQUENCY, SERVO_DUTY_EPSILON
+from hardware.motor_controller import WHEELS
+from hardware.pwm_manager import PWMChannelManager
+from hardware.steering import SteeringTable, servo_duty
 import logging
 
+logger = logging.getLogger(__name__)
+
 class ServoController:
-    def __init__(self):
+    def __init__(self, pwm_manager=None):
+        """
+        Initialize servo controller
+        :param pwm_manager: Shared PWMChannelManager (a private one is created if omitted)
+        """
         GPIO.setmode(GPIO.BCM)
+        self.owns_pwm = pwm_manager is None
+        self.pwm = pwm_manager or PWMChannelManager()
         self.setup_pins()
         self.current_angle = {pin: 90 for pin in SERVO_PINS.values()}
-        logging.debug("Servo controller initialized")
+        self.wheel_pins = [SERVO_PINS[wheel] for wheel in WHEELS]
+        self.steering = SteeringTable()
+        logger.debug("Servo controller initialized")
 
     def setup_pins(self):
         for pin in SERVO_PINS.values():
             GPIO.setup(pin, GPIO.OUT)
             # Initialize PWM at 50Hz
-            pwm = GPIO.PWM(pin, 50)
-            pwm.start(7.5)  # Center position (90 degrees)
+            # Center position (90 degrees)
+            self.pwm.open(pin, SERVO_PWM_FREQUENCY, 7.5, epsilon=SERVO_DUTY_EPSILON)
 
     def set_angle(self, servo, angle):
         """
@@ -26,27 +39,38 @@ class ServoController:
         :param angle: 0-180 degrees
         """
         if servo not in SERVO_PINS:
-            logging.error(f"Invalid servo name: {servo}")
+            logger.error("Invalid servo name: %s", servo)
             return
 
         # Constrain angle
         angle = max(0, min(180, angle))
 
-        # Convert angle to duty cycle (0° = 2.5%, 180° = 12.5%)
-        duty = 2.5 + (angle / 180.0) * 10.0
-
         pin = SERVO_PINS[servo]
-        pwm = GPIO.PWM(pin, 50)
-        pwm.start(duty)
-        self.current_angle[pin] = angle
-        logging.debug(f"Set {servo} to {angle} degrees")
+        if self.pwm.set_duty(pin, servo_duty(angle)):
+            self.current_angle[pin] = angle
+        logger.debug("Set %s to %s degrees", servo, angle)
+
+    def steer(self, angle):
+        """
+        Point all four wheels for one steering command using Ackermann geometry
+        :param angle: -90 to 90 degrees from center (positive turns right)
+        """
+        angles, duties = self.steering.lookup(angle)
+        applied = self.pwm.set_duties(self.wheel_pins, duties)
+        for pin, wheel_angle in zip(self.wheel_pins, angles):
+            if pin in applied:
+                self.current_angle[pin] = wheel_angle
 
     def center_all(self):
         """Center all servos to 90 degrees"""
-        for servo in SERVO_PINS.keys():
-            self.set_angle(servo, 90)
+        self.steer(0)
 
     def cleanup(self):
-        """Cleanup GPIO pins"""
+        """
+        Cleanup GPIO pins
+        A shared PWMChannelManager is left running; its owner releases it and GPIO
+        """
         self.center_all()
-        GPIO.cleanup()
\ No newline at end of file
+        if self.owns_pwm:
+            self.pwm.cleanup()
+            GPIO.cleanup()
@@ -0,0 +1,96 @@
+"""Ackermann steering geometry with precomputed servo duty tables
+
+A steering command is the angle of a virtual wheel on the robot's centre
+line. For each wheel to roll without scrubbing, its axis must point at the
+same turn centre, so the inner wheel turns further than the outer one:
+
+    front mode    rear wheels stay straight, the turn centre is level with
+                  the rear axle
+    counter mode  rear wheels counter-steer by the same amount as the front,
+                  so the turn centre is level with the middle of the robot
+                  and the turn radius is roughly halved
+
+All of this is evaluated once when the table is built. At run time a
+command is rounded to the table resolution and looked up, giving the four
+wheel angles and their servo duty cycles.
+"""
+import math
+from config import (
+    STEERING_MODE,
+    STEERING_WHEELBASE_MM,
+    STEERING_TRACK_MM,
+    STEERING_TABLE_RESOLUTION
+)
+from hardware.motor_controller import WHEELS
+
+MODES = ('front', 'counter')
+
+# Servo duty cycle for each whole servo angle, 0-180 degrees (0° = 2.5%, 180° = 12.5%)
+SERVO_DUTY = tuple(2.5 + (angle / 180.0) * 10.0 for angle in range(181))
+
+
+def servo_duty(angle):
+    """Duty cycle for a servo angle in degrees, clamped to 0-180"""
+    return SERVO_DUTY[max(0, min(180, int(round(angle))))]
+
+
+def wheel_angles(angle, mode=STEERING_MODE, wheelbase=STEERING_WHEELBASE_MM,
+                 track=STEERING_TRACK_MM):
+    """
+    Per-wheel steering angles for one command (used to build the tables)
+    :param angle: Command angle, -90 to 90 degrees from center (positive turns right)
+    :param mode: 'front' or 'counter'
+    :param wheelbase: Front to rear axle distance
+    :param track: Left to right wheel distance
+    :return: Angles from center in WHEELS order
+    """
+    if not angle:
+        return (0.0,) * len(WHEELS)
+    # Distance from the turn centre to the steered axle, along the wheelbase
+    reach = wheelbase / 2 if mode == 'counter' else wheelbase
+    radius = reach / math.tan(math.radians(min(abs(angle), 89.9)))
+    inner = math.degrees(math.atan2(reach, radius - track / 2))
+    outer = math.degrees(math.atan2(reach, radius + track / 2))
+    inner, outer = min(inner, 90.0), min(outer, 90.0)
+    sign = 1 if angle > 0 else -1
+    # Turning right puts the right-hand wheels on the inside
+    left, right = (outer, inner) if sign > 0 else (inner, outer)
+    front = (sign * left, sign * right)
+    rear = (-front[0], -front[1]) if mode == 'counter' else (0.0, 0.0)
+    return front + rear
+
+
+class SteeringTable:
+    def __init__(self, mode=STEERING_MODE, wheelbase=STEERING_WHEELBASE_MM,
+                 track=STEERING_TRACK_MM, resolution=STEERING_TABLE_RESOLUTION):
+        """
+        Lookup table from command angle to per-wheel servo angles and duty cycles
+        :param mode: 'front' or 'counter'
+        :param wheelbase: Front to rear axle distance
+        :param track: Left to right wheel distance
+        :param resolution: Table entries per degree of command angle
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown steering mode '{mode}', expected one of: {', '.join(MODES)}")
+        self.mode = mode
+        self.resolution = resolution
+        self.limit = 90 * resolution
+        self.angles = []
+        self.duties = []
+        for index in range(-self.limit, self.limit + 1):
+            servo = tuple(int(round(90 + wheel))
+                          for wheel in wheel_angles(index / resolution, mode, wheelbase, track))
+            self.angles.append(servo)
+            self.duties.append(tuple(SERVO_DUTY[angle] for angle in servo))
+
+    def index(self, angle):
+        """Table index for a command angle, clamped to -90..90"""
+        return max(-self.limit, min(self.limit, int(round(angle * self.resolution)))) + self.limit
+
+    def lookup(self, angle):
+        """
+        :param angle: Command angle, -90 to 90 degrees from center
+        :return: (servo angles, duty cycles), each in WHEELS order
+        """
+        index = self.index(angle)
+        return self.angles[index], self.duties[index]
@@ -0,0 +1,306 @@
+"""Asyncio-native serving mode
+
+Runs the Socket.IO layer on a python-socketio AsyncServer under uvicorn.
+/video_feed is served by an async generator that awaits new frames, socket
+handlers are coroutines, and anything that may block (GPIO writes, Flask
+routes) is pushed to a bounded thread pool. Cached static files and pages
+(server.assets) are sent straight from the event loop. Every other HTTP
+route is still answered by the Flask app, so both modes share the same
+handlers.
+"""
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import socketio
+from config import ASGI_EXECUTOR_WORKERS, WEB_PORT
+from server import metrics
+from server.stream_quality import AdaptiveQuality, VariantCache, parse_profile
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+logger = logging.getLogger(__name__)
+
+MULTIPART_HEADERS = [(b'content-type', b'multipart/x-mixed-replace; boundary=frame')]
+
+
+class FrameNotifier:
+    def __init__(self, broadcaster, loop):
+        """
+        Bridge FrameBroadcaster publishes from the capture thread into the event loop
+        :param broadcaster: FrameBroadcaster to listen to
+        :param loop: Running asyncio event loop
+        """
+        self.loop = loop
+        self._event = asyncio.Event()
+        broadcaster.add_listener(self._notify)
+
+    def _notify(self, sequence, frame):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Swap in a fresh event so every current waiter is woken exactly once
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout=None):
+        """Wait for the next published frame; returns False on timeout"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class RobotASGIApp:
+    def __init__(self, robot, workers=ASGI_EXECUTOR_WORKERS):
+        """
+        Build the ASGI application around the already-initialized app module
+        :param robot: The ``app`` module (hardware objects and shared handlers)
+        :param workers: Size of the executor used for blocking work
+        """
+        self.robot = robot
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi-blocking')
+        self.sio = socketio.AsyncServer(async_mode='asgi')
+        self.loop = None
+        self.notifier = None
+        self._register_handlers()
+        self.asgi = socketio.ASGIApp(self.sio, other_asgi_app=self.http,
+                                     on_startup=self.startup, on_shutdown=self.shutdown)
+
+    async def __call__(self, scope, receive, send):
+        await self.asgi(scope, receive, send)
+
+    async def run_blocking(self, function, *args):
+        """Run a blocking call on the bounded executor"""
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def startup(self):
+        self.loop = asyncio.get_running_loop()
+        # The camera may still be initializing; hook its broadcaster once it is up
+        self.robot.when_camera_ready(self._camera_ready)
+        self.robot.start_background_services()
+        # Telemetry is sent from its own thread; hop onto the loop to emit
+        self.robot.emit_to = self._emit_threadsafe
+        logger.info("ASGI server ready")
+
+    def _camera_ready(self, camera_stream):
+        self.loop.call_soon_threadsafe(self._attach_notifier, camera_stream.broadcaster)
+
+    def _attach_notifier(self, broadcaster):
+        self.notifier = FrameNotifier(broadcaster, self.loop)
+
+    async def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def _emit_threadsafe(self, event, data, sid):
+        asyncio.run_coroutine_threadsafe(self.sio.emit(event, data, to=sid), self.loop)
+
+    def _register_handlers(self):
+        robot = self.robot
+        sio = self.sio
+
+        @sio.event
+        async def connect(sid, environ, auth=None):
+            logger.info('Client connected')
+            robot.startup.mark('first_client')
+            robot.SOCKET_CLIENTS.inc()
+            robot.telemetry.add(sid)
+
+        @sio.event
+        async def disconnect(sid, reason=None):
+            await self.run_blocking(robot.release_client, sid)
+
+        # Drive/steer/control only write the control loop mailbox, so they run inline
+        @sio.on('drive')
+        async def drive(sid, data):
+            robot.handle_drive(data)
+
+        @sio.on('steer')
+        async def steer(sid, data):
+            robot.handle_steer(data)
+
+        @sio.on('control')
+        async def control(sid, data):
+            robot.process_control(sid, data)
+
+        @sio.on('emergency_stop')
+        async def emergency_stop(sid, data=None):
+            await self.run_blocking(robot.handle_emergency_stop)
+
+    async def http(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        if scope['path'] == '/video_feed' and self.notifier is not None:
+            await self.video_feed(scope, receive, send)
+        elif scope['method'] in ('GET', 'HEAD') and scope['path'] in self.robot.assets.assets:
+            await self.asset(scope, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def asset(self, scope, send):
+        """Send a precompressed static file or pre-rendered page without leaving the loop"""
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        asset, versioned = self.robot.assets.find(scope['path'], query.get('v', [None])[0])
+        headers = dict(scope.get('headers', []))
+        status, response_headers, body = asset.respond(
+            headers.get(b'accept-encoding', b'').decode('latin-1'),
+            headers.get(b'if-none-match', b'').decode('latin-1'), versioned)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                for k, v in response_headers]})
+        await send({'type': 'http.response.body',
+                    'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def frames(self, subscriber):
+        """Async generator yielding each new frame once it is published"""
+        broadcaster = self.robot.camera_stream.broadcaster
+        while not broadcaster.closed:
+            frame = subscriber.poll()
+            if frame is None:
+                await self.notifier.wait(timeout=1.0)
+                continue
+            yield frame
+
+    async def video_feed(self, scope, receive, send):
+        """Stream MJPEG to one viewer without dedicating a thread to it"""
+        robot = self.robot
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            profile = parse_profile(query.get('profile', [None])[0])
+        except ValueError as e:
+            await send({'type': 'http.response.start', 'status': 400, 'headers': []})
+            await send({'type': 'http.response.body', 'body': str(e).encode()})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': MULTIPART_HEADERS})
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        subscriber = robot.camera_stream.broadcaster.subscribe()
+        quality = AdaptiveQuality(profile)
+        skipped = 0
+        try:
+            async for frame in self.frames(subscriber):
+                if disconnected.done():
+                    break
+                variant = frame
+                if VariantCache.needs_encode(quality.profile):
+                    variant = await self.run_blocking(
+                        robot.variant_cache.get, subscriber.last_sequence, frame, quality.profile)
+                sent = metrics.now()
+                for chunk in variant.chunks:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                elapsed = metrics.now() - sent
+                robot.STREAM_SEND_DURATION.observe(elapsed)
+                robot.STREAM_FRAMES_SENT.inc()
+                quality.record(elapsed, subscriber.frames_skipped - skipped)
+                skipped = subscriber.frames_skipped
+        finally:
+            disconnected.cancel()
+            robot.STREAM_FRAMES_SKIPPED.inc(subscriber.frames_skipped)
+            subscriber.close()
+
+    async def wsgi(self, scope, receive, send):
+        """Serve a request through the Flask app, pulling each body chunk on the executor"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            body.extend(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        environ = _build_environ(scope, bytes(body))
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                   for k, v in headers]
+
+        result = await self.run_blocking(self.robot.app, environ, start_response)
+        # Streaming responses (/replay) yield chunks slowly; send them as they come
+        chunks = iter(result)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            while not disconnected.done():
+                chunk = await self.run_blocking(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if hasattr(result, 'close'):
+                await self.run_blocking(result.close)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            http_key = f'HTTP_{key}'
+            environ[http_key] = f'{environ[http_key]},{value}' if http_key in environ else value
+    return environ
+
+
+def run(robot, host='0.0.0.0', port=WEB_PORT):
+    """
+    Serve the robot app with uvicorn
+    :param robot: The initialized ``app`` module
+    """
+    if uvicorn is None:
+        raise RuntimeError("ASGI mode requires uvicorn (pip install uvicorn)")
+    uvicorn.run(RobotASGIApp(robot), host=host, port=port, log_config=None)
+
+
+def create_app():
+    """Application factory for uvicorn worker processes"""
+    import app as robot
+    return RobotASGIApp(robot)
+
+
+def run_workers(workers, host='0.0.0.0', port=WEB_PORT):
+    """
+    Serve with several uvicorn worker processes sharing the port. Hardware
+    must live in server.hardware_daemon. Socket.IO long-polling needs every
+    request of a session to reach the same worker, so clients should use the
+    websocket transport (or a sticky load balancer should sit in front).
+    """
+    if uvicorn is None:
+        raise RuntimeError("ASGI mode requires uvicorn (pip install uvicorn)")
+    uvicorn.run('server.asgi_app:create_app', factory=True, workers=workers,
+                host=host, port=port, log_config=None)
@@ -0,0 +1,183 @@
+"""Precompressed static assets and pre-rendered pages
+
+At startup every file under the static folder is read once, hashed and
+compressed (gzip, plus brotli when the ``brotli`` package is installed);
+encodings that do not make a file smaller are dropped. The index template
+is rendered once as well, after the static URLs in it have been given a
+``?v=<hash>`` suffix. Serving a request is then a dictionary lookup, an
+Accept-Encoding pick and a send:
+
+    /static/...?v=<hash>   Cache-Control: public, max-age=ASSET_MAX_AGE, immutable
+    /static/... (no v)     Cache-Control: no-cache (always revalidated)
+    /                      Cache-Control: no-cache
+
+Each encoding gets its own strong ETag ("<hash>", "<hash>-gzip", "<hash>-br"),
+and If-None-Match is matched on the content hash, so a client that cached
+any encoding of the current content gets a 304.
+
+Both serving modes use the same AssetCache: Flask through its 'static'
+endpoint and the index route, server.asgi_app directly on the event loop.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from flask import render_template
+from config import ASSET_MAX_AGE, ASSET_GZIP_LEVEL, ASSET_MIN_COMPRESS_SIZE
+from server.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+ASSET_RESPONSES = REGISTRY.counter(
+    'robot_asset_responses_total', 'Static assets and pages served from the asset cache')
+ASSET_NOT_MODIFIED = REGISTRY.counter(
+    'robot_asset_not_modified_total', 'Asset requests answered with 304 Not Modified')
+
+
+class Asset:
+    def __init__(self, content, content_type):
+        """
+        One file or page held in memory with its compressed encodings
+        :param content: Identity bytes
+        :param content_type: Content-Type header value
+        """
+        self.content_type = content_type
+        self.version = hashlib.sha256(content).hexdigest()[:16]
+        self.encodings = {'identity': content}
+        if len(content) >= ASSET_MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = {'gzip': gzip.compress(content, ASSET_GZIP_LEVEL, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(content)
+            for encoding, data in compressed.items():
+                if len(data) < len(content):
+                    self.encodings[encoding] = data
+
+    def etag(self, encoding):
+        return f'"{self.version}"' if encoding == 'identity' else f'"{self.version}-{encoding}"'
+
+    def pick(self, accept_encoding):
+        """Smallest encoding the client accepts"""
+        accepted = _accepted_encodings(accept_encoding)
+        best = 'identity'
+        for encoding, data in self.encodings.items():
+            if encoding in accepted and len(data) < len(self.encodings[best]):
+                best = encoding
+        return best
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any encoding of this content"""
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            tag = tag[2:] if tag.startswith('W/') else tag
+            if tag.strip('"').split('-', 1)[0] == self.version:
+                return True
+        return False
+
+    def respond(self, accept_encoding='', if_none_match='', versioned=False):
+        """
+        Build the response for one request
+        :param accept_encoding: Accept-Encoding request header
+        :param if_none_match: If-None-Match request header
+        :param versioned: The URL carries this asset's ?v= hash, so it may be cached for good
+        :return: (status, headers, body)
+        """
+        encoding = self.pick(accept_encoding)
+        headers = [
+            ('Content-Type', self.content_type),
+            ('ETag', self.etag(encoding)),
+            ('Cache-Control', f'public, max-age={ASSET_MAX_AGE}, immutable' if versioned else 'no-cache'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        ASSET_RESPONSES.inc()
+        if if_none_match and self.matches(if_none_match):
+            ASSET_NOT_MODIFIED.inc()
+            return 304, headers, b''
+        body = self.encodings[encoding]
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(len(body))))
+        return 200, headers, body
+
+
+def _accepted_encodings(header):
+    accepted = {'identity'}
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        key, _, value = params.partition('=')
+        if key.strip().lower() == 'q':
+            try:
+                if float(value) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name == '*':
+            accepted.update(('gzip', 'br'))
+        elif name:
+            accepted.add(name)
+    return accepted
+
+
+class AssetCache:
+    def __init__(self, app):
+        """
+        In-memory static files and pre-rendered pages for a Flask app
+        :param app: Flask application (its static folder and templates are used)
+        """
+        self.app = app
+        self.static_url_path = app.static_url_path
+        self.assets = {}
+
+    def build(self, pages=(('/', 'index.html'),)):
+        """
+        Load and compress the static folder, then render the pages
+        :param pages: (path, template) pairs rendered once
+        :return: self
+        """
+        static_folder = self.app.static_folder
+        for root, _, files in os.walk(static_folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                with open(path, 'rb') as f:
+                    self.assets[f'{self.static_url_path}/{relative}'] = Asset(f.read(), content_type)
+
+        # Rendered pages link to static files with their ?v= hash
+        self.app.url_defaults(self._version_static_urls)
+        for path, template in pages:
+            with self.app.test_request_context(path):
+                html = render_template(template)
+            self.assets[path] = Asset(html.encode(), 'text/html; charset=utf-8')
+
+        total = sum(len(asset.encodings['identity']) for asset in self.assets.values())
+        logger.info("Asset cache built: %d files, %d bytes (brotli %s)",
+                    len(self.assets), total, 'enabled' if brotli is not None else 'unavailable')
+        return self
+
+    def _version_static_urls(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            asset = self.assets.get(f"{self.static_url_path}/{values['filename']}")
+            if asset is not None:
+                values.setdefault('v', asset.version)
+
+    def find(self, path, version=None):
+        """
+        :param path: Request path
+        :param version: The request's ?v= value
+        :return: (Asset or None, whether ``version`` names the current content)
+        """
+        asset = self.assets.get(path)
+        return asset, asset is not None and version == asset.version
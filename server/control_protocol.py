@@ -0,0 +1,86 @@
+"""Compact binary encoding for joystick control messages
+
+Layout (little-endian, 12 bytes):
+    uint8   message type (MSG_DRIVE, MSG_STEER)
+    uint8   flags (reserved, 0)
+    uint16  sequence number (wraps)
+    uint32  client timestamp in milliseconds (wraps)
+    int16   axis x, -32767..32767 maps to -1.0..1.0
+    int16   axis y, -32767..32767 maps to -1.0..1.0
+"""
+import struct
+from collections import namedtuple
+
+MSG_DRIVE = 1
+MSG_STEER = 2
+
+AXIS_SCALE = 32767
+SEQUENCE_MODULUS = 1 << 16
+
+CONTROL_STRUCT = struct.Struct('<BBHIhh')
+
+ControlMessage = namedtuple('ControlMessage', 'msg_type sequence timestamp x y')
+
+
+def encode(msg_type, sequence, timestamp, x=0.0, y=0.0):
+    """
+    Pack a control message
+    :param msg_type: MSG_DRIVE or MSG_STEER
+    :param sequence: Sequence number (taken modulo 2**16)
+    :param timestamp: Client timestamp in milliseconds (taken modulo 2**32)
+    :param x: Horizontal axis, -1.0 to 1.0
+    :param y: Vertical axis, -1.0 to 1.0
+    :return: Packed bytes
+    """
+    return CONTROL_STRUCT.pack(
+        msg_type, 0,
+        sequence % SEQUENCE_MODULUS,
+        int(timestamp) & 0xFFFFFFFF,
+        _quantize(x), _quantize(y)
+    )
+
+
+def decode(data):
+    """
+    Unpack a control message
+    :param data: bytes-like object of exactly CONTROL_STRUCT.size bytes
+    :return: ControlMessage with axes scaled back to -1.0..1.0
+    :raises ValueError: if the payload has the wrong size
+    """
+    if len(data) != CONTROL_STRUCT.size:
+        raise ValueError(f"Expected {CONTROL_STRUCT.size} byte control message, got {len(data)}")
+    msg_type, _, sequence, timestamp, x, y = CONTROL_STRUCT.unpack(data)
+    return ControlMessage(msg_type, sequence, timestamp, x / AXIS_SCALE, y / AXIS_SCALE)
+
+
+def _quantize(value):
+    return int(round(max(-1.0, min(1.0, value)) * AXIS_SCALE))
+
+
+class SequenceFilter:
+    def __init__(self):
+        """Track the newest sequence per (client, message type) and reject older ones"""
+        # client_id -> {msg_type: sequence}; keyed by client so forget() is a single pop,
+        # safe while other handler threads call accept()
+        self._last = {}
+
+    def accept(self, client_id, message):
+        """
+        Check whether a message is newer than the last accepted one
+        :param client_id: Connection identifier (e.g. Socket.IO sid)
+        :param message: Decoded ControlMessage
+        :return: True if the message should be applied
+        """
+        sequences = self._last.setdefault(client_id, {})
+        last = sequences.get(message.msg_type)
+        if last is not None:
+            # Serial number arithmetic so wrap-around is not seen as stale
+            delta = (message.sequence - last) % SEQUENCE_MODULUS
+            if delta == 0 or delta >= SEQUENCE_MODULUS // 2:
+                return False
+        sequences[message.msg_type] = message.sequence
+        return True
+
+    def forget(self, client_id):
+        """Drop sequence state for a disconnected client"""
+        self._last.pop(client_id, None)
@@ -0,0 +1,269 @@
+"""Web-worker side of the hardware daemon connection
+
+HardwareClient connects to server.hardware_daemon and exposes proxies with
+the same methods app.py uses on the local hardware objects (control loop,
+camera stream, battery monitor, session recorder, telemetry store). Frames pushed by the
+daemon are republished on a local FrameBroadcaster, so the streaming code
+is identical in both modes. If the daemon restarts, the client reconnects
+and resubscribes; commands sent meanwhile are dropped.
+"""
+import itertools
+import json
+import logging
+import socket
+import threading
+import time
+from config import HARDWARE_SOCKET, HARDWARE_REQUEST_TIMEOUT, RECORDER_DIRECTORY
+from hardware.frame_broadcaster import FrameBroadcaster
+from server import hardware_ipc as ipc
+from server.stream_quality import EncodedFrame
+
+logger = logging.getLogger(__name__)
+
+
+class ControlProxy:
+    def __init__(self, client):
+        self.client = client
+
+    def submit_drive(self, left_speed, right_speed, received_at=None):
+        self.client.send(ipc.CMD_DRIVE, ipc.DRIVE.pack(left_speed, right_speed, received_at or 0.0))
+
+    def submit_steer(self, angle, received_at=None):
+        self.client.send(ipc.CMD_STEER, ipc.STEER.pack(angle, received_at or 0.0))
+
+    def emergency_stop(self):
+        self.client.send(ipc.CMD_STOP)
+
+    def get_state(self):
+        """Last state pushed by the daemon, or None while disconnected"""
+        state = self.client.state
+        return dict(state['control']) if state else None
+
+    def stop(self):
+        """The daemon owns the control loop; nothing to stop here"""
+
+
+class CameraProxy:
+    def __init__(self, client):
+        self.client = client
+        self.broadcaster = client.broadcaster
+
+    def get_stats(self):
+        """Last stats pushed by the daemon, or None while disconnected"""
+        state = self.client.state
+        return state['camera'] if state else None
+
+    def read(self):
+        _, frame = self.broadcaster.latest()
+        return frame.tobytes() if frame is not None else None
+
+    def stop(self):
+        """The daemon owns the camera; nothing to stop here"""
+
+
+class BatteryProxy:
+    def __init__(self, client):
+        self.client = client
+        self.status = None
+
+    def get_status(self):
+        return self.status
+
+    def get_history(self, limit=None):
+        return [tuple(sample) for sample in self.client.request('battery_history', limit=limit)]
+
+    def stop(self):
+        """The daemon owns the battery monitor; nothing to stop here"""
+
+
+class RecorderProxy:
+    def __init__(self, client):
+        self.client = client
+        self.directory = RECORDER_DIRECTORY
+
+    def start(self):
+        self.client.request('recording_start')
+        return self
+
+    def stop(self):
+        self.client.request('recording_stop')
+
+    def get_status(self):
+        return self.client.request('recording_status')
+
+    def record_telemetry(self, kind, data):
+        """The daemon records commands and battery status as it handles them"""
+
+
+class TelemetryStoreProxy:
+    def __init__(self, client):
+        self.client = client
+
+    def query(self, start, end, buckets=500, columns=None):
+        params = {'start': start, 'end': end, 'buckets': buckets}
+        if columns is not None:
+            params['columns'] = list(columns)
+        return self.client.request('telemetry_history', **params)
+
+
+class HardwareClient:
+    def __init__(self, path=HARDWARE_SOCKET, on_battery=None):
+        """
+        Connection from one web worker to the hardware daemon
+        :param path: Unix socket path the daemon listens on
+        :param on_battery: Called with each battery status pushed by the daemon
+        """
+        self.path = path
+        self.on_battery = on_battery
+        self.broadcaster = FrameBroadcaster()
+        self.control = ControlProxy(self)
+        self.camera = CameraProxy(self)
+        self.battery = BatteryProxy(self)
+        self.recorder = RecorderProxy(self)
+        self.telemetry_store = TelemetryStoreProxy(self)
+        self.state = None
+        self.closed = False
+        self.connected = threading.Event()
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._pending = {}
+
+    def connect(self, timeout=None):
+        """
+        Connect (retrying with backoff) and start receiving events
+        :param timeout: Seconds to keep retrying, or None to retry forever
+        :return: True once connected
+        """
+        if not self._connect(timeout):
+            return False
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        # Battery events only arrive on changes; fetch the current status once
+        try:
+            self.battery.status = self.request('battery_status')
+        except RuntimeError as e:
+            logger.warning("Could not fetch battery status: %s", e)
+        else:
+            if self.on_battery and self.battery.status:
+                self.on_battery(self.battery.status)
+        return True
+
+    def _connect(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.05
+        while not self.closed:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+            self._sock = sock
+            self.connected.set()
+            self.send(ipc.CMD_SUBSCRIBE, ipc.SUBSCRIBE.pack(
+                ipc.TOPIC_FRAMES | ipc.TOPIC_BATTERY | ipc.TOPIC_STATE))
+            logger.info("Connected to hardware daemon at %s", self.path)
+            return True
+        return False
+
+    def send(self, msg_type, *parts):
+        """Send a message to the daemon; dropped while disconnected"""
+        sock = self._sock
+        if sock is None:
+            logger.debug("Hardware daemon unavailable, dropped message %s", msg_type)
+            return False
+        try:
+            with self._send_lock:
+                ipc.send_message(sock, msg_type, *parts)
+            return True
+        except OSError as e:
+            logger.warning("Lost hardware daemon connection: %s", e)
+            self._disconnect(sock)
+            return False
+
+    def request(self, method, **params):
+        """
+        Call a daemon request handler and wait for its result
+        :raises RuntimeError: if the daemon is unreachable, times out or reports an error
+        """
+        request_id = next(self._request_ids)
+        pending = self._pending[request_id] = [threading.Event(), None]
+        try:
+            body = json.dumps({'method': method, 'params': params}).encode()
+            if not self.send(ipc.CMD_REQUEST, ipc.REQUEST_ID.pack(request_id), body):
+                raise RuntimeError("Hardware daemon unavailable")
+            if not pending[0].wait(HARDWARE_REQUEST_TIMEOUT):
+                raise RuntimeError(f"Hardware daemon did not answer '{method}'")
+        finally:
+            self._pending.pop(request_id, None)
+        response = pending[1]
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def _read_loop(self):
+        sock = self._sock
+        while not self.closed:
+            if sock is None:
+                if not self._connect(None):
+                    break
+                sock = self._sock
+                continue
+            stream = sock.makefile('rb')
+            try:
+                while True:
+                    message = ipc.read_message(stream)
+                    if message is None:
+                        break
+                    self._dispatch(*message)
+            except OSError:
+                pass
+            finally:
+                stream.close()
+            if self.closed:
+                break
+            logger.warning("Hardware daemon connection closed, reconnecting")
+            self._disconnect(sock)
+            sock = None
+
+    def _dispatch(self, msg_type, payload):
+        if msg_type == ipc.EVT_FRAME:
+            self.broadcaster.publish(EncodedFrame(payload))
+        elif msg_type == ipc.EVT_BATTERY:
+            self.battery.status = json.loads(payload)
+            if self.on_battery:
+                self.on_battery(self.battery.status)
+        elif msg_type == ipc.EVT_STATE:
+            self.state = json.loads(payload)
+        elif msg_type == ipc.EVT_RESPONSE:
+            request_id, = ipc.REQUEST_ID.unpack_from(payload)
+            pending = self._pending.get(request_id)
+            if pending is not None:
+                pending[1] = json.loads(payload[ipc.REQUEST_ID.size:])
+                pending[0].set()
+        else:
+            logger.warning("Unknown IPC message type: %s", msg_type)
+
+    def _disconnect(self, sock):
+        if self._sock is sock:
+            self._sock = None
+            self.state = None
+            self.battery.status = None
+            self.connected.clear()
+        try:
+            # shutdown() wakes a reader blocked on the socket; close() alone does not
+            sock.shutdown(socket.SHUT_RDWR)
+            sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        """Disconnect from the daemon (the daemon stops the robot)"""
+        self.closed = True
+        self.broadcaster.close()
+        if self._sock is not None:
+            self._disconnect(self._sock)
@@ -0,0 +1,309 @@
+"""Hardware-owner daemon
+
+Owns the motors, servos, camera, battery monitor, session recorder and
+telemetry store in a single process, so any number of web workers can run
+side by side without fighting over GPIO or the camera. Workers connect over
+a Unix-domain socket (see server.hardware_ipc). Drive/steer commands from
+every connection land in the one ControlLoop mailbox, so actuation stays
+single-writer; frames, battery status and the control/camera state are
+pushed back to the connections subscribed to them, so workers never have to
+ask for them.
+
+Run with ``python -m server.hardware_daemon`` and set HARDWARE_MODE to
+'daemon' for the web workers.
+"""
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    import hardware.mock_gpio as GPIO
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+from config import HARDWARE_SOCKET, TELEMETRY_RATE
+from hardware.pwm_manager import PWMChannelManager
+from hardware.motor_controller import MotorController
+from hardware.servo_controller import ServoController
+from hardware.control_loop import ControlLoop
+from hardware.camera_stream import CameraStream
+from hardware.battery_monitor import BatteryMonitor
+from server import hardware_ipc as ipc
+from server.logging_setup import configure_logging
+from server.metrics import REGISTRY
+from server.recorder import SessionRecorder
+from server.telemetry_store import TelemetryStore
+
+logger = logging.getLogger(__name__)
+
+IPC_CLIENTS = REGISTRY.gauge(
+    'robot_hardware_ipc_clients', 'Web workers connected to the hardware daemon')
+
+
+class WorkerConnection:
+    def __init__(self, daemon, sock):
+        """
+        One connected web worker
+        :param daemon: HardwareDaemon that accepted the connection
+        :param sock: Connected Unix socket
+        """
+        self.daemon = daemon
+        self.sock = sock
+        self.topics = 0
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._frame_thread = None
+        self._events = {}
+        self._events_ready = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        threading.Thread(target=self._event_loop, daemon=True).start()
+        return self
+
+    def send(self, msg_type, *parts):
+        """Send a message; a broken connection is closed rather than raised"""
+        try:
+            with self._send_lock:
+                ipc.send_message(self.sock, msg_type, *parts)
+        except OSError:
+            self.close()
+
+    def push(self, msg_type, payload):
+        """
+        Queue a status event for this connection's writer thread, so a slow worker
+        never blocks the caller; an unsent event is replaced by a newer one of its type
+        """
+        with self._events_ready:
+            self._events[msg_type] = payload
+            self._events_ready.notify()
+
+    def _event_loop(self):
+        while not self.closed:
+            with self._events_ready:
+                while not self._events and not self.closed:
+                    self._events_ready.wait()
+                events, self._events = self._events, {}
+            for msg_type, payload in events.items():
+                self.send(msg_type, payload)
+
+    def subscribe(self, topics):
+        self.topics = topics
+        if topics & ipc.TOPIC_STATE and self.daemon.state is not None:
+            self.push(ipc.EVT_STATE, self.daemon.state)
+        if topics & ipc.TOPIC_FRAMES and self._frame_thread is None:
+            self._frame_thread = threading.Thread(target=self._frame_loop, daemon=True)
+            self._frame_thread.start()
+
+    def _read_loop(self):
+        stream = self.sock.makefile('rb')
+        try:
+            while not self.closed:
+                message = ipc.read_message(stream)
+                if message is None:
+                    break
+                self.daemon.dispatch(self, *message)
+        except OSError:
+            pass
+        finally:
+            stream.close()
+            self.close()
+
+    def _frame_loop(self):
+        # Latest-wins like a /video_feed viewer: a slow worker skips frames
+        subscriber = self.daemon.camera_stream.broadcaster.subscribe()
+        try:
+            while not self.closed and self.topics & ipc.TOPIC_FRAMES:
+                frame = subscriber.next_frame(timeout=1.0)
+                if frame is not None:
+                    self.send(ipc.EVT_FRAME, frame.view)
+        finally:
+            subscriber.close()
+            self._frame_thread = None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self._events_ready:
+            self._events_ready.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except OSError:
+            pass
+        self.daemon.disconnected(self)
+
+
+class HardwareDaemon:
+    def __init__(self, path=HARDWARE_SOCKET):
+        """
+        Bring up every hardware component owned by the daemon
+        :param path: Unix socket path to listen on
+        """
+        self.path = path
+        self.pwm_manager = PWMChannelManager()
+        self.motor_controller = MotorController(self.pwm_manager)
+        self.servo_controller = ServoController(self.pwm_manager)
+        self.telemetry_store = TelemetryStore()
+        self.control_loop = ControlLoop(self.motor_controller, self.servo_controller,
+                                        store=self.telemetry_store).start()
+        self.camera_stream = CameraStream().start()
+        self.recorder = SessionRecorder().attach(self.camera_stream.broadcaster)
+        self.battery_monitor = BatteryMonitor(callback=self._battery_status,
+                                              store=self.telemetry_store)
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self.stopped = threading.Event()
+        self.state = None
+        self.requests = {
+            'battery_status': lambda: self.battery_monitor.get_status(),
+            'battery_history': lambda limit=None: self.battery_monitor.get_history(limit),
+            'recording_start': lambda: self.recorder.start().get_status(),
+            'recording_stop': self._stop_recording,
+            'recording_status': lambda: self.recorder.get_status(),
+            'telemetry_history': self._telemetry_history,
+        }
+        IPC_CLIENTS.set(0)
+
+    def serve_forever(self):
+        """Accept worker connections until shutdown() is called"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous run
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._listener.listen()
+        logger.info("Hardware daemon listening on %s", self.path)
+        threading.Thread(target=self._state_loop, name='state', daemon=True).start()
+        while not self.stopped.is_set():
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                break
+            connection = WorkerConnection(self, sock)
+            with self._lock:
+                self.connections.add(connection)
+                IPC_CLIENTS.set(len(self.connections))
+            connection.start()
+            logger.info("Web worker connected (%d connected)", len(self.connections))
+
+    def dispatch(self, connection, msg_type, payload):
+        """Handle one message from a worker"""
+        if msg_type == ipc.CMD_DRIVE:
+            left, right, received_at = ipc.DRIVE.unpack(payload)
+            self.control_loop.submit_drive(left, right, received_at)
+            self.recorder.record_telemetry('drive', {'left': left, 'right': right})
+        elif msg_type == ipc.CMD_STEER:
+            angle, received_at = ipc.STEER.unpack(payload)
+            self.control_loop.submit_steer(angle, received_at)
+            self.recorder.record_telemetry('steer', {'angle': angle})
+        elif msg_type == ipc.CMD_STOP:
+            self.control_loop.emergency_stop()
+        elif msg_type == ipc.CMD_SUBSCRIBE:
+            connection.subscribe(ipc.SUBSCRIBE.unpack(payload)[0])
+        elif msg_type == ipc.CMD_REQUEST:
+            request_id, = ipc.REQUEST_ID.unpack_from(payload)
+            connection.send(ipc.EVT_RESPONSE, ipc.REQUEST_ID.pack(request_id),
+                            json.dumps(self._request(payload[ipc.REQUEST_ID.size:])).encode())
+        else:
+            logger.warning("Unknown IPC message type: %s", msg_type)
+
+    def _request(self, body):
+        try:
+            request = json.loads(body)
+            return {'result': self.requests[request['method']](**request.get('params', {}))}
+        except Exception as e:
+            logger.error("IPC request failed: %s", e)
+            return {'error': str(e)}
+
+    def _stop_recording(self):
+        self.recorder.stop()
+        return self.recorder.get_status()
+
+    def _telemetry_history(self, start, end, buckets=500, columns=None):
+        if columns is None:
+            return self.telemetry_store.query(start, end, buckets)
+        return self.telemetry_store.query(start, end, buckets, columns)
+
+    def _state_loop(self):
+        """Push control state and camera stats at the telemetry rate"""
+        while not self.stopped.wait(1.0 / TELEMETRY_RATE):
+            try:
+                self.state = json.dumps({
+                    'control': self.control_loop.get_state(),
+                    'camera': self.camera_stream.get_stats()
+                }).encode()
+            except Exception as e:
+                logger.error("Error collecting state: %s", e)
+                continue
+            with self._lock:
+                connections = list(self.connections)
+            for connection in connections:
+                if connection.topics & ipc.TOPIC_STATE:
+                    connection.push(ipc.EVT_STATE, self.state)
+
+    def _battery_status(self, status):
+        self.recorder.record_telemetry('battery', status)
+        payload = json.dumps(status).encode()
+        with self._lock:
+            connections = list(self.connections)
+        for connection in connections:
+            if connection.topics & ipc.TOPIC_BATTERY:
+                connection.push(ipc.EVT_BATTERY, payload)
+
+    def disconnected(self, connection):
+        with self._lock:
+            self.connections.discard(connection)
+            IPC_CLIENTS.set(len(self.connections))
+        # The worker's clients can no longer steer; do not leave the robot driving
+        self.control_loop.emergency_stop()
+        logger.info("Web worker disconnected (%d connected)", len(self.connections))
+
+    def shutdown(self):
+        """Stop accepting workers and release the hardware"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self._listener is not None:
+            # shutdown() wakes the blocked accept(); close() alone does not
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+        with self._lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+        self.control_loop.stop()
+        self.recorder.stop()
+        self.camera_stream.stop()
+        self.motor_controller.cleanup()
+        self.servo_controller.cleanup()
+        self.battery_monitor.stop()
+        self.telemetry_store.close()
+        # Released last: both controllers write to the shared channels while stopping
+        self.pwm_manager.cleanup()
+        GPIO.cleanup()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def main():
+    log_listener = configure_logging()
+    daemon = HardwareDaemon()
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+        log_listener.stop()
+
+
+if __name__ == '__main__':
+    main()
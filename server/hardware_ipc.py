@@ -0,0 +1,65 @@
+"""Wire protocol between web workers and the hardware daemon
+
+Messages travel over a Unix-domain stream socket, each framed as a 5-byte
+header (type, payload length) followed by the payload. Control commands are
+fixed-size structs; requests, responses, battery and state events carry JSON;
+frames carry the JPEG bytes as-is.
+
+    worker -> daemon                      daemon -> worker
+    CMD_DRIVE      DRIVE struct           EVT_FRAME     JPEG bytes
+    CMD_STEER      STEER struct           EVT_BATTERY   JSON status
+    CMD_STOP       (empty)                EVT_RESPONSE  REQUEST_ID + JSON result
+    CMD_SUBSCRIBE  SUBSCRIBE struct       EVT_STATE     JSON control state and camera stats
+    CMD_REQUEST    REQUEST_ID + JSON {"method": ..., "params": {...}}
+
+Timestamps are CLOCK_MONOTONIC readings, which are shared by every process
+on the host, so command latency can be measured across the socket.
+"""
+import struct
+
+HEADER = struct.Struct('<BI')
+
+CMD_DRIVE = 1
+CMD_STEER = 2
+CMD_STOP = 3
+CMD_SUBSCRIBE = 4
+CMD_REQUEST = 5
+
+EVT_FRAME = 101
+EVT_BATTERY = 102
+EVT_RESPONSE = 103
+EVT_STATE = 104
+
+DRIVE = struct.Struct('<ffd')  # left, right, received_at
+STEER = struct.Struct('<fd')  # angle, received_at
+SUBSCRIBE = struct.Struct('<B')  # topic bitmask
+REQUEST_ID = struct.Struct('<I')
+
+TOPIC_FRAMES = 1
+TOPIC_BATTERY = 2
+TOPIC_STATE = 4
+
+
+def send_message(sock, msg_type, *parts):
+    """
+    Write one framed message; callers serialize writers to the same socket
+    :param parts: bytes-like payload pieces, sent without concatenating them
+    """
+    sock.sendall(HEADER.pack(msg_type, sum(len(part) for part in parts)))
+    for part in parts:
+        sock.sendall(part)
+
+
+def read_message(stream):
+    """
+    Read one framed message from a buffered socket file
+    :return: (msg_type, payload bytes), or None when the peer closed the socket
+    """
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    msg_type, length = HEADER.unpack(header)
+    payload = stream.read(length) if length else b''
+    if len(payload) < length:
+        return None
+    return msg_type, payload
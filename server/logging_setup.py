@@ -0,0 +1,82 @@
+"""Off-thread logging for the control path
+
+Records from the request/socket threads are pushed onto a queue and written
+to the console by a QueueListener thread. Records from the ``hardware``
+loggers are additionally kept, unformatted, in a bounded in-memory ring
+buffer that can be dumped on demand.
+"""
+import logging
+import logging.handlers
+import queue
+from collections import deque
+from config import LOG_LEVEL, HARDWARE_EVENT_BUFFER_SIZE
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=HARDWARE_EVENT_BUFFER_SIZE):
+        """
+        Keep the most recent log records in memory
+        :param capacity: Maximum number of records retained
+        """
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+
+    def handle(self, record):
+        # deque.append is atomic, so skip Handler's per-record lock; message
+        # formatting is deferred until dump()
+        if self.filter(record):
+            self.records.append(record)
+        return True
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dump(self, limit=None):
+        """
+        Format buffered records, oldest first
+        :param limit: Only return the newest ``limit`` records
+        :return: List of dicts with time, logger, level and message
+        """
+        records = list(self.records)
+        if limit:
+            records = records[-limit:]
+        return [{
+            'time': record.created,
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage()
+        } for record in records]
+
+
+hardware_events = RingBufferHandler()
+
+
+def configure_logging(level=LOG_LEVEL):
+    """
+    Route root logging through a queue and capture hardware events
+    :param level: Console log level name or number
+    :return: Started QueueListener; call stop() on shutdown to flush it
+    """
+    log_queue = queue.SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    # Level is checked on the caller's thread so dropped records are never
+    # formatted or queued
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(level)
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    hardware_logger = logging.getLogger('hardware')
+    hardware_logger.setLevel(logging.DEBUG)
+    if hardware_events not in hardware_logger.handlers:
+        hardware_logger.addHandler(hardware_events)
+
+    listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    listener.start()
+    return listener
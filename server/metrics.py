@@ -0,0 +1,140 @@
+"""Cheap in-process metrics exposed in Prometheus text format"""
+import threading
+import time
+from bisect import bisect_left
+
+# Default latency buckets in seconds, 100us .. 5s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+now = time.monotonic
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} counter',
+            f'{self.name} {self.value}'
+        ]
+
+
+class Gauge:
+    def __init__(self, name, help_text, function=None):
+        """
+        :param function: Optional callable evaluated at scrape time
+        """
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.function = function
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def render(self):
+        value = self.function() if self.function else self.value
+        return [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} gauge',
+            f'{self.name} {value}'
+        ]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation (seconds for latency histograms)"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def observe_since(self, start):
+        """Record the time elapsed since a monotonic start timestamp"""
+        self.observe(now() - start)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def render(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} histogram'
+        ]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, function=None):
+        gauge = self._register(Gauge(name, help_text))
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
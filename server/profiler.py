@@ -0,0 +1,270 @@
+"""On-demand sampling profiler for a live server
+
+A background thread snapshots every thread's Python stack at a fixed
+interval for a bounded number of seconds. Samples are aggregated as they
+are taken (no per-sample records are kept), so memory stays flat and the
+cost per sample is one frame walk per thread. Output:
+
+    collapsed   "thread;outer (file.py);...;leaf (file.py) count" lines for
+                flamegraph.pl / speedscope / inferno
+    summary     per-thread CPU time, the hottest leaf functions, and wall/CPU
+                time for the handlers listed in PROFILER_HANDLERS
+
+On Linux each sample also reads the thread's CPU clock. A thread that used
+no CPU since its previous sample was blocked (waiting on a queue, socket or
+sleep); such samples are kept apart from the active ones, so the default
+flame graph shows where CPU goes rather than where threads wait.
+
+Socket.IO handlers and control ticks finish in microseconds and are rarely
+caught by a sample, so they are wrapped with ``profiler.timed`` instead:
+while a capture runs each call's wall and CPU time is measured exactly,
+otherwise the wrapper costs one attribute check. Long-running loops (camera
+capture, battery monitoring) are summarised from the samples.
+"""
+import functools
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from config import PROFILER_INTERVAL, PROFILER_MAX_SECONDS, PROFILER_HANDLERS
+
+logger = logging.getLogger(__name__)
+
+
+def _linux_thread_clock(native_id):
+    # Kernel encoding of a per-thread CPU clock (what pthread_getcpuclockid
+    # returns), built from the thread id so a thread that already exited
+    # fails with EINVAL instead of dereferencing its stale pthread handle
+    return (~native_id << 3) | 6
+
+
+_thread_clock = _linux_thread_clock if sys.platform.startswith('linux') else None
+
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILER_INTERVAL, handlers=PROFILER_HANDLERS):
+        """
+        Thread stack sampler, started and stopped on demand
+        :param interval: Default seconds between samples
+        :param handlers: Function qualnames summarised individually
+        """
+        self.interval = interval
+        self.handlers = handlers
+        self.capturing = False
+        self._lock = threading.Lock()
+        self._data_lock = threading.Lock()
+        self._timing_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._labels = {}
+        self._reset(interval, 0)
+
+    def _reset(self, interval, seconds):
+        self.active = Counter()
+        self.idle = Counter()
+        self.hot = Counter()
+        self.threads = {}
+        self.functions = {}
+        self.timings = {}
+        self.ticks = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.sampler_cpu = 0.0
+        self.requested = (interval, seconds)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def timed(self, function):
+        """Decorator: measure each call's wall and CPU time while a capture runs"""
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.capturing:
+                return function(*args, **kwargs)
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - wall, time.thread_time() - cpu)
+        return wrapper
+
+    def _record(self, name, wall, cpu):
+        with self._timing_lock:
+            totals = self.timings.get(name)
+            if totals is None:
+                totals = self.timings[name] = [0, 0.0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+            totals[3] = max(totals[3], wall)
+
+    def start(self, seconds, interval=None):
+        """
+        Begin a capture, discarding the previous results
+        :param seconds: Capture length, capped at PROFILER_MAX_SECONDS
+        :param interval: Seconds between samples (defaults to the configured interval)
+        :raises ValueError: if seconds or interval is not a positive finite number
+        :raises RuntimeError: if a capture is already running
+        """
+        interval = interval or self.interval
+        # NaN would never reach the deadline, and Event.wait(nan) returns at once
+        if not all(math.isfinite(value) and value > 0 for value in (seconds, interval)):
+            raise ValueError("seconds and interval must be positive finite numbers")
+        seconds = min(seconds, PROFILER_MAX_SECONDS)
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile capture is already running")
+            self._reset(interval, seconds)
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval),
+                                            name='profiler', daemon=True)
+            self._thread.start()
+        logger.info("Profiling all threads for %ss every %sms", seconds, interval * 1000)
+
+    def stop(self):
+        """End the capture early and wait for the sampler to finish"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+    def _run(self, seconds, interval):
+        me = threading.get_ident()
+        last_cpu = {}
+        self.started = time.time()
+        start = time.monotonic()
+        cpu_start = time.thread_time()
+        deadline = start
+        self.capturing = True
+        try:
+            while not self._stop_event.is_set():
+                threads = {thread.ident: thread for thread in threading.enumerate()}
+                with self._data_lock:
+                    for ident, frame in sys._current_frames().items():
+                        thread = threads.get(ident)
+                        if ident != me and thread is not None:
+                            self._sample(thread, frame, last_cpu)
+                    self.ticks += 1
+                now = time.monotonic()
+                self.elapsed = now - start
+                if self.elapsed >= seconds:
+                    break
+                deadline += interval
+                if deadline < now:
+                    # Sampling took longer than the interval; do not burst to catch up
+                    deadline = now
+                self._stop_event.wait(deadline - now)
+        finally:
+            self.capturing = False
+            self.sampler_cpu = time.thread_time() - cpu_start
+        logger.info("Profile capture finished: %d samples over %.1fs", self.ticks, self.elapsed)
+
+    def _sample(self, thread, frame, last_cpu):
+        cpu = self._thread_cpu(thread.native_id)
+        spent = None
+        if cpu is not None:
+            previous = last_cpu.get(thread.native_id)
+            last_cpu[thread.native_id] = cpu
+            spent = cpu - previous if previous is not None else None
+
+        stack = []
+        qualnames = set()
+        while frame is not None:
+            label, qualname = self._label(frame.f_code)
+            stack.append(label)
+            qualnames.add(qualname)
+            frame = frame.f_back
+        leaf = stack[0] if stack else thread.name
+        stack.append(thread.name)
+        key = ';'.join(reversed(stack))
+
+        busy = spent is None or spent > 0
+        if busy:
+            self.active[key] += 1
+            self.hot[leaf] += 1
+        else:
+            self.idle[key] += 1
+        totals = self.threads.setdefault(thread.name, {'samples': 0, 'active': 0, 'cpu_seconds': 0.0})
+        totals['samples'] += 1
+        totals['active'] += busy
+        totals['cpu_seconds'] += spent or 0.0
+        # Inclusive: a function counts once per sample however often it recurses
+        for qualname in qualnames:
+            totals = self.functions.get(qualname)
+            if totals is None:
+                totals = self.functions[qualname] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += spent or 0.0
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f'{code.co_qualname} ({os.path.basename(code.co_filename)})', code.co_qualname)
+        return label
+
+    @staticmethod
+    def _thread_cpu(native_id):
+        if _thread_clock is None or native_id is None:
+            return None
+        try:
+            return time.clock_gettime(_thread_clock(native_id))
+        except OSError:
+            # The thread exited between listing and sampling
+            return None
+
+    def collapsed(self, include_idle=False):
+        """Collapsed stacks, one "frames count" line each, heaviest first"""
+        with self._data_lock:
+            stacks = self.active + self.idle if include_idle else Counter(self.active)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+    def summary(self, top=20):
+        """Capture state, per-thread CPU, hottest functions and per-handler wall/CPU time"""
+        with self._data_lock:
+            functions = {name: tuple(totals) for name, totals in self.functions.items()}
+            threads = {name: dict(totals) for name, totals in self.threads.items()}
+            hot = self.hot.most_common(top)
+            active = sum(self.hot.values())
+        with self._timing_lock:
+            timings = {name: tuple(totals) for name, totals in self.timings.items()}
+        period = self.elapsed / self.ticks if self.ticks else 0.0
+
+        handlers = {}
+        for name in self.handlers:
+            if name in timings:
+                calls, wall, cpu, longest = timings[name]
+                handlers[name] = {'source': 'timed', 'calls': calls, 'wall_seconds': round(wall, 6),
+                                  'cpu_seconds': round(cpu, 6), 'max_seconds': round(longest, 6)}
+            else:
+                samples, cpu = functions.get(name, (0, 0.0))
+                handlers[name] = {'source': 'sampled', 'wall_seconds': round(samples * period, 4),
+                                  'cpu_seconds': round(cpu, 4)}
+
+        interval, seconds = self.requested
+        return {
+            'running': self.running,
+            'started': self.started,
+            'seconds': seconds,
+            'interval': interval,
+            'elapsed': round(self.elapsed, 3),
+            'samples': self.ticks,
+            'cpu_clock': _thread_clock is not None,
+            # Share of one core spent by the sampler itself
+            'overhead': round(self.sampler_cpu / self.elapsed, 4) if self.elapsed else None,
+            'threads': {name: {**totals, 'cpu_seconds': round(totals['cpu_seconds'], 4)}
+                        for name, totals in sorted(threads.items())},
+            'handlers': handlers,
+            # Leaf functions of samples taken while their thread was using CPU
+            'hot': [{'function': label, 'samples': count,
+                     'share': round(count / active, 4)} for label, count in hot]
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,318 @@
+"""Segmented on-disk recording of camera frames and telemetry
+
+Frames reach the recorder through a FrameBroadcaster listener that only
+retains the frame and puts it on a bounded queue, so capture never waits on
+the SD card. A writer thread appends each record to the current segment's
+data file and a fixed-width entry to its index file, rotating segments on a
+time budget and deleting the oldest ones. When the disk falls behind and
+the queue is full, new records are dropped and counted instead.
+
+Segment layout, one pair of files per segment named after its start time:
+
+    <start_ms>.dat  records: RECORD_HEADER (type, timestamp, length) + payload
+    <start_ms>.idx  INDEX_ENTRY per record: (timestamp, offset, length, type)
+
+The data file is flushed before the index entries that point into it, so a
+reader never follows an index entry past the end of the data. Playback maps
+both files with mmap and binary-searches the index, so seeking to any
+timestamp reads only the pages it touches.
+"""
+import bisect
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from config import (
+    RECORDER_DIRECTORY,
+    RECORDER_SEGMENT_SECONDS,
+    RECORDER_MAX_SEGMENTS,
+    RECORDER_QUEUE_SIZE,
+    RECORDER_INDEX_FLUSH
+)
+from server.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RECORD_FRAME = 1
+RECORD_TELEMETRY = 2
+
+RECORD_HEADER = struct.Struct('<BdI')
+INDEX_ENTRY = struct.Struct('<dQIB3x')
+
+RECORDS_WRITTEN = REGISTRY.counter(
+    'robot_recorder_records_total', 'Frames and telemetry records written to disk')
+RECORD_BYTES = REGISTRY.counter(
+    'robot_recorder_bytes_total', 'Bytes written to recording segments')
+RECORDS_DROPPED = REGISTRY.counter(
+    'robot_recorder_dropped_total', 'Records dropped because the writer fell behind')
+
+
+def _retain(payload):
+    if hasattr(payload, 'retain'):
+        payload.retain()
+
+
+def _release(payload):
+    if hasattr(payload, 'release'):
+        payload.release()
+
+
+class SessionRecorder:
+    def __init__(self, directory=RECORDER_DIRECTORY, segment_seconds=RECORDER_SEGMENT_SECONDS,
+                 max_segments=RECORDER_MAX_SEGMENTS, queue_size=RECORDER_QUEUE_SIZE):
+        """
+        Record camera frames and telemetry into rotating segment files
+        :param directory: Where segments are written
+        :param segment_seconds: Length of each segment before rotating
+        :param max_segments: Segments kept on disk; older ones are deleted
+        :param queue_size: Records that may wait for the writer before dropping
+        """
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.recording = False
+        self.written = 0
+        self.dropped = 0
+        self._thread = None
+        self._data = None
+        self._index = None
+        self._pending_index = bytearray()
+        self._segment_start = None
+        self._offset = 0
+
+    def attach(self, broadcaster):
+        """Record every frame published by a FrameBroadcaster"""
+        broadcaster.add_listener(self._on_frame)
+        return self
+
+    def _on_frame(self, sequence, frame):
+        if frame is not None:
+            self.offer(RECORD_FRAME, frame)
+
+    def record_telemetry(self, kind, data):
+        """
+        Record a telemetry event alongside the video
+        :param kind: Event name, e.g. 'drive'
+        :param data: JSON-serializable dict
+        """
+        if self.recording:
+            self.offer(RECORD_TELEMETRY, json.dumps({'kind': kind, **data}).encode())
+
+    def offer(self, record_type, payload):
+        """
+        Queue a record for the writer without blocking
+        :param payload: bytes, or a reference-counted frame (retained while queued)
+        :return: False if the record was dropped
+        """
+        if not self.recording:
+            return False
+        _retain(payload)
+        try:
+            self.queue.put_nowait((record_type, time.time(), payload))
+            return True
+        except queue.Full:
+            _release(payload)
+            self.dropped += 1
+            RECORDS_DROPPED.inc()
+            return False
+
+    def start(self):
+        """Start recording into a new segment"""
+        if self.recording:
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        self.recording = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Recording to %s", self.directory)
+        return self
+
+    def stop(self):
+        """Stop recording, writing out everything already queued"""
+        if not self.recording:
+            return
+        self.recording = False
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        # Release anything offered while we were shutting down
+        while True:
+            try:
+                _, _, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            _release(payload)
+        logger.info("Recording stopped (%d records written, %d dropped)",
+                    self.written, self.dropped)
+
+    def get_status(self):
+        return {
+            'recording': self.recording,
+            'written': self.written,
+            'dropped': self.dropped,
+            'queued': self.queue.qsize(),
+            'segments': len(list_segments(self.directory))
+        }
+
+    def _run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                try:
+                    self._write(*item)
+                except OSError as e:
+                    logger.error("Recording write failed: %s", e)
+                finally:
+                    _release(item[2])
+        finally:
+            self._close_segment()
+
+    def _write(self, record_type, timestamp, payload):
+        if self._data is None or timestamp - self._segment_start >= self.segment_seconds:
+            self._close_segment()
+            self._open_segment(timestamp)
+
+        data = getattr(payload, 'view', payload)
+        self._data.write(RECORD_HEADER.pack(record_type, timestamp, len(data)))
+        self._data.write(data)
+        self._pending_index += INDEX_ENTRY.pack(
+            timestamp, self._offset + RECORD_HEADER.size, len(data), record_type)
+        self._offset += RECORD_HEADER.size + len(data)
+        self.written += 1
+        RECORDS_WRITTEN.inc()
+        RECORD_BYTES.inc(RECORD_HEADER.size + len(data))
+
+        # Batch index writes; the data they point at must reach the file first
+        if len(self._pending_index) >= RECORDER_INDEX_FLUSH * INDEX_ENTRY.size:
+            self._flush_index()
+
+    def _flush_index(self):
+        self._data.flush()
+        self._index.write(self._pending_index)
+        self._index.flush()
+        self._pending_index.clear()
+
+    def _open_segment(self, timestamp):
+        self._segment_start = timestamp
+        base = os.path.join(self.directory, f'{int(timestamp * 1000):013d}')
+        self._data = open(base + '.dat', 'wb')
+        self._index = open(base + '.idx', 'wb')
+        self._offset = 0
+        self._prune()
+
+    def _close_segment(self):
+        if self._data is None:
+            return
+        self._flush_index()
+        self._data.close()
+        self._index.close()
+        self._data = self._index = None
+
+    def _prune(self):
+        for start, base in list_segments(self.directory)[:-self.max_segments]:
+            for path in (base + '.dat', base + '.idx'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            logger.debug("Deleted old recording segment %s", base)
+
+
+def list_segments(directory=RECORDER_DIRECTORY):
+    """
+    Recorded segments, oldest first
+    :return: List of (start timestamp, path without extension)
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (int(name[:-4]) / 1000, os.path.join(directory, name[:-4]))
+        for name in names if name.endswith('.idx') and name[:-4].isdigit()
+    )
+
+
+def _map(path):
+    """Read-only mmap of a file, or None while it is still empty"""
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+
+class Segment:
+    def __init__(self, base):
+        """
+        Memory-mapped view of one recorded segment
+        :param base: Segment path without extension
+        """
+        self.index = _map(base + '.idx')
+        self.data = _map(base + '.dat')
+        # A segment being written may have a partial trailing entry; ignore it
+        self.count = len(self.index) // INDEX_ENTRY.size if self.index and self.data else 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        """Timestamp of entry ``position`` (lets bisect search the index)"""
+        return INDEX_ENTRY.unpack_from(self.index, position * INDEX_ENTRY.size)[0]
+
+    def entry(self, position):
+        return INDEX_ENTRY.unpack_from(self.index, position * INDEX_ENTRY.size)
+
+    def find(self, timestamp):
+        """Position of the first record at or after ``timestamp``"""
+        return bisect.bisect_left(self, timestamp, 0, self.count)
+
+    def read(self, position):
+        """
+        Return (type, timestamp, payload bytes) for entry ``position``
+        """
+        timestamp, offset, length, record_type = self.entry(position)
+        return record_type, timestamp, self.data[offset:offset + length]
+
+    def close(self):
+        for mapped in (self.index, self.data):
+            if mapped is not None:
+                mapped.close()
+
+
+def read_records(start=None, end=None, record_type=None, directory=RECORDER_DIRECTORY):
+    """
+    Yield recorded (type, timestamp, payload) tuples in time order
+    :param start: First timestamp to return (epoch seconds), or None for the oldest
+    :param end: Stop at this timestamp, or None to read to the end
+    :param record_type: RECORD_FRAME or RECORD_TELEMETRY to filter, or None for all
+    """
+    segments = list_segments(directory)
+    first = 0
+    if start is not None and segments:
+        # Last segment starting at or before ``start``
+        first = max(0, bisect.bisect_right([s for s, _ in segments], start) - 1)
+
+    for _, base in segments[first:]:
+        try:
+            segment = Segment(base)
+        except FileNotFoundError:
+            continue  # pruned while we were reading
+        try:
+            position = segment.find(start) if start is not None else 0
+            for position in range(position, len(segment)):
+                if record_type is not None and segment.entry(position)[3] != record_type:
+                    continue
+                kind, timestamp, payload = segment.read(position)
+                if end is not None and timestamp > end:
+                    return
+                yield kind, timestamp, payload
+        finally:
+            segment.close()
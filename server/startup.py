@@ -0,0 +1,70 @@
+"""Startup phase timing
+
+app.py imports this module first and marks each startup milestone (imports
+done, control ready, camera ready, first client, ...) relative to that
+moment. The process age at that point is read from /proc, so the report
+also covers interpreter start-up before app.py ran. The report is logged
+once peripherals are up and served at /debug/startup.
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from server.metrics import now
+
+logger = logging.getLogger(__name__)
+
+
+def _process_age():
+    """Seconds since this process was created, or None off Linux"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (after the parenthesised command name) is the start time in ticks
+            started = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - started / os.sysconf('SC_CLK_TCK'), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    def __init__(self):
+        """Record startup milestones relative to construction time"""
+        self.started = now()
+        self.process_age = _process_age()
+        self.marks = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """Record the first time milestone ``name`` is reached"""
+        if name in self.marks:
+            return
+        with self._lock:
+            self.marks.setdefault(name, round(now() - self.started, 4))
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup step; its end is also recorded as a milestone"""
+        start = now()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(now() - start, 4)
+            self.mark(name)
+
+    def report(self):
+        return {
+            'process_age_at_import': self.process_age,
+            'marks': dict(sorted(self.marks.items(), key=lambda item: item[1])),
+            'phases': dict(self.phases)
+        }
+
+    def log_report(self):
+        marks = ', '.join(f'{name} {seconds:.3f}s' for name, seconds in
+                          self.report()['marks'].items())
+        logger.info("Startup (process age at import %ss): %s", self.process_age, marks)
+
+
+startup = StartupTimer()
@@ -0,0 +1,209 @@
+"""Per-viewer adaptive stream quality with an encode-once variant cache
+
+Each captured frame can be served at several quality/resolution levels.
+A level other than the camera's own output is encoded at most once per
+frame, and only when a viewer actually asks for it. Each viewer moves up
+or down the ladder based on how long its frames take to send, unless it
+pinned a profile with ``?profile=``. When the camera runs an encode pool,
+variants are encoded by its worker processes instead of under the GIL.
+"""
+import io
+import logging
+import threading
+from collections import namedtuple
+from config import (
+    CAMERA_FRAMERATE,
+    STREAM_PROFILES,
+    STREAM_DOWNGRADE_UTILIZATION,
+    STREAM_UPGRADE_UTILIZATION,
+    STREAM_DOWNGRADE_FRAMES,
+    STREAM_UPGRADE_FRAMES
+)
+from hardware.frame_buffer import MULTIPART_TRAILER, multipart_header
+from server.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+Profile = namedtuple('Profile', 'name scale quality')
+
+LADDER = [Profile(*profile) for profile in STREAM_PROFILES]
+PROFILES = {profile.name: profile for profile in LADDER}
+AUTO = 'auto'
+
+VARIANT_ENCODES = REGISTRY.counter(
+    'robot_stream_variant_encodes_total', 'Frames re-encoded for a lower quality profile')
+LEVEL_CHANGES = REGISTRY.counter(
+    'robot_stream_quality_changes_total', 'Automatic viewer quality ladder moves')
+
+
+class EncodedFrame:
+    def __init__(self, payload):
+        """
+        Immutable re-encoded frame with prebuilt multipart chunks
+        :param payload: JPEG bytes
+        """
+        self.payload = payload
+        self.header = multipart_header(len(payload))
+        self.chunks = (self.header, payload, MULTIPART_TRAILER)
+
+    def byte_chunks(self):
+        return self.chunks
+
+    # Not pooled, so there is nothing to count
+    def retain(self):
+        return self
+
+    def release(self):
+        pass
+
+    def tobytes(self):
+        return self.payload
+
+    def __len__(self):
+        return len(self.payload)
+
+
+class _Pending:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.frame = None
+
+
+class VariantCache:
+    def __init__(self, encode_pool=None):
+        """
+        Cache of profile variants for the most recent frame
+        :param encode_pool: EncodePool to encode in worker processes (set once the camera is up)
+        """
+        self.encode_pool = encode_pool
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._entries = {}
+
+    def get(self, sequence, source, profile):
+        """
+        Return ``source`` encoded for ``profile``, encoding it at most once
+        :param sequence: Broadcaster sequence number of ``source``
+        :param source: Frame from the camera (exposes ``view`` or ``tobytes()``)
+        :param profile: Profile to deliver
+        :return: Frame object with ``chunks``/``byte_chunks()``
+        """
+        if not self.needs_encode(profile):
+            return source
+
+        with self._lock:
+            if sequence > self._sequence:
+                self._sequence = sequence
+                self._entries = {}
+            elif sequence < self._sequence:
+                # A viewer still holding an older frame; not worth caching
+                return self._encode(source, profile)
+            entry = self._entries.get(profile.name)
+            owner = entry is None
+            if owner:
+                entry = self._entries[profile.name] = _Pending()
+
+        if owner:
+            try:
+                entry.frame = self._encode(source, profile)
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+        return entry.frame or source
+
+    @staticmethod
+    def needs_encode(profile):
+        """Whether ``profile`` differs from the camera's own output"""
+        return profile.scale != 1.0 or profile.quality is not None
+
+    def _encode(self, source, profile):
+        from PIL import Image
+
+        quality = profile.quality or 75
+        if self.encode_pool is not None:
+            try:
+                payload = self.encode_pool.encode_variant(source, profile.scale, quality)
+            except Exception as e:
+                logger.error("Failed to encode %s variant: %s", profile.name, e)
+                return None
+            if payload is not None:
+                VARIANT_ENCODES.inc()
+                return EncodedFrame(payload)
+            # Too large for a ring slot; encode it here instead
+
+        try:
+            image = Image.open(io.BytesIO(source.tobytes()))
+            if profile.scale < 1.0:
+                size = (max(1, int(image.width * profile.scale)),
+                        max(1, int(image.height * profile.scale)))
+                # Let the JPEG decoder downscale in the DCT domain first
+                image.draft('RGB', size)
+                if image.size != size:
+                    image = image.resize(size)
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=quality)
+            VARIANT_ENCODES.inc()
+            return EncodedFrame(output.getvalue())
+        except Exception as e:
+            logger.error("Failed to encode %s variant: %s", profile.name, e)
+            return None
+
+
+class AdaptiveQuality:
+    def __init__(self, profile=AUTO):
+        """
+        Quality ladder position for one viewer
+        :param profile: Profile name to pin, or 'auto' to adapt
+        """
+        self.pinned = profile != AUTO
+        self.level = LADDER.index(PROFILES[profile]) if self.pinned else 0
+        self.frame_interval = 1.0 / CAMERA_FRAMERATE
+        self._struggling = 0
+        self._healthy = 0
+
+    @property
+    def profile(self):
+        return LADDER[self.level]
+
+    def record(self, send_seconds, skipped=0):
+        """
+        Feed back how long the last frame took to send
+        :param send_seconds: Time spent delivering the frame
+        :param skipped: Frames skipped since the previous delivery
+        """
+        if self.pinned:
+            return
+        utilization = send_seconds / self.frame_interval
+        if skipped or utilization > STREAM_DOWNGRADE_UTILIZATION:
+            self._struggling += 1
+            self._healthy = 0
+        elif utilization < STREAM_UPGRADE_UTILIZATION:
+            self._healthy += 1
+            self._struggling = 0
+        else:
+            self._struggling = self._healthy = 0
+
+        if self._struggling >= STREAM_DOWNGRADE_FRAMES and self.level < len(LADDER) - 1:
+            self._move(1)
+        elif self._healthy >= STREAM_UPGRADE_FRAMES and self.level > 0:
+            self._move(-1)
+
+    def _move(self, step):
+        self.level += step
+        self._struggling = self._healthy = 0
+        LEVEL_CHANGES.inc()
+        logger.debug("Viewer quality moved to %s", self.profile.name)
+
+
+def parse_profile(name):
+    """
+    Validate a ?profile= value
+    :return: Profile name or 'auto'
+    :raises ValueError: for unknown profiles
+    """
+    if not name or name == AUTO:
+        return AUTO
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile '{name}', expected one of: {AUTO}, {', '.join(PROFILES)}")
+    return name
@@ -0,0 +1,115 @@
+"""Batched, delta-compressed telemetry for Socket.IO clients
+
+One publisher thread samples the robot state (battery, wheel speeds, servo
+angles, camera rate, connection counts) at a fixed rate and sends it as a
+single 'telemetry' event. A client gets the full state once after it
+connects, then only the fields that changed since the previous tick, and
+nothing at all on ticks where nothing changed. Every message is emitted to
+that client's own session, so a reconnecting client no longer triggers a
+broadcast to everyone else.
+
+    {"full": true,  "state": {"battery": {...}, "wheel_speeds": [...], ...}}
+    {"full": false, "state": {"servo_angles": [...]}}
+"""
+import json
+import logging
+import threading
+import time
+from config import TELEMETRY_RATE
+from server.metrics import REGISTRY
+from server.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_SENT = REGISTRY.counter(
+    'robot_telemetry_messages_total', 'Telemetry messages emitted to clients')
+BYTES_SENT = REGISTRY.counter(
+    'robot_telemetry_bytes_total', 'JSON bytes of telemetry emitted to clients')
+
+
+class TelemetryPublisher:
+    def __init__(self, collect, emit, rate=TELEMETRY_RATE):
+        """
+        Fixed-rate state publisher with per-client deltas
+        :param collect: Returns the current state as a flat dict of JSON values
+        :param emit: Called as emit(event, data, sid) to send to one client
+        :param rate: Ticks per second
+        """
+        self.collect = collect
+        self.emit = emit
+        self.period = 1.0 / rate
+        self.state = {}
+        self._clients = set()
+        self._new_clients = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, sid):
+        """Start publishing to a client; it gets a full snapshot straight away"""
+        with self._lock:
+            self._new_clients.add(sid)
+        self._wake.set()
+
+    def remove(self, sid):
+        with self._lock:
+            self._clients.discard(sid)
+            self._new_clients.discard(sid)
+
+    @profiler.timed
+    def tick(self):
+        """Sample the state and send the snapshot/delta each client needs"""
+        with self._lock:
+            clients = list(self._clients)
+            new_clients = list(self._new_clients)
+            self._clients.update(new_clients)
+            self._new_clients.clear()
+        if not clients and not new_clients:
+            return
+
+        state = self.collect()
+        delta = {key: value for key, value in state.items() if self.state.get(key) != value}
+        self.state = state
+        if delta and clients:
+            self._send(clients, {'full': False, 'state': delta})
+        if new_clients:
+            self._send(new_clients, {'full': True, 'state': state})
+
+    def _send(self, sids, message):
+        size = len(json.dumps(message, separators=(',', ':')))
+        for sid in sids:
+            try:
+                self.emit('telemetry', message, sid)
+            except Exception as e:
+                logger.error("Error sending telemetry: %s", e)
+                continue
+            MESSAGES_SENT.inc()
+            BYTES_SENT.inc(size)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stopped.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Error collecting telemetry: %s", e)
+            deadline += self.period
+            remaining = deadline - time.monotonic()
+            if remaining < 0:
+                deadline = time.monotonic()
+            elif self._wake.wait(remaining):
+                # A client connected; send its snapshot now rather than next tick
+                self._wake.clear()
+                deadline = time.monotonic()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
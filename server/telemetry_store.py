@@ -0,0 +1,478 @@
+"""Append-only columnar store for battery and actuator history
+
+Every row holds the wall-clock time, the battery voltage, the signed duty
+(speed) of each wheel and the angle of each steering servo. The control
+loop and the battery monitor update their own columns of a shared "latest"
+row; at most one row per TELEMETRY_STORE_INTERVAL is appended, carrying the
+newest value of every column. Rows are buffered in a small batch; full
+batches go on a bounded queue to a writer thread, which copies them into the
+current file and does all rotation, rollup and pruning work, so the loops
+never touch the disk. If the writer falls behind, batches are dropped and
+counted rather than delaying a control tick.
+
+Each file is preallocated for a fixed number of rows and laid out column by
+column after a small header (magic, capacity, rows written):
+
+    <start_ms>.col      [header][time * capacity][voltage * capacity][duty_fl ...]...
+    <start_ms>.rollup   per-TELEMETRY_STORE_ROLLUP_SECONDS min/max/sum/count of
+                        each column, written when the file is sealed
+
+Queries map the files with mmap and binary-search the time column, so only
+the pages in the requested range are read, and reduce them into min/max/mean
+buckets with numpy. numpy is imported on first use by the writer thread or a
+query, never by the control loop or battery monitor that record rows. When the requested buckets are wider than the rollup
+period, sealed files answer from their rollups instead, which keeps a week
+of history to a few thousand rows (bucket edges are then accurate to one
+rollup period). Rows still buffered or queued for the writer are included
+from memory, so a query never has to write anything.
+
+Timestamps never go backwards within the store: if the wall clock steps back
+(NTP sync after boot, say) rows keep the last stored time.
+"""
+import logging
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from config import (
+    TELEMETRY_STORE_DIRECTORY,
+    TELEMETRY_STORE_INTERVAL,
+    TELEMETRY_STORE_BATCH,
+    TELEMETRY_STORE_QUEUE_SIZE,
+    TELEMETRY_STORE_CHUNK_ROWS,
+    TELEMETRY_STORE_MAX_CHUNKS,
+    TELEMETRY_STORE_ROLLUP_SECONDS
+)
+from server.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    ('time', '<f8'),
+    ('voltage', '<f4'),
+    ('duty_fl', '<f4'), ('duty_fr', '<f4'), ('duty_rl', '<f4'), ('duty_rr', '<f4'),
+    ('angle_fl', '<f4'), ('angle_fr', '<f4'), ('angle_rl', '<f4'), ('angle_rr', '<f4'),
+)
+VALUE_COLUMNS = tuple(name for name, _ in COLUMNS[1:])
+DUTY_COLUMNS = VALUE_COLUMNS[1:5]
+ANGLE_COLUMNS = VALUE_COLUMNS[5:9]
+
+MAGIC = b'RTS1'
+HEADER = struct.Struct('<4sII')  # magic, capacity, rows written
+HEADER_SIZE = 64
+TIME = struct.Struct('<d')  # one value of the time column, which follows the header
+
+# Set by _load_numpy()
+np = None
+ROW_DTYPE = None
+ROLLUP_DTYPE = None
+
+ROWS_STORED = REGISTRY.counter(
+    'robot_telemetry_store_rows_total', 'Rows appended to the telemetry store')
+ROWS_DROPPED = REGISTRY.counter(
+    'robot_telemetry_store_rows_dropped_total', 'Rows dropped because the store writer fell behind')
+
+
+def _load_numpy():
+    """Import numpy and build the file dtypes (slow on the Pi, so kept off the control path)"""
+    global np, ROW_DTYPE, ROLLUP_DTYPE
+    if np is not None:
+        return
+    import numpy
+    ROW_DTYPE = numpy.dtype(list(COLUMNS))
+    ROLLUP_DTYPE = numpy.dtype([('time', '<f8'), ('rows', '<u4')] + [
+        (f'{name}_{stat}', dtype)
+        for name in VALUE_COLUMNS
+        for stat, dtype in (('min', '<f4'), ('max', '<f4'), ('sum', '<f8'), ('count', '<u4'))
+    ])
+    np = numpy
+
+
+class Chunk:
+    def __init__(self, path, capacity=None, writable=False):
+        """
+        One memory-mapped column file
+        :param path: File path
+        :param capacity: Rows to preallocate when creating the file (None to open an existing one)
+        :param writable: Map the file for appending
+        """
+        _load_numpy()
+        self.path = path
+        if capacity is not None:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, capacity, 0))
+                f.truncate(HEADER_SIZE + capacity * ROW_DTYPE.itemsize)
+        with open(path, 'r+b' if writable else 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0,
+                                  access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, self.capacity, self.rows = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a telemetry store file")
+        self.columns = {}
+        offset = HEADER_SIZE
+        for name in ROW_DTYPE.names:
+            dtype = ROW_DTYPE[name]
+            self.columns[name] = np.frombuffer(self._map, dtype=dtype, count=self.capacity,
+                                               offset=offset)
+            offset += self.capacity * dtype.itemsize
+
+    @property
+    def full(self):
+        return self.rows >= self.capacity
+
+    def append(self, rows):
+        """
+        Copy as many rows as fit into the file
+        :param rows: Structured array of ROW_DTYPE
+        :return: Number of rows taken
+        """
+        taken = min(len(rows), self.capacity - self.rows)
+        end = self.rows + taken
+        for name in ROW_DTYPE.names:
+            self.columns[name][self.rows:end] = rows[name][:taken]
+        self.rows = end
+        # Published after the column data, so a reader never sees unwritten rows
+        HEADER.pack_into(self._map, 0, MAGIC, self.capacity, self.rows)
+        return taken
+
+    def column(self, name, start=0, end=None):
+        return self.columns[name][start:self.rows if end is None else end]
+
+    def span(self, start, end):
+        """Row range [first, last) with start <= time < end"""
+        times = self.column('time')
+        return (int(np.searchsorted(times, start, side='left')),
+                int(np.searchsorted(times, end, side='left')))
+
+    def close(self):
+        self.columns = None
+        try:
+            self._map.close()
+        except BufferError:
+            # A query still holds a view; the mapping is released with it
+            pass
+
+
+def _bucket_starts(ids):
+    """Indexes where a non-decreasing bucket id array changes value"""
+    return np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+
+
+def _rollup(chunk, seconds):
+    """Summarise a chunk into fixed ``seconds`` buckets"""
+    times = chunk.column('time')
+    if not len(times):
+        return np.zeros(0, ROLLUP_DTYPE)
+    ids = np.floor_divide(times, seconds).astype(np.int64)
+    starts = _bucket_starts(ids)
+    rollup = np.zeros(len(starts), ROLLUP_DTYPE)
+    rollup['time'] = ids[starts] * seconds
+    rollup['rows'] = np.diff(np.append(starts, len(times)))
+    for name in VALUE_COLUMNS:
+        values = chunk.column(name)
+        present = ~np.isnan(values)
+        rollup[f'{name}_min'] = np.fmin.reduceat(values, starts)
+        rollup[f'{name}_max'] = np.fmax.reduceat(values, starts)
+        rollup[f'{name}_sum'] = np.add.reduceat(np.where(present, values, 0).astype(np.float64), starts)
+        rollup[f'{name}_count'] = np.add.reduceat(present, starts)
+    return rollup
+
+
+def _raw_stats(values):
+    """min, max, sum and count inputs for accumulating raw (not rolled-up) values"""
+    present = ~np.isnan(values)
+    return values, values, np.where(present, values, 0).astype(np.float64), present
+
+
+def list_chunks(directory=TELEMETRY_STORE_DIRECTORY):
+    """Chunk file paths and start times (ms), oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    starts = sorted(int(name[:-4]) for name in names
+                    if name.endswith('.col') and name[:-4].isdigit())
+    return [(os.path.join(directory, f'{start}.col'), start) for start in starts]
+
+
+class TelemetryStore:
+    def __init__(self, directory=TELEMETRY_STORE_DIRECTORY, interval=TELEMETRY_STORE_INTERVAL,
+                 batch=TELEMETRY_STORE_BATCH, chunk_rows=TELEMETRY_STORE_CHUNK_ROWS,
+                 max_chunks=TELEMETRY_STORE_MAX_CHUNKS, rollup_seconds=TELEMETRY_STORE_ROLLUP_SECONDS,
+                 queue_size=TELEMETRY_STORE_QUEUE_SIZE):
+        """
+        Battery/actuator history in rotating column files
+        :param directory: Where chunk files are written
+        :param interval: Minimum seconds between stored rows
+        :param batch: Rows buffered in memory before they are handed to the writer
+        :param chunk_rows: Rows per chunk file
+        :param max_chunks: Chunk files kept; older ones are deleted
+        :param rollup_seconds: Bucket width of the per-chunk rollups
+        :param queue_size: Full batches that may wait for the writer before dropping
+        """
+        self.directory = directory
+        self.interval = interval
+        self.chunk_rows = chunk_rows
+        self.max_chunks = max_chunks
+        self.rollup_seconds = rollup_seconds
+        self.batch_size = batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._row = [math.nan] * len(COLUMNS)
+        self._batch = []
+        self._queued = []
+        self._last_time = 0.0
+        self._dirty = False
+        # _lock guards the latest row, the batch and the queued batches (taken by the loops);
+        # _write_lock guards the open chunk (taken by the writer and queries, before _lock)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._chunk = None
+        os.makedirs(directory, exist_ok=True)
+        self._resume()
+        self._thread = threading.Thread(target=self._run, name='telemetry-store', daemon=True)
+        self._thread.start()
+
+    def _resume(self):
+        # Continue after the newest stored row, so times stay sorted across restarts.
+        # Read with struct rather than Chunk, which would load numpy at startup
+        chunks = list_chunks(self.directory)
+        if not chunks:
+            return
+        path = chunks[-1][0]
+        try:
+            with open(path, 'rb') as f:
+                magic, _, rows = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC:
+                    raise ValueError(f"{path} is not a telemetry store file")
+                if rows:
+                    f.seek(HEADER_SIZE + (rows - 1) * TIME.size)
+                    self._last_time = TIME.unpack(f.read(TIME.size))[0]
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Cannot read telemetry chunk %s: %s", path, e)
+
+    def record_control(self, duties, angles, timestamp=None):
+        """
+        Update the actuator columns from a control tick
+        :param duties: Signed wheel speeds (-100 to 100) in WHEELS order
+        :param angles: Servo angles (0-180) in WHEELS order
+        """
+        with self._lock:
+            self._row[2:6] = duties
+            self._row[6:10] = angles
+            self._append(timestamp)
+
+    def record_battery(self, voltage, timestamp=None):
+        """Update the voltage column from a battery sample"""
+        with self._lock:
+            self._row[1] = voltage
+            self._append(timestamp)
+
+    def _append(self, timestamp):
+        timestamp = max(timestamp or time.time(), self._last_time)
+        if timestamp - self._last_time < self.interval:
+            # Too soon for a new row; the next one carries these values
+            self._dirty = True
+            return
+        self._push(timestamp)
+
+    def _push(self, timestamp):
+        self._last_time = timestamp
+        self._dirty = False
+        self._row[0] = timestamp
+        self._batch.append(tuple(self._row))
+        if len(self._batch) == self.batch_size:
+            self._hand_off()
+
+    def _hand_off(self):
+        """Queue the current batch for the writer without blocking"""
+        try:
+            self.queue.put_nowait(self._batch)
+            self._queued.append(self._batch)
+        except queue.Full:
+            ROWS_DROPPED.inc(len(self._batch))
+        self._batch = []
+
+    def _run(self):
+        """Writer thread: copy queued batches into the chunk files"""
+        while True:
+            rows = self.queue.get()
+            try:
+                if rows is None:
+                    return
+                with self._write_lock:
+                    try:
+                        _load_numpy()
+                        self._write(np.array(rows, ROW_DTYPE))
+                    finally:
+                        # Queries now read these rows from the chunk (or have lost them)
+                        with self._lock:
+                            self._queued.pop(0)
+            except Exception as e:
+                logger.error("Telemetry store write failed: %s", e)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, rows):
+        count = len(rows)
+        while len(rows):
+            if self._chunk is None or self._chunk.full:
+                self._rotate(rows['time'][0])
+            rows = rows[self._chunk.append(rows):]
+        ROWS_STORED.inc(count)
+
+    def flush(self):
+        """Write buffered rows, including a final row for throttled updates, and wait for them"""
+        with self._lock:
+            if self._dirty:
+                self._push(max(time.time(), self._last_time))
+            if self._batch:
+                self._hand_off()
+        self.queue.join()
+
+    def _rotate(self, start):
+        if self._chunk is not None:
+            self._seal(self._chunk)
+        path = os.path.join(self.directory, f'{int(start * 1000)}.col')
+        self._chunk = Chunk(path, capacity=self.chunk_rows, writable=True)
+        logger.debug("Telemetry store started %s", path)
+        for old, _ in list_chunks(self.directory)[:-self.max_chunks]:
+            for stale in (old, old[:-4] + '.rollup'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def _seal(self, chunk):
+        try:
+            self._write_rollup(chunk)
+        finally:
+            chunk.close()
+
+    def _write_rollup(self, chunk):
+        path = chunk.path[:-4] + '.rollup'
+        # Per-thread temporary name: a query may build a missing rollup while the writer seals
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_rollup(chunk, self.rollup_seconds).tobytes())
+        os.replace(temporary, path)
+
+    def _load_rollup(self, path):
+        rollup_path = path[:-4] + '.rollup'
+        try:
+            with open(rollup_path, 'rb') as f:
+                return np.frombuffer(f.read(), ROLLUP_DTYPE)
+        except FileNotFoundError:
+            pass
+        # Sealed without a rollup (the process died mid-rotation): build it now
+        chunk = Chunk(path)
+        try:
+            self._write_rollup(chunk)
+        finally:
+            chunk.close()
+        return self._load_rollup(path)
+
+    def query(self, start, end, buckets=500, columns=VALUE_COLUMNS):
+        """
+        Downsample a time range into equal-width buckets
+        :param start: Range start, epoch seconds
+        :param end: Range end, epoch seconds
+        :param buckets: Number of buckets
+        :param columns: Value columns to return
+        :return: dict with bucket start times, row counts, and min/max/mean per column
+                 (None where a bucket has no data)
+        """
+        unknown = set(columns) - set(VALUE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        if not (math.isfinite(start) and math.isfinite(end)):
+            raise ValueError("start and end must be finite")
+        if end <= start or buckets < 1:
+            raise ValueError("Need end > start and at least one bucket")
+        _load_numpy()
+        width = (end - start) / buckets
+        totals = {name: [np.full(buckets, np.inf), np.full(buckets, -np.inf),
+                         np.zeros(buckets), np.zeros(buckets, np.int64)] for name in columns}
+        rows = np.zeros(buckets, np.int64)
+
+        def accumulate(times, counts, stats):
+            ids = np.minimum(((times - start) // width).astype(np.int64), buckets - 1)
+            starts = _bucket_starts(ids)
+            targets = ids[starts]
+            rows[targets] += np.add.reduceat(counts, starts)
+            for name in columns:
+                mins, maxs, sums, present = stats(name)
+                total = totals[name]
+                total[0][targets] = np.fmin(total[0][targets], np.fmin.reduceat(mins, starts))
+                total[1][targets] = np.fmax(total[1][targets], np.fmax.reduceat(maxs, starts))
+                total[2][targets] += np.add.reduceat(sums, starts)
+                total[3][targets] += np.add.reduceat(present, starts)
+
+        with self._write_lock:
+            # One consistent view: the rows in the files now, plus every row not written yet
+            chunks = list_chunks(self.directory)
+            current = self._chunk.path if self._chunk is not None else None
+            current_rows = self._chunk.rows if self._chunk is not None else 0
+            with self._lock:
+                unwritten = [row for batch in self._queued for row in batch] + self._batch
+        for index, (path, chunk_start) in enumerate(chunks):
+            chunk_end = chunks[index + 1][1] / 1000 if index + 1 < len(chunks) else math.inf
+            if chunk_start / 1000 >= end or chunk_end <= start:
+                continue
+            if path != current and width >= self.rollup_seconds:
+                rollup = self._load_rollup(path)
+                rollup = rollup[(rollup['time'] >= start) & (rollup['time'] < end)]
+                if len(rollup):
+                    accumulate(rollup['time'], rollup['rows'].astype(np.int64), lambda name: (
+                        rollup[f'{name}_min'], rollup[f'{name}_max'],
+                        rollup[f'{name}_sum'], rollup[f'{name}_count'].astype(np.int64)))
+                continue
+            try:
+                chunk = Chunk(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping telemetry chunk %s: %s", path, e)
+                continue
+            try:
+                if path == current:
+                    # Rows the writer appends from here on are already in ``unwritten``
+                    chunk.rows = current_rows
+                first, last = chunk.span(start, end)
+                if last > first:
+                    accumulate(chunk.column('time', first, last), np.ones(last - first, np.int64),
+                               lambda name: _raw_stats(chunk.column(name, first, last)))
+            finally:
+                chunk.close()
+        if unwritten:
+            pending = np.array(unwritten, ROW_DTYPE)
+            pending = pending[(pending['time'] >= start) & (pending['time'] < end)]
+            if len(pending):
+                accumulate(pending['time'], np.ones(len(pending), np.int64),
+                           lambda name: _raw_stats(pending[name]))
+
+        def values(array, empty):
+            return [None if missing else round(float(value), 3) for value, missing in zip(array, empty)]
+
+        result = {'start': start, 'end': end, 'width': width,
+                  'time': [round(start + i * width, 3) for i in range(buckets)],
+                  'rows': rows.tolist(), 'columns': {}}
+        for name, (mins, maxs, sums, present) in totals.items():
+            empty = present == 0
+            result['columns'][name] = {
+                'min': values(mins, empty),
+                'max': values(maxs, empty),
+                'mean': values(sums / np.maximum(present, 1), empty)
+            }
+        return result
+
+    def close(self):
+        """Write everything buffered, stop the writer and seal the open chunk"""
+        self.flush()
+        self.queue.put(None)
+        self._thread.join()
+        with self._write_lock:
+            if self._chunk is not None:
+                self._seal(self._chunk)
+                self._chunk = None
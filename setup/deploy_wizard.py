@@ -1,60 +1,244 @@
 #!/usr/bin/env python3
 import os
 import sys
+import json
+import socket
+import hashlib
 import logging
+import argparse
 import subprocess
+import tempfile
+import threading
 import time
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SETUP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(SETUP_DIR)
+CONFIG_PATH = os.path.join(SETUP_DIR, 'deploy_config.json')
+CACHE_PATH = os.path.expanduser('~/.cache/robot-control/deploy_checks.json')
+
+REQUIRED_PACKAGES = [
+    'python3-pip',
+    'python3-picamera2',
+    'python3-libcamera',
+    'i2c-tools',
+    'python3-smbus'
+]
+
+# Directory names (anywhere) or paths relative to APP_DIR that are never copied
+# to the robot; app_files() applies this to both the copy and the check hash
+COPY_IGNORE = {
+    '.git', '__pycache__', '.venv', 'venv', '.pytest_cache',
+    # Written at run time by the robot or the benchmarks
+    'recordings', 'telemetry', 'benchmarks/results',
+}
+
+
+class CommandRunner:
+    """Runs system commands for the wizard"""
+
+    def run(self, args: List[str], cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        return subprocess.run(args, capture_output=True, text=True, cwd=cwd)
+
+    def port_open(self, port: int) -> bool:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+
+class DryRunRunner(CommandRunner):
+    """Stand-ins for dpkg, systemctl and friends so the flow can be timed anywhere"""
+
+    def __init__(self, latency: float = 0.05, startup_polls: int = 3):
+        """
+        :param latency: Simulated seconds per command
+        :param startup_polls: Readiness polls before the service reports ready
+        """
+        self.latency = latency
+        self.startup_polls = startup_polls
+        self._polls = 0
+        self._lock = threading.Lock()
+
+    def run(self, args: List[str], cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        time.sleep(self.latency)
+        stdout = ''
+        if args[0] == 'dpkg-query':
+            stdout = ''.join(f'{package}\tii \n' for package in args[3:])
+        elif args[:2] == ['systemctl', 'is-active']:
+            stdout = 'active\n' if self._ready() else 'activating\n'
+        logger.debug(f"[dry-run] {' '.join(args)}")
+        return subprocess.CompletedProcess(args, 0, stdout, '')
+
+    def port_open(self, port: int) -> bool:
+        return self._ready()
+
+    def _ready(self) -> bool:
+        with self._lock:
+            self._polls += 1
+            return self._polls > self.startup_polls
+
+
+class CheckCache:
+    def __init__(self, path: str = CACHE_PATH):
+        """
+        Remembers which checks passed for a given fingerprint of their inputs
+        :param path: JSON file the results are kept in
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def passed(self, name: str, digest: str) -> bool:
+        return self.entries.get(name) == digest
+
+    def record(self, name: str, digest: str) -> None:
+        with self._lock:
+            self.entries[name] = digest
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not save check cache: {e}")
+
+
+def hash_files(paths: List[str], extra: str = '') -> str:
+    """Content hash of a set of files (missing files hash as absent)"""
+    digest = hashlib.sha256(extra.encode())
+    for path in sorted(paths):
+        digest.update(path.encode())
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(block)
+        except OSError:
+            digest.update(b'<missing>')
+    return digest.hexdigest()
+
+
+def app_files(root: str = APP_DIR) -> List[str]:
+    """Files copied to the robot by setup_service (and hashed for its check cache)"""
+    files = []
+    for directory, dirs, names in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        dirs[:] = [d for d in dirs if d not in COPY_IGNORE and
+                   os.path.normpath(os.path.join(relative, d)).replace(os.sep, '/') not in COPY_IGNORE]
+        files.extend(os.path.join(directory, name) for name in names
+                     if not name.endswith('.pyc'))
+    return files
+
+
+def wait_for(condition: Callable[[], Optional[bool]], timeout: float = 30.0,
+             initial_delay: float = 0.1, max_delay: float = 2.0) -> bool:
+    """
+    Poll ``condition`` with exponential backoff
+    :param condition: Returns True when ready, False to keep waiting, None to give up
+    :param timeout: Seconds before giving up
+    :return: True if the condition became true in time
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        result = condition()
+        if result or result is None:
+            return bool(result)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
 class DeploymentWizard:
-    def __init__(self):
+    def __init__(self, dry_run: bool = False, use_cache: bool = True, workers: int = 4,
+                 ready_timeout: float = 30.0):
+        """
+        :param dry_run: Use stand-in commands and a scratch install root
+        :param use_cache: Skip checks whose inputs are unchanged since they last passed
+        :param workers: Checks run concurrently
+        :param ready_timeout: Seconds to wait for the service to become ready
+        """
         self.checks_passed = 0
         self.total_checks = 6
         self.is_raspberry_pi = False
-    
+        self.dry_run = dry_run
+        self.workers = workers
+        self.ready_timeout = ready_timeout
+        self.runner = DryRunRunner() if dry_run else CommandRunner()
+        # A fixed scratch root, so dry-run re-runs exercise the cache too
+        self.root = os.path.join(tempfile.gettempdir(), 'robot-deploy-dry-run') if dry_run else '/'
+        self.cache = CheckCache(
+            os.path.join(self.root, 'deploy_checks.json') if dry_run else CACHE_PATH
+        ) if use_cache else None
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        with open(CONFIG_PATH) as f:
+            self.config = json.load(f)
+        application = self.config['application']
+        self.install_path = os.path.join(self.root, application['install_path'].lstrip('/'))
+        self.service_path = os.path.join(self.root, 'etc/systemd/system/robot-control.service')
+        self.port = self.config['network']['port']
+
     def print_progress(self, message: str) -> None:
         """Print a formatted progress message"""
         logger.info(f"[{self.checks_passed}/{self.total_checks}] {message}")
-    
+
+    def passed(self, message: str) -> None:
+        with self._lock:
+            self.checks_passed += 1
+            self.print_progress(message)
+
+    def cpuinfo(self) -> str:
+        """The text check_platform inspects (and its check cache hashes)"""
+        if self.dry_run:
+            return 'Model\t\t: Raspberry Pi 5 Model B (dry run)'
+        with open('/proc/cpuinfo', 'r') as f:
+            return f.read()
+
     def check_platform(self) -> bool:
         """Verify if running on Raspberry Pi"""
         try:
-            with open('/proc/cpuinfo', 'r') as f:
-                cpuinfo = f.read()
+            cpuinfo = self.cpuinfo()
             self.is_raspberry_pi = 'Raspberry Pi 5' in cpuinfo
             if not self.is_raspberry_pi:
                 logger.error("This script must be run on a Raspberry Pi 5")
                 return False
-            self.checks_passed += 1
-            self.print_progress("Platform check passed")
+            self.passed("Platform check passed")
             return True
         except Exception as e:
             logger.error(f"Failed to verify platform: {e}")
             return False
 
     def check_dependencies(self) -> bool:
-        """Check required system dependencies"""
-        required_packages = [
-            'python3-pip',
-            'python3-picamera2',
-            'python3-libcamera',
-            'i2c-tools',
-            'python3-smbus'
-        ]
-        
+        """Check required system dependencies with a single dpkg-query call"""
         try:
-            for package in required_packages:
-                result = subprocess.run(['dpkg', '-s', package], 
-                                     capture_output=True, text=True)
-                if result.returncode != 0:
-                    logger.error(f"Missing required package: {package}")
-                    return False
-            
-            self.checks_passed += 1
-            self.print_progress("Dependency check passed")
+            result = self.runner.run(['dpkg-query', '-W', '--showformat=${Package}\t${db:Status-Abbrev}\n']
+                                     + REQUIRED_PACKAGES)
+            # Unknown packages are reported on stderr and left out of stdout
+            installed = {
+                package for package, _, status in
+                (line.partition('\t') for line in result.stdout.splitlines())
+                if status.startswith('ii')
+            }
+            missing = [package for package in REQUIRED_PACKAGES if package not in installed]
+            if missing:
+                logger.error(f"Missing required packages: {', '.join(missing)}")
+                return False
+
+            self.passed("Dependency check passed")
             return True
         except Exception as e:
             logger.error(f"Failed to check dependencies: {e}")
@@ -64,19 +248,17 @@ class DeploymentWizard:
         """Verify if required interfaces are enabled"""
         try:
             # Check I2C
-            i2c_result = subprocess.run(['i2cdetect', '-y', '1'], 
-                                      capture_output=True, text=True)
+            i2c_result = self.runner.run(['i2cdetect', '-y', '1'])
             if "Error" in i2c_result.stderr:
                 logger.error("I2C interface is not enabled")
                 return False
-                
+
             # Check Camera
-            if not os.path.exists('/dev/video0'):
+            if not self.dry_run and not os.path.exists('/dev/video0'):
                 logger.error("Camera interface is not enabled")
                 return False
-                
-            self.checks_passed += 1
-            self.print_progress("Interface check passed")
+
+            self.passed("Interface check passed")
             return True
         except Exception as e:
             logger.error(f"Failed to check interfaces: {e}")
@@ -85,111 +267,181 @@ class DeploymentWizard:
     def check_gpio_connections(self) -> bool:
         """Test GPIO connections for motors and servos"""
         try:
-            import RPi.GPIO as GPIO
+            if self.dry_run:
+                sys.path.insert(0, APP_DIR)
+                import hardware.mock_gpio as GPIO
+            else:
+                import RPi.GPIO as GPIO
             GPIO.setmode(GPIO.BCM)
-            
+
             # Test motor controller pins
             motor_pins = [2, 3, 4, 17, 27, 22, 10, 9, 11, 5, 6, 13]
             for pin in motor_pins:
                 GPIO.setup(pin, GPIO.OUT)
                 GPIO.output(pin, GPIO.LOW)
-            
-            # Test servo pins
+
+            # Test servo pins: pulse them all together rather than one after another
             servo_pins = [14, 15, 18, 23]
+            pwms = []
             for pin in servo_pins:
                 GPIO.setup(pin, GPIO.OUT)
                 pwm = GPIO.PWM(pin, 50)
                 pwm.start(7.5)
-                time.sleep(0.1)
+                pwms.append(pwm)
+            time.sleep(0.1)
+            for pwm in pwms:
                 pwm.stop()
-            
+
             GPIO.cleanup()
-            self.checks_passed += 1
-            self.print_progress("GPIO connection check passed")
+            self.passed("GPIO connection check passed")
             return True
         except Exception as e:
             logger.error(f"Failed to check GPIO connections: {e}")
             return False
 
-    def setup_service(self) -> bool:
-        """Configure systemd service for auto-start"""
-        service_content = """[Unit]
+    def service_content(self) -> str:
+        application = self.config['application']
+        return f"""[Unit]
 Description=Robot Control Interface
 After=network.target
 
 [Service]
-ExecStart=/usr/bin/python3 /opt/robot-control/app.py
-WorkingDirectory=/opt/robot-control
-User=pi
-Group=pi
+ExecStart=/usr/bin/python3 {application['install_path']}/app.py
+WorkingDirectory={application['install_path']}
+User={application['user']}
+Group={application['group']}
 Restart=always
 
 [Install]
 WantedBy=multi-user.target
 """
+
+    def service_files(self) -> List[str]:
+        """Files setup_service reads or writes: the app, its installed copy and the unit file"""
+        sources = app_files()
+        installed = [os.path.join(self.install_path, os.path.relpath(path, APP_DIR))
+                     for path in sources]
+        return sources + installed + [self.service_path]
+
+    def setup_service(self) -> bool:
+        """Configure systemd service for auto-start"""
         try:
-            if not os.path.exists('/opt/robot-control'):
-                os.makedirs('/opt/robot-control')
-            
-            # Copy application files
-            subprocess.run(['cp', '-r', '.', '/opt/robot-control/'])
-            
+            os.makedirs(self.install_path, exist_ok=True)
+
+            # Copy exactly the files the check cache hashes
+            files = [os.path.relpath(path, APP_DIR) for path in app_files()]
+            result = self.runner.run(['cp', '--parents', *files, self.install_path], cwd=APP_DIR)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or 'copy failed')
+
             # Create service file
-            with open('/etc/systemd/system/robot-control.service', 'w') as f:
-                f.write(service_content)
-            
-            # Enable and start service
-            subprocess.run(['systemctl', 'enable', 'robot-control'])
-            subprocess.run(['systemctl', 'start', 'robot-control'])
-            
-            self.checks_passed += 1
-            self.print_progress("Service setup completed")
+            os.makedirs(os.path.dirname(self.service_path), exist_ok=True)
+            with open(self.service_path, 'w') as f:
+                f.write(self.service_content())
+
+            # Enable and (re)start service
+            self.runner.run(['systemctl', 'daemon-reload'])
+            self.runner.run(['systemctl', 'enable', 'robot-control'])
+            self.runner.run(['systemctl', 'restart', 'robot-control'])
+
+            self.passed("Service setup completed")
             return True
         except Exception as e:
             logger.error(f"Failed to setup service: {e}")
             return False
 
     def verify_application(self) -> bool:
-        """Verify if the application is running"""
+        """Verify the service is running and accepting connections"""
         try:
-            # Wait for service to start
-            time.sleep(5)
-            result = subprocess.run(['systemctl', 'is-active', 'robot-control'],
-                                  capture_output=True, text=True)
-            if result.stdout.strip() != 'active':
+            def service_active():
+                state = self.runner.run(['systemctl', 'is-active', 'robot-control']).stdout.strip()
+                # 'failed' will not recover by waiting
+                return None if state == 'failed' else state == 'active'
+
+            if not wait_for(service_active, self.ready_timeout):
                 logger.error("Service failed to start")
                 return False
-            
-            self.checks_passed += 1
-            self.print_progress("Application verification passed")
+            if not wait_for(lambda: self.runner.port_open(self.port), self.ready_timeout):
+                logger.error(f"Service is not accepting connections on port {self.port}")
+                return False
+
+            self.passed("Application verification passed")
             return True
         except Exception as e:
             logger.error(f"Failed to verify application: {e}")
             return False
 
+    def fingerprints(self) -> Dict[str, Callable[[], str]]:
+        """Inputs of each cacheable check; a check is skipped while its hash is unchanged"""
+        return {
+            'check_platform': lambda: hash_files([], self.cpuinfo()),
+            'check_dependencies': lambda: hash_files(['/var/lib/dpkg/status'],
+                                                     ' '.join(REQUIRED_PACKAGES)),
+            'check_interfaces': lambda: hash_files(['/boot/firmware/config.txt'],
+                                                   str(os.path.exists('/dev/video0'))),
+            # Includes the installed state, so a changed or removed copy is redeployed
+            'setup_service': lambda: hash_files(self.service_files(), self.service_content()),
+        }
+
+    def run_check(self, check: Callable[[], bool]) -> bool:
+        """Run one check, or skip it if it passed before with identical inputs"""
+        name = check.__name__
+        started = time.monotonic()
+        fingerprint = self.fingerprints().get(name) if self.cache else None
+        digest = fingerprint() if fingerprint else None
+        if digest and self.cache.passed(name, digest):
+            self.passed(f"{name} unchanged since last run, skipped")
+            ok = True
+        else:
+            ok = check()
+            if ok and digest:
+                # Hashed again: setup_service writes some of its own inputs
+                self.cache.record(name, fingerprint())
+        self.timings[name] = time.monotonic() - started
+        return ok
+
     def run_deployment(self) -> bool:
         """Run all deployment checks and setup"""
-        logger.info("Starting Robot Control Interface deployment...")
-        
+        logger.info("Starting Robot Control Interface deployment..."
+                    + (f" (dry run in {self.root})" if self.dry_run else ""))
+        started = time.monotonic()
+
+        # Independent checks run concurrently; setup and verification depend on them
         checks = [
             self.check_platform,
             self.check_dependencies,
             self.check_interfaces,
-            self.check_gpio_connections,
-            self.setup_service,
-            self.verify_application
+            self.check_gpio_connections
         ]
-        
-        for check in checks:
-            if not check():
-                logger.error("Deployment failed!")
-                return False
-        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.run_check, checks))
+        ok = all(results) and self.run_check(self.setup_service) \
+            and self.run_check(self.verify_application)
+
+        if self.cache:
+            self.cache.save()
+        timings = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.timings.items())
+        logger.info(f"Finished in {time.monotonic() - started:.2f}s ({timings})")
+        if not ok:
+            logger.error("Deployment failed!")
+            return False
+
         logger.info("Deployment completed successfully!")
         logger.info("The robot control interface is now accessible at:")
-        logger.info("http://<raspberry-pi-ip>:5000")
+        logger.info(f"http://<raspberry-pi-ip>:{self.port}")
         return True
 
+
 if __name__ == "__main__":
-    wizard = DeploymentWizard()
+    parser = argparse.ArgumentParser(description='Deploy the robot control interface')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='use stand-ins for dpkg/systemctl and a scratch install root')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='run every check even if its inputs are unchanged')
+    parser.add_argument('--workers', type=int, default=4, help='checks run concurrently')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds to wait for the service to become ready')
+    args = parser.parse_args()
+    wizard = DeploymentWizard(dry_run=args.dry_run, use_cache=not args.no_cache,
+                              workers=args.workers, ready_timeout=args.timeout)
     sys.exit(0 if wizard.run_deployment() else 1)
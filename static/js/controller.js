@@ -1,10 +1,20 @@
+// Binary control message layout, mirrored in server/control_protocol.py
+const MSG_DRIVE = 1;
+const MSG_STEER = 2;
+const CONTROL_MESSAGE_SIZE = 12;
+const AXIS_SCALE = 32767;
+
 class RobotController {
-    constructor() {
+    constructor(options = {}) {
         this.socket = io();
         this.connected = false;
+        this.useBinary = options.useBinary !== false && typeof ArrayBuffer !== 'undefined';
+        this.sequence = 0;
+        this.telemetry = {};
         this.setupWebSocket();
         this.setupJoysticks();
         this.setupControls();
+        this.setupHistory();
     }
 
     setupWebSocket() {
@@ -23,14 +33,13 @@ class RobotController {
             this.updateStatus('Error: ' + error, 'danger');
         });
 
-        // Battery status updates
-        this.socket.on('battery_status', (status) => {
-            this.updateBatteryStatus(status);
-        });
-
-        // Battery alerts
-        this.socket.on('battery_alert', (alert) => {
-            this.showBatteryAlert(alert);
+        // Robot state: a full snapshot after connecting, then changed fields only
+        this.socket.on('telemetry', (message) => {
+            if (message.full) {
+                this.telemetry = {};
+            }
+            Object.assign(this.telemetry, message.state);
+            this.updateTelemetry(message.state);
         });
     }
 
@@ -40,7 +49,10 @@ class RobotController {
             size: 200,
             maxDistance: 75,
             onChange: (pos) => {
-                if (this.connected) {
+                if (!this.connected) return;
+                if (this.useBinary) {
+                    this.sendControl(MSG_DRIVE, pos.x, pos.y);
+                } else {
                     this.socket.emit('drive', {
                         speed: pos.y * 100,  // Convert to -100 to 100 range
                         turn: pos.x * 100
@@ -54,7 +66,10 @@ class RobotController {
             size: 200,
             maxDistance: 75,
             onChange: (pos) => {
-                if (this.connected) {
+                if (!this.connected) return;
+                if (this.useBinary) {
+                    this.sendControl(MSG_STEER, pos.x, 0);
+                } else {
                     this.socket.emit('steer', {
                         angle: pos.x * 90  // Convert to -90 to 90 range
                     });
@@ -63,6 +78,21 @@ class RobotController {
         });
     }
 
+    sendControl(type, x, y) {
+        const buffer = new ArrayBuffer(CONTROL_MESSAGE_SIZE);
+        const view = new DataView(buffer);
+        const clamp = (v) => Math.max(-1, Math.min(1, v));
+
+        this.sequence = (this.sequence + 1) & 0xFFFF;
+        view.setUint8(0, type);
+        view.setUint8(1, 0);
+        view.setUint16(2, this.sequence, true);
+        view.setUint32(4, Math.floor(performance.now()) >>> 0, true);
+        view.setInt16(8, Math.round(clamp(x) * AXIS_SCALE), true);
+        view.setInt16(10, Math.round(clamp(y) * AXIS_SCALE), true);
+        this.socket.emit('control', buffer);
+    }
+
     setupControls() {
         // Emergency stop button
         document.getElementById('emergency-stop').addEventListener('click', () => {
@@ -73,6 +103,81 @@ class RobotController {
         });
     }
 
+    setupHistory() {
+        const range = document.getElementById('history-range');
+        range.addEventListener('change', () => this.loadHistory());
+        this.loadHistory();
+        setInterval(() => this.loadHistory(), 60000);
+    }
+
+    // Stored voltage as min/max/mean buckets, one per canvas pixel column
+    async loadHistory() {
+        const canvas = document.getElementById('history-chart');
+        const seconds = Number(document.getElementById('history-range').value);
+        const end = Date.now() / 1000;
+        const params = new URLSearchParams({
+            start: end - seconds, end: end, buckets: canvas.width, columns: 'voltage'
+        });
+        try {
+            const response = await fetch(`/telemetry/history?${params}`);
+            if (response.ok) {
+                this.drawHistory(canvas, (await response.json()).columns.voltage);
+            }
+        } catch (error) {
+            console.error('History request failed:', error);
+        }
+    }
+
+    drawHistory(canvas, voltage) {
+        const context = canvas.getContext('2d');
+        const present = voltage.min.filter((value) => value !== null);
+        context.clearRect(0, 0, canvas.width, canvas.height);
+        if (!present.length) return;
+        const low = Math.min(...present) - 0.1;
+        const high = Math.max(...voltage.max.filter((value) => value !== null)) + 0.1;
+        const y = (value) => canvas.height - (value - low) / (high - low) * canvas.height;
+
+        // Min-max band, then the mean on top
+        context.fillStyle = 'rgba(25, 135, 84, 0.35)';
+        voltage.min.forEach((value, x) => {
+            if (value !== null) {
+                context.fillRect(x, y(voltage.max[x]), 1, Math.max(1, y(value) - y(voltage.max[x])));
+            }
+        });
+        context.strokeStyle = '#198754';
+        context.beginPath();
+        let drawing = false;
+        voltage.mean.forEach((value, x) => {
+            if (value === null) {
+                drawing = false;
+                return;
+            }
+            drawing ? context.lineTo(x, y(value)) : context.moveTo(x, y(value));
+            drawing = true;
+        });
+        context.stroke();
+        context.fillStyle = '#adb5bd';
+        context.fillText(`${high.toFixed(1)}V`, 2, 10);
+        context.fillText(`${low.toFixed(1)}V`, 2, canvas.height - 2);
+    }
+
+    updateTelemetry(changed) {
+        if (changed.battery) {
+            this.updateBatteryStatus(changed.battery);
+        }
+        if ('battery_alert' in changed) {
+            this.showBatteryAlert(changed.battery_alert);
+        }
+        const state = this.telemetry;
+        const format = (values) => (values || []).map((value) => Math.round(value)).join(' / ');
+        document.getElementById('telemetry-wheels').textContent = format(state.wheel_speeds);
+        document.getElementById('telemetry-servos').textContent = format(state.servo_angles);
+        document.getElementById('telemetry-fps').textContent =
+            state.camera_fps == null ? '-' : state.camera_fps.toFixed(1);
+        document.getElementById('telemetry-clients').textContent =
+            `${state.clients} (${state.viewers} watching)`;
+    }
+
     updateBatteryStatus(status) {
         const batteryLevel = document.getElementById('battery-level');
         const batteryVoltage = document.getElementById('battery-voltage');
@@ -95,6 +200,10 @@ class RobotController {
 
     showBatteryAlert(alert) {
         const alertElement = document.getElementById('battery-alert');
+        if (!alert) {
+            alertElement.classList.add('d-none');
+            return;
+        }
         alertElement.textContent = alert.message;
         alertElement.className = `alert alert-${alert.level} mt-3`;
         alertElement.classList.remove('d-none');